@@ -21,6 +21,7 @@ datastore.
 """
 
 import base64
+import collections
 import time
 
 from oslo.config import cfg
@@ -1088,12 +1089,13 @@ class CloudController(object):
         return {'instancesSet': instances_set}
 
     def _format_instance_bdm(self, context, instance_uuid, root_device_name,
-                             result):
+                             result, bdms=None):
         """Format InstanceBlockDeviceMappingResponseItemType."""
         root_device_type = 'instance-store'
         mapping = []
-        bdms = objects.BlockDeviceMappingList.get_by_instance_uuid(
-                context, instance_uuid)
+        if bdms is None:
+            bdms = objects.BlockDeviceMappingList.get_by_instance_uuid(
+                    context, instance_uuid)
         for bdm in bdms:
             volume_id = bdm.volume_id
             if volume_id is None or bdm.no_device:
@@ -1173,14 +1175,29 @@ class CloudController(object):
             except exception.NotFound:
                 instances = []
 
+        if not context.is_admin:
+            instances = [inst for inst in instances
+                         if not pipelib.is_vpn_image(inst['image_ref'])]
+
+        # NOTE: the ec2 ids, block device mappings and availability zones of
+        # all the instances are looked up at once rather than one instance at
+        # a time, the network info comes with the instances' info cache.
+        ec2_ids = {}
+        bdms_by_uuid = collections.defaultdict(list)
+        zones = {}
+        if instances:
+            instance_uuids = [inst['uuid'] for inst in instances]
+            ec2_ids = ec2utils.ids_to_ec2_inst_ids(instance_uuids)
+            for bdm in objects.BlockDeviceMappingList.get_by_instance_uuids(
+                    context, instance_uuids):
+                bdms_by_uuid[bdm.instance_uuid].append(bdm)
+            zones = ec2utils.get_availability_zones_by_hosts(
+                [inst['host'] for inst in instances])
+
         for instance in instances:
-            if not context.is_admin:
-                if pipelib.is_vpn_image(instance['image_ref']):
-                    continue
             i = {}
             instance_uuid = instance['uuid']
-            ec2_id = ec2utils.id_to_ec2_inst_id(instance_uuid)
-            i['instanceId'] = ec2_id
+            i['instanceId'] = ec2_ids[instance_uuid]
             image_uuid = instance['image_ref']
             i['imageId'] = ec2utils.glance_id_to_ec2_id(context, image_uuid)
             self._format_kernel_id(context, instance, i, 'kernelId')
@@ -1211,7 +1228,11 @@ class CloudController(object):
             for k, v in utils.instance_meta(instance).iteritems():
                 i['tagSet'].append({'key': k, 'value': v})
 
-            client_token = self._get_client_token(context, instance_uuid)
+            if instance.obj_attr_is_set('system_metadata'):
+                client_token = instance.system_metadata.get(
+                    'EC2_client_token')
+            else:
+                client_token = self._get_client_token(context, instance_uuid)
             if client_token:
                 i['clientToken'] = client_token
 
@@ -1226,10 +1247,9 @@ class CloudController(object):
             i['amiLaunchIndex'] = instance['launch_index']
             self._format_instance_root_device_name(instance, i)
             self._format_instance_bdm(context, instance['uuid'],
-                                      i['rootDeviceName'], i)
-            host = instance['host']
-            zone = ec2utils.get_availability_zone_by_host(host)
-            i['placement'] = {'availabilityZone': zone}
+                                      i['rootDeviceName'], i,
+                                      bdms=bdms_by_uuid[instance_uuid])
+            i['placement'] = {'availabilityZone': zones[instance['host']]}
             if instance['reservation_id'] not in reservations:
                 r = {}
                 r['reservationId'] = instance['reservation_id']
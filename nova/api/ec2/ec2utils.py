@@ -18,6 +18,7 @@ import functools
 import re
 
 from nova import availability_zones
+from nova import cache_utils
 from nova import context
 from nova import exception
 from nova.i18n import _
@@ -25,7 +26,6 @@ from nova.network import model as network_model
 from nova import objects
 from nova.objects import base as obj_base
 from nova.openstack.common import log as logging
-from nova.openstack.common import memorycache
 from nova.openstack.common import timeutils
 from nova.openstack.common import uuidutils
 
@@ -35,18 +35,26 @@ _CACHE_TIME = 7 * 24 * 60 * 60
 _CACHE = None
 
 
+def _get_cache():
+    global _CACHE
+    if not _CACHE:
+        _CACHE = cache_utils.get_client()
+    return _CACHE
+
+
+def _memoize_key(func_name, reqid):
+    return str("%s:%s" % (func_name, reqid))
+
+
 def memoize(func):
     @functools.wraps(func)
     def memoizer(context, reqid):
-        global _CACHE
-        if not _CACHE:
-            _CACHE = memorycache.get_client()
-        key = "%s:%s" % (func.__name__, reqid)
-        key = str(key)
-        value = _CACHE.get(key)
+        cache = _get_cache()
+        key = _memoize_key(func.__name__, reqid)
+        value = cache.get(key)
         if value is None:
             value = func(context, reqid)
-            _CACHE.set(key, value, time=_CACHE_TIME)
+            cache.set(key, value, time=_CACHE_TIME)
         return value
     return memoizer
 
@@ -178,6 +186,12 @@ def get_availability_zone_by_host(host, conductor_api=None):
         context.get_admin_context(), host, conductor_api)
 
 
+def get_availability_zones_by_hosts(hosts):
+    """Return a dict of the availability zone of each of the given hosts."""
+    return availability_zones.get_host_availability_zones(
+        context.get_admin_context(), hosts)
+
+
 def id_to_ec2_id(instance_id, template='i-%08x'):
     """Convert an instance ID (int) to an ec2 ID (i-[base 16 number])."""
     return template % int(instance_id)
@@ -195,6 +209,43 @@ def id_to_ec2_inst_id(instance_id):
         return id_to_ec2_id(instance_id)
 
 
+def ids_to_ec2_inst_ids(instance_uuids):
+    """Get or create the ec2 instance IDs of several uuids at once.
+
+    Returns a dict of ec2 instance IDs by uuid. The mappings missing from the
+    cache shared with id_to_ec2_inst_id() and ec2_inst_id_to_uuid() are
+    looked up with a single query, and cached both ways.
+    """
+    cache = _get_cache()
+    int_ids = {}
+    missing = []
+    for instance_uuid in set(instance_uuids):
+        int_id = cache.get(_memoize_key('get_int_id_from_instance_uuid',
+                                        instance_uuid))
+        if int_id is None:
+            missing.append(instance_uuid)
+        else:
+            int_ids[instance_uuid] = int_id
+
+    if missing:
+        ctxt = context.get_admin_context()
+        for imap in objects.EC2InstanceMappingList.get_by_uuids(ctxt,
+                                                                missing):
+            int_ids[imap.uuid] = imap.id
+            cache.set(_memoize_key('get_int_id_from_instance_uuid',
+                                   imap.uuid),
+                      imap.id, time=_CACHE_TIME)
+            cache.set(_memoize_key('get_instance_uuid_from_int_id', imap.id),
+                      imap.uuid, time=_CACHE_TIME)
+        for instance_uuid in missing:
+            if instance_uuid not in int_ids:
+                int_ids[instance_uuid] = get_int_id_from_instance_uuid(
+                    ctxt, instance_uuid)
+
+    return dict((instance_uuid, id_to_ec2_id(int_id))
+                for instance_uuid, int_id in int_ids.iteritems())
+
+
 def ec2_inst_id_to_uuid(context, ec2_id):
     """"Convert an instance id to uuid."""
     int_id = ec2_id_to_id(ec2_id)
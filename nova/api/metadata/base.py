@@ -17,6 +17,7 @@
 """Instance Metadata information."""
 
 import base64
+import hashlib
 import os
 import posixpath
 
@@ -28,6 +29,7 @@ from nova import block_device
 from nova.compute import flavors
 from nova import conductor
 from nova import context
+from nova import exception
 from nova import network
 from nova import objects
 from nova.objects import base as obj_base
@@ -196,6 +198,10 @@ class InstanceMetadata():
 
         self.route_configuration = None
 
+        self.fingerprint = _fingerprint(instance, network_info,
+                                        self.security_groups, self.mappings)
+        self._rendered = {}
+
     def _route_configuration(self):
         if self.route_configuration:
             return self.route_configuration
@@ -304,7 +310,7 @@ class InstanceMetadata():
             return self._handle_content(path_tokens)
         return self._route_configuration().handle_path(path_tokens)
 
-    def _metadata_as_json(self, version, path):
+    def _metadata_as_json(self, version, path, random_seed=True):
         metadata = {'uuid': self.uuid}
         if self.launch_metadata:
             metadata['meta'] = self.launch_metadata
@@ -323,8 +329,8 @@ class InstanceMetadata():
         metadata['launch_index'] = self.instance['launch_index']
         metadata['availability_zone'] = self.availability_zone
 
-        if self._check_os_version(GRIZZLY, version):
-            metadata['random_seed'] = base64.b64encode(os.urandom(512))
+        if random_seed and self._check_os_version(GRIZZLY, version):
+            metadata['random_seed'] = _random_seed()
 
         self.set_mimetype(MIME_TYPE_APPLICATION_JSON)
         return jsonutils.dumps(metadata)
@@ -421,6 +427,49 @@ class InstanceMetadata():
 
         return data
 
+    def render(self, path):
+        """Return the metadata at path as a (body, mime type, etag) tuple,
+        or a callable handling requests for it.
+
+        Bodies are rendered once and kept, the metadata of the instance
+        doesn't change during the lifetime of this object. The etag is
+        weak (prefixed with W/) when the body contains a random seed
+        generated for each request.
+        """
+        path = posixpath.normpath("/" + path.lstrip("/"))
+        rendered = self._rendered.get(path)
+        if rendered is None:
+            rendered = self._render(path)
+            self._rendered[path] = rendered
+        if callable(rendered):
+            return rendered
+
+        body, mimetype, etag, version = rendered
+        if version is not None:
+            # NOTE: the seed is spliced into the rendered JSON object
+            body = '%s, "random_seed": "%s"}' % (body[:-1], _random_seed())
+        return body, mimetype, etag
+
+    def _render(self, path):
+        data = self.lookup(path)
+        if callable(data):
+            return data
+        version = None
+        path_tokens = path.split('/')[1:]
+        if (len(path_tokens) == 3 and path_tokens[0] == "openstack" and
+                path_tokens[2] == MD_JSON_NAME):
+            version = self._route_configuration()._version(path_tokens[1])
+            if self._check_os_version(GRIZZLY, version):
+                data = self._metadata_as_json(version, path,
+                                              random_seed=False)
+            else:
+                version = None
+        body = ec2_md_print(data)
+        etag = '"%s"' % hashlib.md5(body).hexdigest()
+        if version is not None:
+            etag = 'W/' + etag
+        return body, self.get_mimetype(), etag, version
+
     def metadata_for_config_drive(self):
         """Yields (path, value) tuples for metadata elements."""
         # EC2 style metadata
@@ -504,12 +553,160 @@ class VendorDataDriver(object):
         return self._data
 
 
-def get_metadata_by_address(conductor_api, address):
-    ctxt = context.get_admin_context()
+def _random_seed():
+    return base64.b64encode(os.urandom(512))
+
+
+def _fingerprint(instance, network_info, security_groups, mappings):
+    """Digest of everything the metadata of an instance is built from,
+    other than the vendor data.
+    """
+    inputs = [instance.get(key) for key in
+              ('uuid', 'host', 'hostname', 'display_name', 'launch_index',
+               'reservation_id', 'key_name', 'key_data', 'user_data',
+               'image_ref', 'kernel_id', 'ramdisk_id')]
+    inputs.append(utils.instance_meta(instance))
+    inputs.append(utils.instance_sys_meta(instance))
+    inputs.append(network_info)
+    inputs.append(sorted(group['name'] for group in security_groups))
+    inputs.append(mappings)
+    return hashlib.sha1(jsonutils.dumps(inputs, sort_keys=True)).hexdigest()
+
+
+def get_metadata_fingerprint(instance_id, ctxt=None):
+    """Return the fingerprint the metadata of an instance would have now,
+    without building it.
+    """
+    ctxt = ctxt or context.get_admin_context()
+    instance = objects.Instance.get_by_uuid(
+        ctxt, instance_id,
+        expected_attrs=['metadata', 'system_metadata', 'info_cache'])
+    security_groups = objects.SecurityGroupList.get_by_instance(ctxt,
+                                                                instance)
+    return _fingerprint(instance, instance.info_cache.network_info,
+                        security_groups,
+                        _format_instance_mapping(ctxt, instance))
+
+
+class AddressIndex(object):
+    """Index of the fixed IP addresses of instances to their uuids.
+
+    The index is built from the network info caches of all instances,
+    and refreshed with the instances changed since. Network info changes
+    don't update their instance, so entries are only hints that callers
+    check against the network info of the instance, and addresses missing
+    from the index are resolved through the network API. So are addresses
+    indexed for several instances, as fixed IPs may overlap across
+    networks.
+    """
+
+    def __init__(self):
+        self._uuids = {}
+        self._addresses = {}
+        self._changes_since = None
+
+    def _index(self, instance):
+        addresses = set(fixed_ip['address'] for fixed_ip in
+                        instance.info_cache.network_info.fixed_ips())
+        for address in self._addresses.get(instance.uuid, set()) - addresses:
+            self.discard(address, instance.uuid)
+        for address in addresses:
+            self.add(address, instance.uuid)
+
+    def refresh(self, ctxt=None):
+        """Load the index, or update it with the instances changed since
+        it was last loaded or refreshed.
+        """
+        ctxt = ctxt or context.get_admin_context(read_deleted='yes')
+        now = timeutils.utcnow()
+        if self._changes_since is None:
+            filters = {'deleted': False}
+        else:
+            filters = {'changes-since': self._changes_since}
+        instances = objects.InstanceList.get_by_filters(
+            ctxt, filters, expected_attrs=['info_cache'], use_slave=True)
+        for instance in instances:
+            if instance.deleted:
+                for address in list(self._addresses.get(instance.uuid, [])):
+                    self.discard(address, instance.uuid)
+            elif instance.info_cache is not None:
+                self._index(instance)
+        LOG.debug('Indexed %(count)d fixed IP addresses from %(changed)d '
+                  'instances', {'count': len(self._uuids),
+                                'changed': len(instances)})
+        self._changes_since = now
+
+    def get(self, address):
+        """Return the uuid of the instance indexed for address, or None if
+        there is none or more than one.
+        """
+        uuids = self._uuids.get(address)
+        if uuids is None or len(uuids) != 1:
+            return None
+        return next(iter(uuids))
+
+    def add(self, address, uuid):
+        self._uuids.setdefault(address, set()).add(uuid)
+        self._addresses.setdefault(uuid, set()).add(address)
+
+    def discard(self, address, uuid):
+        for key, value, index in ((address, uuid, self._uuids),
+                                  (uuid, address, self._addresses)):
+            values = index.get(key)
+            if values is not None:
+                values.discard(value)
+                if not values:
+                    del index[key]
+
+
+def _get_indexed_instance(ctxt, address, address_index, expected_attrs):
+    """Return the instance the address index maps address to, if it still
+    has that address, or None.
+    """
+    instance_id = address_index.get(address)
+    if instance_id is None:
+        return None
+    try:
+        instance = objects.Instance.get_by_uuid(
+            ctxt, instance_id, expected_attrs=expected_attrs)
+    except exception.InstanceNotFound:
+        instance = None
+    if (instance is not None and instance.info_cache is not None and
+            any(fixed_ip['address'] == address for fixed_ip in
+                instance.info_cache.network_info.fixed_ips())):
+        return instance
+    LOG.debug('Address %(address)s is no longer on instance %(uuid)s',
+              {'address': address, 'uuid': instance_id})
+    address_index.discard(address, instance_id)
+    return None
+
+
+def get_instance_id_by_address(address, ctxt=None, address_index=None):
+    ctxt = ctxt or context.get_admin_context()
+    if address_index is not None:
+        instance = _get_indexed_instance(ctxt, address, address_index,
+                                         ['info_cache'])
+        if instance is not None:
+            return instance.uuid
     fixed_ip = network.API().get_fixed_ip_by_address(ctxt, address)
+    if address_index is not None and fixed_ip['instance_uuid']:
+        address_index.add(address, fixed_ip['instance_uuid'])
+    return fixed_ip['instance_uuid']
+
+
+def get_metadata_by_address(conductor_api, address, address_index=None):
+    ctxt = context.get_admin_context()
+
+    if address_index is not None:
+        instance = _get_indexed_instance(
+            ctxt, address, address_index,
+            ['metadata', 'system_metadata', 'info_cache'])
+        if instance is not None:
+            return InstanceMetadata(instance, address)
 
     return get_metadata_by_instance_id(conductor_api,
-                                       fixed_ip['instance_uuid'],
+                                       get_instance_id_by_address(
+                                           address, ctxt, address_index),
                                        address,
                                        ctxt)
 
@@ -15,29 +15,66 @@
 #    under the License.
 
 """Metadata request handler."""
+import bisect
 import hashlib
 import hmac
 import os
+import time
 
+import eventlet.event
+import eventlet.semaphore
 from oslo.config import cfg
 import six
 import webob.dec
 import webob.exc
 
 from nova.api.metadata import base
+from nova import cache_utils
 from nova import conductor
 from nova import exception
 from nova.i18n import _
 from nova.i18n import _LE
+from nova.i18n import _LI
 from nova.i18n import _LW
 from nova.openstack.common import log as logging
-from nova.openstack.common import memorycache
+from nova.openstack.common import timeutils
 from nova import utils
 from nova import wsgi
 
-CACHE_EXPIRATION = 15  # in seconds
+# Cached metadata is rebuilt after this long, even if the instance didn't
+# change, to pick up changes of the vendor data.
+CACHE_MAX_AGE = 3600  # in seconds
+
+metadata_cache_opts = [
+    cfg.IntOpt('metadata_cache_expiration',
+               default=15,
+               help='Number of seconds the metadata of an instance is '
+                    'served from cache before checking whether the '
+                    'instance changed. Unchanged metadata is not rebuilt. '
+                    '0 disables caching.'),
+    cfg.IntOpt('metadata_address_index_interval',
+               default=0,
+               help='Number of seconds between updates of the index of '
+                    'fixed IP addresses to instances, which is loaded '
+                    'from the network info of all instances when the '
+                    'metadata service starts and saves looking up the '
+                    'address of each request in the network service. '
+                    '0 disables the index.'),
+    cfg.IntOpt('metadata_max_concurrent_loads',
+               default=20,
+               help='Maximum number of instances whose metadata is loaded '
+                    'concurrently by each metadata API worker. Concurrent '
+                    'requests for the metadata of the same instance share '
+                    'a single load. 0 means unlimited.'),
+    cfg.IntOpt('metadata_stats_interval',
+               default=0,
+               help='Number of seconds between logging the request latency '
+                    'histograms of each metadata API worker. 0 disables '
+                    'logging them.'),
+]
 
 CONF = cfg.CONF
+CONF.register_opts(metadata_cache_opts)
 CONF.import_opt('use_forwarded_for', 'nova.api.auth')
 
 metadata_proxy_opts = [
@@ -61,50 +98,262 @@ CONF.register_opts(metadata_proxy_opts, 'neutron')
 
 LOG = logging.getLogger(__name__)
 
+# Path categories latencies are recorded under, besides 'root', 'ec2' and
+# 'openstack' for other paths
+_EC2_CATEGORIES = ('meta-data', 'user-data')
+_OPENSTACK_CATEGORIES = (base.MD_JSON_NAME, base.UD_NAME, base.PASS_NAME,
+                         base.VD_JSON_NAME)
+
+
+def _path_category(path_info):
+    """Return the category of a metadata path, ignoring its version."""
+    parts = [part for part in path_info.split('/') if part]
+    if not parts:
+        return 'root'
+    if parts[0] == 'openstack':
+        if len(parts) > 2 and parts[2] in _OPENSTACK_CATEGORIES:
+            return 'openstack/%s' % parts[2]
+        return 'openstack'
+    if len(parts) > 1 and parts[1] in _EC2_CATEGORIES:
+        return 'ec2/%s' % parts[1]
+    return 'ec2'
+
+
+class LatencyHistogram(object):
+    """Counts of request latencies in exponential buckets."""
+
+    # Upper bounds of the buckets in seconds, the last bucket is unbounded
+    BUCKETS = (0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1, 0.2, 0.5,
+               1, 2, 5, 10)
+
+    def __init__(self):
+        self.counts = [0] * (len(self.BUCKETS) + 1)
+        self.count = 0
+        self.total = 0.0
+
+    def add(self, seconds):
+        self.counts[bisect.bisect_left(self.BUCKETS, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+
+    def percentile(self, percent):
+        """Return the upper bound of the bucket the percentile is in, or
+        None if it is in the unbounded bucket.
+        """
+        rank = self.count * percent / 100.0
+        seen = 0
+        for bound, count in zip(self.BUCKETS, self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return None
+
+    def __str__(self):
+        def ms(bound):
+            return '>%d' % (self.BUCKETS[-1] * 1000) if bound is None else (
+                '<=%g' % (bound * 1000))
+
+        mean = self.total / self.count if self.count else 0
+        return 'count=%d mean=%.1fms p50%sms p90%sms p99%sms' % (
+            self.count, mean * 1000, ms(self.percentile(50)),
+            ms(self.percentile(90)), ms(self.percentile(99)))
+
+
+def _etag_matches(etag, if_none_match):
+    """Weak comparison of etag with an If-None-Match header."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == '*':
+        return True
+    etag = etag[2:] if etag.startswith('W/') else etag
+    for tag in if_none_match.split(','):
+        tag = tag.strip()
+        if tag.startswith('W/'):
+            tag = tag[2:]
+        if tag == etag:
+            return True
+    return False
+
 
 class MetadataRequestHandler(wsgi.Application):
     """Serve metadata."""
 
     def __init__(self):
-        self._cache = memorycache.get_client()
+        self._cache = cache_utils.get_client()
         self.conductor_api = conductor.API()
+        self._address_index = None
+        self._address_index_updated_at = None
+        # Events of the metadata loads in progress, by cache key
+        self._loads = {}
+        self._load_semaphore = None
+        if CONF.metadata_max_concurrent_loads > 0:
+            self._load_semaphore = eventlet.semaphore.Semaphore(
+                CONF.metadata_max_concurrent_loads)
+        self._latencies = {}
+        self._coalesced_loads = 0
+        self._stats_logged_at = time.time()
+        if CONF.metadata_address_index_interval > 0:
+            self._address_index = base.AddressIndex()
+            self._update_address_index()
+
+    def _update_address_index(self):
+        """Update the address index if it is older than
+        metadata_address_index_interval.
+        """
+        now = timeutils.utcnow_ts()
+        if (self._address_index_updated_at is not None and
+                now - self._address_index_updated_at <
+                CONF.metadata_address_index_interval):
+            return
+        # NOTE: set before refreshing, so that concurrent requests don't
+        # refresh the index too
+        self._address_index_updated_at = now
+        try:
+            self._address_index.refresh()
+        except Exception:
+            LOG.exception(_LE('Failed to update the fixed IP address index'))
+
+    def _get_cached_metadata(self, cache_key, get_instance_id):
+        """Return the cached metadata under cache_key if it is still valid.
+
+        Metadata is served from cache for metadata_cache_expiration
+        seconds. After that it is kept if the fingerprint of the instance
+        get_instance_id() returns is unchanged, without building it again.
+        """
+        cached = self._cache.get(cache_key)
+        if not cached:
+            return None
+        data, checked_at = cached
+        now = timeutils.utcnow_ts()
+        if now - checked_at < CONF.metadata_cache_expiration:
+            return data
+
+        try:
+            instance_id = get_instance_id()
+            if (instance_id != data.uuid or
+                    base.get_metadata_fingerprint(instance_id) !=
+                    data.fingerprint):
+                return None
+        except exception.NotFound:
+            return None
+
+        LOG.debug('Metadata of instance %s is unchanged', instance_id)
+        self._cache.set(cache_key, (data, now), CACHE_MAX_AGE)
+        return data
+
+    def _set_cached_metadata(self, cache_key, data):
+        if CONF.metadata_cache_expiration > 0:
+            self._cache.set(cache_key, (data, timeutils.utcnow_ts()),
+                            CACHE_MAX_AGE)
+
+    def _load_metadata(self, cache_key, load):
+        """Load and cache the metadata under cache_key with load().
+
+        Requests missing the cache while the same metadata is loaded wait
+        for that load instead of loading it again. At most
+        metadata_max_concurrent_loads loads run at once.
+        """
+        event = self._loads.get(cache_key)
+        if event is not None:
+            self._coalesced_loads += 1
+            return event.wait()
+
+        event = eventlet.event.Event()
+        self._loads[cache_key] = event
+        try:
+            if self._load_semaphore is None:
+                data = load()
+            else:
+                with self._load_semaphore:
+                    data = load()
+            self._set_cached_metadata(cache_key, data)
+        except Exception as e:
+            event.send_exception(e)
+            raise
+        else:
+            event.send(data)
+        finally:
+            del self._loads[cache_key]
+        return data
+
+    def get_stats(self):
+        """Return the request latency histograms by path category, and the
+        number of requests which waited for the metadata loaded by another.
+        """
+        return {'latencies': dict(self._latencies),
+                'coalesced_loads': self._coalesced_loads}
+
+    def _record_latency(self, path_info, seconds):
+        category = _path_category(path_info)
+        histogram = self._latencies.get(category)
+        if histogram is None:
+            histogram = self._latencies[category] = LatencyHistogram()
+        histogram.add(seconds)
+
+        now = time.time()
+        if (CONF.metadata_stats_interval > 0 and
+                now - self._stats_logged_at >= CONF.metadata_stats_interval):
+            self._stats_logged_at = now
+            for category, histogram in sorted(self._latencies.items()):
+                LOG.info(_LI('Metadata request latency of %(category)s: '
+                             '%(histogram)s'),
+                         {'category': category, 'histogram': histogram})
+            LOG.info(_LI('Metadata requests which waited for a concurrent '
+                         'load: %d'), self._coalesced_loads)
 
     def get_metadata_by_remote_address(self, address):
         if not address:
             raise exception.FixedIpNotFoundForAddress(address=address)
 
+        if self._address_index is not None:
+            self._update_address_index()
+
+        def get_instance_id():
+            # NOTE: the address may have been given to another instance
+            return base.get_instance_id_by_address(
+                address, address_index=self._address_index)
+
         cache_key = 'metadata-%s' % address
-        data = self._cache.get(cache_key)
+        data = self._get_cached_metadata(cache_key, get_instance_id)
         if data:
             return data
 
         try:
-            data = base.get_metadata_by_address(self.conductor_api, address)
+            data = self._load_metadata(
+                cache_key,
+                lambda: base.get_metadata_by_address(
+                    self.conductor_api, address,
+                    address_index=self._address_index))
         except exception.NotFound:
             return None
 
-        self._cache.set(cache_key, data, CACHE_EXPIRATION)
-
         return data
 
     def get_metadata_by_instance_id(self, instance_id, address):
         cache_key = 'metadata-%s' % instance_id
-        data = self._cache.get(cache_key)
+        data = self._get_cached_metadata(cache_key, lambda: instance_id)
         if data:
             return data
 
         try:
-            data = base.get_metadata_by_instance_id(self.conductor_api,
-                                                    instance_id, address)
+            data = self._load_metadata(
+                cache_key,
+                lambda: base.get_metadata_by_instance_id(
+                    self.conductor_api, instance_id, address))
         except exception.NotFound:
             return None
 
-        self._cache.set(cache_key, data, CACHE_EXPIRATION)
-
         return data
 
     @webob.dec.wsgify(RequestClass=wsgi.Request)
     def __call__(self, req):
+        start = time.time()
+        try:
+            return self._serve(req)
+        finally:
+            self._record_latency(req.path_info, time.time() - start)
+
+    def _serve(self, req):
         if os.path.normpath(req.path_info) == "/":
             resp = base.ec2_md_print(base.VERSIONS + ["latest"])
             req.response.body = resp
@@ -125,16 +374,20 @@ class MetadataRequestHandler(wsgi.Application):
             raise webob.exc.HTTPNotFound()
 
         try:
-            data = meta_data.lookup(req.path_info)
+            data = meta_data.render(req.path_info)
         except base.InvalidMetadataPath:
             raise webob.exc.HTTPNotFound()
 
         if callable(data):
             return data(req, meta_data)
 
-        resp = base.ec2_md_print(data)
-        req.response.body = resp
-        req.response.content_type = meta_data.get_mimetype()
+        body, content_type, etag = data
+        req.response.headers['ETag'] = etag
+        if _etag_matches(etag, req.headers.get('If-None-Match')):
+            req.response.status = 304
+            return req.response
+        req.response.body = body
+        req.response.content_type = content_type
         return req.response
 
     def _handle_remote_ip_request(self, req):
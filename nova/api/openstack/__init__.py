@@ -193,6 +193,10 @@ class APIRouter(base_wsgi.Router):
         self._setup_routes(mapper, ext_mgr, init_only)
         self._setup_ext_routes(mapper, ext_mgr, init_only)
         self._setup_extensions(ext_mgr)
+        # NOTE: build the regular expressions matching the routes now rather
+        # than on the first request, so that the API workers forked after the
+        # application is loaded share them.
+        mapper.create_regs()
         super(APIRouter, self).__init__(mapper)
 
     def _setup_ext_routes(self, mapper, ext_mgr, init_only):
@@ -341,6 +345,8 @@ class APIRouterV21(base_wsgi.Router):
             raise exception.CoreAPIMissing(
                 missing_apis=missing_core_extensions)
 
+        # NOTE: see APIRouter, the routes are all connected by now.
+        mapper.create_regs()
         super(APIRouterV21, self).__init__(mapper)
 
     @staticmethod
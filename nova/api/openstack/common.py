@@ -32,6 +32,7 @@ from nova import exception
 from nova.i18n import _
 from nova.i18n import _LE
 from nova.i18n import _LW
+from nova import objects
 from nova.openstack.common import log as logging
 from nova import quota
 
@@ -390,6 +391,25 @@ def get_networks_for_instance(context, instance):
     return get_networks_for_instance_from_nw_info(nw_info)
 
 
+def prefetch_instances(req, instances):
+    """Fetch the data needed for a list of instances in bulk.
+
+    The method and its extensions declare what they need with
+    wsgi.prefetch() or req.add_prefetch(), this fetches it with one query
+    per kind of data instead of one per instance, and caches it in the
+    request.
+    """
+    context = req.environ['nova.context']
+    needed = req.get_prefetch()
+    if 'fault' in needed:
+        instances.fill_faults()
+    if 'block_device_mapping' in needed:
+        uuids = [instance['uuid'] for instance in instances]
+        bdms = objects.BlockDeviceMappingList.get_by_instance_uuids(
+            context, uuids)
+        req.cache_db_block_device_mappings(uuids, bdms)
+
+
 def raise_http_conflict_for_instance_invalid_state(exc, action):
     """Raises a webob.exc.HTTPConflict instance containing a message
     appropriate to return via the API based on the original
@@ -28,9 +28,10 @@ class ExtendedVolumesController(wsgi.Controller):
         super(ExtendedVolumesController, self).__init__(*args, **kwargs)
         self.compute_api = compute.API()
 
-    def _extend_server(self, context, server, instance):
-        bdms = objects.BlockDeviceMappingList.get_by_instance_uuid(
-                context, instance['uuid'])
+    def _extend_server(self, context, server, instance, bdms=None):
+        if bdms is None:
+            bdms = objects.BlockDeviceMappingList.get_by_instance_uuid(
+                    context, instance['uuid'])
         volume_ids = [bdm.volume_id for bdm in bdms if bdm.volume_id]
         key = "%s:volumes_attached" % Extended_volumes.alias
         server[key] = [{'id': volume_id} for volume_id in volume_ids]
@@ -48,6 +49,7 @@ class ExtendedVolumesController(wsgi.Controller):
             self._extend_server(context, server, db_instance)
 
     @wsgi.extends
+    @wsgi.prefetch('block_device_mapping')
     def detail(self, req, resp_obj):
         context = req.environ['nova.context']
         if authorize(context):
@@ -58,7 +60,8 @@ class ExtendedVolumesController(wsgi.Controller):
                 db_instance = req.get_db_instance(server['id'])
                 # server['id'] is guaranteed to be in the cache due to
                 # the core API adding it in its 'detail' method.
-                self._extend_server(context, server, db_instance)
+                bdms = req.get_db_block_device_mappings(server['id'])
+                self._extend_server(context, server, db_instance, bdms)
 
 
 class Extended_volumes(extensions.ExtensionDescriptor):
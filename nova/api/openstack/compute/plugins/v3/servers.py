@@ -336,7 +336,8 @@ class ServersController(wsgi.Controller):
             instance_list = objects.InstanceList(objects=[])
 
         if is_detail:
-            instance_list.fill_faults()
+            req.add_prefetch('fault')
+            common.prefetch_instances(req, instance_list)
             response = self._view_builder.detail(req, instance_list)
         else:
             response = self._view_builder.index(req, instance_list)
@@ -15,15 +15,18 @@
 #    under the License.
 
 import inspect
+import json
 import math
 import time
 from xml.dom import minidom
 
 from lxml import etree
+from oslo.config import cfg
 import six
 import webob
 
 from nova.api.openstack import xmlutil
+from nova import context as nova_context
 from nova import exception
 from nova import i18n
 from nova.i18n import _
@@ -35,6 +38,17 @@ from nova import utils
 from nova import wsgi
 
 
+wsgi_opts = [
+    cfg.IntOpt('osapi_json_stream_threshold',
+               default=0,
+               help='Number of items in a list response from which its JSON '
+                    'body is sent in chunks as it is serialized, instead of '
+                    'being serialized at once. 0 disables streaming.'),
+]
+
+CONF = cfg.CONF
+CONF.register_opts(wsgi_opts)
+
 XMLNS_V10 = 'http://docs.rackspacecloud.com/servers/api/v1.0'
 XMLNS_V11 = 'http://docs.openstack.org/compute/api/v1.1'
 
@@ -71,13 +85,20 @@ _METHODS_WITH_BODY = [
     'PUT',
 ]
 
+# Serializes the JSON native types with the C encoder, like json.dumps(),
+# and other types, like datetimes, like jsonutils.dumps()
+_JSON_ENCODER = json.JSONEncoder(default=jsonutils.to_primitive)
+
+# Number of items of a streamed list response serialized per chunk
+_JSON_STREAM_CHUNK_ITEMS = 100
+
 
 class Request(webob.Request):
     """Add some OpenStack API-specific logic to the base webob.Request."""
 
     def __init__(self, *args, **kwargs):
         super(Request, self).__init__(*args, **kwargs)
-        self._extension_data = {'db_items': {}}
+        self._extension_data = {'db_items': {}, 'prefetch': set()}
 
     def cache_db_items(self, key, items, item_key='id'):
         """Allow API methods to store objects from a DB query to be
@@ -143,6 +164,30 @@ class Request(webob.Request):
     def get_db_compute_node(self, id):
         return self.get_db_item('compute_nodes', id)
 
+    def cache_db_block_device_mappings(self, instance_uuids, bdms):
+        db_items = self._extension_data['db_items'].setdefault(
+            'block_device_mappings', {})
+        for instance_uuid in instance_uuids:
+            db_items.setdefault(instance_uuid, [])
+        for bdm in bdms:
+            db_items[bdm.instance_uuid].append(bdm)
+
+    def get_db_block_device_mappings(self, instance_uuid):
+        """Return the block device mappings of an instance, or None if
+        they were not fetched within the same API request.
+        """
+        db_items = self._extension_data['db_items']
+        return db_items.get('block_device_mappings', {}).get(instance_uuid)
+
+    def add_prefetch(self, *attrs):
+        """Declare instance data needed by an API extension, see
+        prefetch().
+        """
+        self._extension_data['prefetch'].update(attrs)
+
+    def get_prefetch(self):
+        return self._extension_data['prefetch']
+
     def best_match_content_type(self):
         """Determine the requested response content-type."""
         if 'nova.best_content_type' not in self.environ:
@@ -349,7 +394,38 @@ class JSONDictSerializer(DictSerializer):
     """Default JSON request body serialization."""
 
     def default(self, data):
-        return jsonutils.dumps(data)
+        return _JSON_ENCODER.encode(data)
+
+    def serialize_chunks(self, data):
+        """Serialize a list response in chunks.
+
+        Returns an iterator over the JSON of data, serialized at most
+        _JSON_STREAM_CHUNK_ITEMS list items at a time, or None if data
+        doesn't hold a list of osapi_json_stream_threshold items or more.
+        """
+        threshold = CONF.osapi_json_stream_threshold
+        if threshold <= 0 or not isinstance(data, dict):
+            return None
+        lists = [key for key, value in data.items()
+                 if isinstance(value, list) and len(value) >= threshold]
+        if len(lists) != 1:
+            return None
+        return self._iter_chunks(data, lists[0])
+
+    def _iter_chunks(self, data, list_key):
+        # NOTE: the list is written last, the order of the other keys
+        # doesn't matter in a JSON object
+        head = ''.join('%s: %s, ' % (_JSON_ENCODER.encode(key),
+                                     _JSON_ENCODER.encode(value))
+                       for key, value in data.items() if key != list_key)
+        yield '{%s%s: [' % (head, _JSON_ENCODER.encode(list_key))
+        items = data[list_key]
+        for start in range(0, len(items), _JSON_STREAM_CHUNK_ITEMS):
+            chunk = ', '.join(
+                _JSON_ENCODER.encode(item) for item in
+                items[start:start + _JSON_STREAM_CHUNK_ITEMS])
+            yield ', ' + chunk if start else chunk
+        yield ']}'
 
 
 class XMLDictSerializer(DictSerializer):
@@ -609,7 +685,13 @@ class ResponseObject(object):
             response.headers[hdr] = utils.utf8(str(value))
         response.headers['Content-Type'] = utils.utf8(content_type)
         if self.obj is not None:
-            response.body = serializer.serialize(self.obj)
+            chunks = None
+            if isinstance(serializer, JSONDictSerializer):
+                chunks = serializer.serialize_chunks(self.obj)
+            if chunks is not None:
+                response.app_iter = chunks
+            else:
+                response.body = serializer.serialize(self.obj)
 
         return response
 
@@ -829,6 +911,12 @@ class Resource(wsgi.Application):
         # List of callables for post-processing extensions
         post = []
 
+        # Collect the instance data the extensions need first, so that
+        # the method can fetch it in bulk
+        for ext in extensions:
+            if hasattr(ext, 'wsgi_prefetch'):
+                request.add_prefetch(*ext.wsgi_prefetch)
+
         for ext in extensions:
             if inspect.isgeneratorfunction(ext):
                 response = None
@@ -1003,6 +1091,11 @@ class Resource(wsgi.Application):
                 response = resp_obj.serialize(request, accept,
                                               self.default_serializers)
 
+        if (isinstance(context, nova_context.RequestContext) and
+                context.db_queries):
+            LOG.debug("Method '%(meth)s' made %(queries)d database queries",
+                      {'meth': str(meth), 'queries': context.db_queries})
+
         if hasattr(response, 'headers'):
 
             for hdr, val in response.headers.items():
@@ -1102,6 +1195,26 @@ def extends(*args, **kwargs):
     return decorator
 
 
+def prefetch(*attrs):
+    """Indicate the instance data an extension needs.
+
+    For example::
+
+        @extends
+        @prefetch('block_device_mapping')
+        def detail(...):
+            pass
+
+    The data is then fetched in bulk for all the instances of the
+    request, see common.prefetch_instances().
+    """
+
+    def decorator(func):
+        func.wsgi_prefetch = attrs
+        return func
+    return decorator
+
+
 class ControllerMetaclass(type):
     """Controller metaclass.
 
@@ -151,6 +151,10 @@ class ConstantSelector(object):
 class TemplateElement(object):
     """Represent an element in the template."""
 
+    # Set once the element is part of a compiled template, see
+    # _CompiledElement
+    _compiled = False
+
     def __init__(self, tag, attrib=None, selector=None, subselector=None,
                  colon_ns=False, **extra):
         """Initialize an element.
@@ -240,6 +244,7 @@ class TemplateElement(object):
 
         self._children.append(elem)
         self._childmap[elem.tag] = elem
+        self._changed()
 
     def extend(self, elems):
         """Append children to the element."""
@@ -261,6 +266,7 @@ class TemplateElement(object):
         # Update the children
         self._children.extend(elemlist)
         self._childmap.update(elemmap)
+        self._changed()
 
     def insert(self, idx, elem):
         """Insert a child element at the given index."""
@@ -274,6 +280,7 @@ class TemplateElement(object):
 
         self._children.insert(idx, elem)
         self._childmap[elem.tag] = elem
+        self._changed()
 
     def remove(self, elem):
         """Remove a child element."""
@@ -287,6 +294,13 @@ class TemplateElement(object):
 
         self._children.remove(elem)
         del self._childmap[elem.tag]
+        self._changed()
+
+    def _changed(self):
+        """Drop the compiled templates this element is part of."""
+
+        if self._compiled:
+            _COMPILED.clear()
 
     def get(self, key):
         """Get an attribute.
@@ -317,6 +331,7 @@ class TemplateElement(object):
             value = Selector(value)
 
         self.attrib[key] = value
+        self._changed()
 
     def keys(self):
         """Return the attribute names."""
@@ -484,9 +499,11 @@ class TemplateElement(object):
             value = Selector(value)
 
         self._text = value
+        self._changed()
 
     def _text_del(self):
         self._text = None
+        self._changed()
 
     text = property(_text_get, _text_set, _text_del)
 
@@ -543,6 +560,165 @@ def SubTemplateElement(parent, tag, attrib=None, selector=None,
     return elem
 
 
+# Compiled templates, by the tuple of root siblings they were compiled from
+_COMPILED = {}
+_MAX_COMPILED = 1000
+
+
+def _compile_selector(selector):
+    """Return a faster equivalent of a Selector indexing by plain keys."""
+
+    if type(selector) is not Selector or len(selector.chain) > 1:
+        return selector
+    if not selector.chain:
+        return lambda obj, do_raise=False: obj
+
+    key = selector.chain[0]
+    if callable(key):
+        return selector
+
+    def select(obj, do_raise=False):
+        if obj == '':
+            return ''
+        try:
+            return obj[key]
+        except (KeyError, IndexError):
+            if do_raise:
+                raise KeyError(key)
+            return None
+
+    return select
+
+
+def _overrides(elem, name):
+    """Return whether the class of elem overrides a TemplateElement method."""
+
+    # NOTE: unbound methods are not the same object from one lookup to the
+    # next, but compare equal
+    return getattr(type(elem), name) != getattr(TemplateElement, name)
+
+
+class _CompiledElement(object):
+    """A template element compiled with its patches and children.
+
+    Template._serialize() works out the siblings of every child element
+    each time an object is serialized.  This is done once here, and for
+    plain TemplateElement instances the selectors, attributes and text of
+    the element and its patches are collected up front so that rendering
+    an element does not need to walk them all again.  Subclasses of
+    TemplateElement overriding anything but will_render() are rendered
+    through their render() method.
+    """
+
+    def __init__(self, siblings):
+        elem = siblings[0]
+        self.element = elem
+        self.patches = siblings[1:]
+        for sibling in siblings:
+            sibling._compiled = True
+
+        self.fast = (not _overrides(elem, 'render') and
+                     not _overrides(elem, '_render') and
+                     not any(_overrides(sibling, 'apply')
+                             for sibling in siblings))
+        if self.fast:
+            self.tag = elem.tag
+            self.colon_ns = elem.colon_ns
+            self.selector = _compile_selector(elem.selector)
+            self.subselector = elem.subselector
+            if not _overrides(elem, 'will_render'):
+                self.will_render = None
+            else:
+                self.will_render = elem.will_render
+            # Patches are applied after the element, so later values win
+            self.texts = [sibling.text for sibling in siblings
+                          if sibling.text is not None]
+            self.attrib = [(key, _compile_selector(value))
+                           for sibling in siblings
+                           for key, value in sibling.attrib.items()]
+
+        # Merge the children of the siblings, as Template._serialize() does
+        self.children = []
+        seen = set()
+        for idx, sibling in enumerate(siblings):
+            for child in sibling:
+                if child.tag in seen:
+                    continue
+                seen.add(child.tag)
+
+                nieces = [child]
+                for sib in siblings[idx + 1:]:
+                    if child.tag in sib:
+                        nieces.append(sib[child.tag])
+                self.children.append(_CompiledElement(nieces))
+
+    def _make_element(self, parent, datum, nsmap):
+        tagname = self.tag(datum) if callable(self.tag) else self.tag
+        if self.colon_ns and ':' in tagname:
+            if nsmap is None:
+                nsmap = {}
+            colon_key, colon_name = tagname.split(':')
+            nsmap[colon_key] = colon_key
+            tagname = '{%s}%s' % (colon_key, colon_name)
+
+        if parent is None:
+            elem = etree.Element(tagname, nsmap=nsmap)
+        else:
+            elem = etree.SubElement(parent, tagname, nsmap=nsmap)
+
+        if datum is None:
+            return elem
+
+        for text in self.texts:
+            elem.text = unicode(text(datum))
+        for key, value in self.attrib:
+            try:
+                elem.set(key, unicode(value(datum, True)))
+            except KeyError:
+                # Attribute has no value, so don't include it
+                pass
+        return elem
+
+    def _render(self, parent, obj, nsmap):
+        # Same as TemplateElement.render()
+        data = None if obj is None else self.selector(obj)
+
+        if self.will_render is None:
+            if data is None:
+                return []
+        elif not self.will_render(data):
+            return []
+        elif data is None:
+            return [(self._make_element(parent, None, nsmap), None)]
+
+        if not isinstance(data, list):
+            data = [data]
+        elif parent is None:
+            raise ValueError(_('root element selecting a list'))
+
+        elems = []
+        for datum in data:
+            if self.subselector is not None:
+                datum = self.subselector(datum)
+            elems.append((self._make_element(parent, datum, nsmap), datum))
+        return elems
+
+    def render(self, parent, obj, nsmap=None):
+        """Render an object, returning the first element rendered."""
+
+        if self.fast:
+            elems = self._render(parent, obj, nsmap)
+        else:
+            elems = self.element.render(parent, obj, self.patches, nsmap)
+
+        for child in self.children:
+            for elem, datum in elems:
+                child.render(elem, datum)
+
+        if elems:
+            return elems[0][0]
+
+
 class Template(object):
     """Represent a template."""
 
@@ -640,8 +816,14 @@ class Template(object):
         siblings = self._siblings()
         nsmap = self._nsmap()
 
-        # Form the element tree
-        return self._serialize(None, obj, siblings, nsmap)
+        # Form the element tree, compiling the template on first use
+        key = tuple(siblings)
+        compiled = _COMPILED.get(key)
+        if compiled is None:
+            if len(_COMPILED) >= _MAX_COMPILED:
+                _COMPILED.clear()
+            compiled = _COMPILED[key] = _CompiledElement(siblings)
+        return compiled.render(None, obj, nsmap)
 
     def _siblings(self):
         """Hook method for computing root siblings.
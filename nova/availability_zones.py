@@ -19,8 +19,8 @@ import collections
 
 from oslo.config import cfg
 
+from nova import cache_utils
 from nova import objects
-from nova.openstack.common import memorycache
 
 # NOTE(vish): azs don't change that often, so cache them for an hour to
 #             avoid hitting the db multiple times on every request.
@@ -44,7 +44,7 @@ def _get_cache():
     global MC
 
     if MC is None:
-        MC = memorycache.get_client()
+        MC = cache_utils.get_client()
 
     return MC
 
@@ -120,6 +120,26 @@ def get_host_availability_zone(context, host, conductor_api=None):
     return az
 
 
+def get_host_availability_zones(context, hosts):
+    """Return a dict of the availability zone of each of the given hosts,
+    looked up with a single query whatever the number of hosts.
+    """
+    hosts = set(hosts)
+    metadata = {}
+    # NOTE: an empty hosts filter would return the aggregates of all hosts
+    if any(hosts):
+        aggregates = objects.AggregateList.get_by_metadata_key(context,
+                'availability_zone', hosts=hosts)
+        metadata = _build_metadata_by_host(aggregates, hosts=hosts)
+    azs = {}
+    for host in hosts:
+        if metadata.get(host):
+            azs[host] = list(metadata[host])[0]
+        else:
+            azs[host] = CONF.default_availability_zone
+    return azs
+
+
 def update_host_availability_zone_cache(context, host, availability_zone=None):
     if not availability_zone:
         availability_zone = get_host_availability_zone(context, host)
@@ -0,0 +1,152 @@
+# Copyright 2014 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Memcached client, or an in process cache when no servers are set."""
+
+import collections
+import heapq
+
+from oslo.config import cfg
+
+from nova.openstack.common import timeutils
+
+cache_opts = [
+    cfg.IntOpt('memory_cache_max_entries',
+               default=0,
+               help='Maximum number of entries of the in process cache, '
+                    'used when memcached_servers is not set. The least '
+                    'recently used entries are evicted beyond it. 0 means '
+                    'unlimited.'),
+]
+
+CONF = cfg.CONF
+CONF.register_opts(cache_opts)
+CONF.import_opt('memcached_servers', 'nova.openstack.common.memorycache')
+
+
+def get_client(memcached_servers=None):
+    client_cls = Client
+
+    if not memcached_servers:
+        memcached_servers = CONF.memcached_servers
+    if memcached_servers:
+        import memcache
+        client_cls = memcache.Client
+
+    return client_cls(memcached_servers, debug=0)
+
+
+class Client(object):
+    """Replicates a tiny subset of memcached client interface.
+
+    Entries are kept in least recently used order, and their expiry
+    times in a heap, so that every operation takes constant or
+    logarithmic time whatever the number of entries.
+    """
+
+    def __init__(self, *args, **kwargs):
+        """Ignores the passed in args."""
+        self.cache = collections.OrderedDict()
+        self._expiry = []
+        self.max_entries = kwargs.get('max_entries',
+                                      CONF.memory_cache_max_entries)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def _expire(self):
+        now = timeutils.utcnow_ts()
+        while self._expiry and now >= self._expiry[0][0]:
+            timeout, key = heapq.heappop(self._expiry)
+            # NOTE: the heap may still hold the timeouts of keys that were
+            # set again or deleted since.
+            entry = self.cache.get(key)
+            if entry is not None and entry[0] == timeout:
+                del self.cache[key]
+                self.expirations += 1
+
+    def _compact(self):
+        # NOTE: keys set over and over again leave stale timeouts behind,
+        # rebuild the heap before they outnumber the entries.
+        if len(self._expiry) > 2 * len(self.cache) + 64:
+            self._expiry = [(timeout, key)
+                            for key, (timeout, _value) in self.cache.items()
+                            if timeout]
+            heapq.heapify(self._expiry)
+
+    def _lookup(self, key):
+        self._expire()
+        entry = self.cache.pop(key, None)
+        if entry is not None:
+            # NOTE: reinserting moves the key to the most recently used end
+            self.cache[key] = entry
+        return entry
+
+    def get(self, key):
+        """Retrieves the value for a key or None.
+
+        This expunges expired keys during each get.
+        """
+        entry = self._lookup(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return entry[1]
+
+    def set(self, key, value, time=0, min_compress_len=0):
+        """Sets the value for a key."""
+        timeout = 0
+        if time != 0:
+            timeout = timeutils.utcnow_ts() + time
+            heapq.heappush(self._expiry, (timeout, key))
+        self.cache.pop(key, None)
+        self.cache[key] = (timeout, value)
+        if self.max_entries:
+            while len(self.cache) > self.max_entries:
+                self.cache.popitem(last=False)
+                self.evictions += 1
+        self._compact()
+        return True
+
+    def add(self, key, value, time=0, min_compress_len=0):
+        """Sets the value for a key if it doesn't exist."""
+        if self._lookup(key) is not None:
+            return False
+        return self.set(key, value, time, min_compress_len)
+
+    def incr(self, key, delta=1):
+        """Increments the value for a key."""
+        entry = self._lookup(key)
+        if entry is None:
+            return None
+        new_value = int(entry[1]) + delta
+        self.cache[key] = (entry[0], str(new_value))
+        return new_value
+
+    def delete(self, key, time=0):
+        """Deletes the value associated with a key."""
+        if key in self.cache:
+            del self.cache[key]
+
+    def get_stats(self):
+        """Returns the statistics of the cache, named as memcached's."""
+        self._expire()
+        return [('memory', {'curr_items': len(self.cache),
+                            'get_hits': self.hits,
+                            'get_misses': self.misses,
+                            'evictions': self.evictions,
+                            'expired': self.expirations})]
@@ -25,6 +25,7 @@ import sys
 from oslo.config import cfg
 
 from nova import config
+from nova.i18n import _LI
 from nova import objects
 from nova.openstack.common import log as logging
 from nova.openstack.common.report import guru_meditation_report as gmr
@@ -32,9 +33,34 @@ from nova import service
 from nova import utils
 from nova import version
 
+opts = [
+    cfg.BoolOpt('profile_startup',
+                default=False,
+                help='Log the time spent importing each module while the '
+                     'API applications are loaded, slowest first'),
+    ]
+
 CONF = cfg.CONF
+CONF.register_cli_opts(opts)
 CONF.import_opt('enabled_apis', 'nova.service')
 CONF.import_opt('enabled_ssl_apis', 'nova.service')
+LOG = logging.getLogger(__name__)
+
+# Number of modules reported with profile_startup
+PROFILE_STARTUP_MODULES = 50
+
+
+def _create_servers():
+    servers = []
+    for api in CONF.enabled_apis:
+        should_use_ssl = api in CONF.enabled_ssl_apis
+        if api == 'ec2':
+            server = service.WSGIService(api, use_ssl=should_use_ssl,
+                                         max_url_len=16384)
+        else:
+            server = service.WSGIService(api, use_ssl=should_use_ssl)
+        servers.append(server)
+    return servers
 
 
 def main():
@@ -46,12 +72,17 @@ def main():
     gmr.TextGuruMeditation.setup_autorun(version)
 
     launcher = service.process_launcher()
-    for api in CONF.enabled_apis:
-        should_use_ssl = api in CONF.enabled_ssl_apis
-        if api == 'ec2':
-            server = service.WSGIService(api, use_ssl=should_use_ssl,
-                                         max_url_len=16384)
-        else:
-            server = service.WSGIService(api, use_ssl=should_use_ssl)
+    # NOTE: the API applications, their extensions and routes are all loaded
+    # before the workers are forked, which share them copy-on-write.
+    if CONF.profile_startup:
+        with utils.ImportProfiler() as profiler:
+            servers = _create_servers()
+        LOG.info(_LI('Modules imported while loading the API '
+                     'applications:\n%s'),
+                 '\n'.join(profiler.report(PROFILE_STARTUP_MODULES)))
+    else:
+        servers = _create_servers()
+
+    for server in servers:
         launcher.launch_service(server, workers=server.workers or 1)
     launcher.wait()
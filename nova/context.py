@@ -88,6 +88,11 @@ class RequestContext(object):
             self.service_catalog = []
 
         self.instance_lock_checked = instance_lock_checked
+        # Policy decisions made in this context, see nova.policy.enforce
+        self.policy_decisions = {}
+        # Database queries made while this was the current context, see
+        # nova.db.sqlalchemy.api
+        self.db_queries = 0
 
         # NOTE(markmc): this attribute is currently only used by the
         # rs_limits turnstile pre-processor.
@@ -208,6 +208,18 @@ def compute_node_search_by_hypervisor(context, hypervisor_match):
     return IMPL.compute_node_search_by_hypervisor(context, hypervisor_match)
 
 
+def compute_node_search_by_stats(context, stats_match):
+    """Get compute nodes by a string in their stats.
+
+    :param context: The security context
+    :param stats_match: A string contained in the serialized stats
+
+    :returns: List of dictionary-like objects each containing compute node
+              properties, including corresponding service
+    """
+    return IMPL.compute_node_search_by_stats(context, stats_match)
+
+
 def compute_node_create(context, values):
     """Create a compute node from the values dictionary.
 
@@ -1210,6 +1222,13 @@ def block_device_mapping_get_all_by_instance(context, instance_uuid,
                                                          use_slave)
 
 
+def block_device_mapping_get_all_by_instance_uuids(context, instance_uuids,
+                                                   use_slave=False):
+    """Get all block device mapping belonging to a list of instances."""
+    return IMPL.block_device_mapping_get_all_by_instance_uuids(
+        context, instance_uuids, use_slave)
+
+
 def block_device_mapping_get_by_volume_id(context, volume_id,
         columns_to_join=None):
     """Get block device mapping for a given volume."""
@@ -1885,6 +1904,11 @@ def ec2_instance_get_by_id(context, instance_id):
     return IMPL.ec2_instance_get_by_id(context, instance_id)
 
 
+def ec2_instance_get_all_by_uuids(context, instance_uuids):
+    """Get the ec2 id mappings of a list of instances."""
+    return IMPL.ec2_instance_get_all_by_uuids(context, instance_uuids)
+
+
 ####################
 
 
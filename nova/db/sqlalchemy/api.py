@@ -33,6 +33,7 @@ from oslo.db.sqlalchemy import utils as sqlalchemyutils
 import six
 from sqlalchemy import and_
 from sqlalchemy import Boolean
+from sqlalchemy import event
 from sqlalchemy.exc import NoSuchTableError
 from sqlalchemy import Integer
 from sqlalchemy import MetaData
@@ -59,6 +60,7 @@ from nova.db.sqlalchemy import models
 from nova import exception
 from nova.i18n import _
 from nova.openstack.common import excutils
+from nova.openstack.common import local
 from nova.openstack.common import log as logging
 from nova.openstack.common import timeutils
 from nova.openstack.common import uuidutils
@@ -83,12 +85,27 @@ _ENGINE_FACADE = None
 _LOCK = threading.Lock()
 
 
+def _count_query(conn, cursor, statement, parameters, context, executemany):
+    # NOTE: 'SELECT 1' is the check of the connections taken from the pool
+    ctxt = getattr(local.store, 'context', None)
+    if (isinstance(ctxt, nova.context.RequestContext) and
+            statement != 'SELECT 1'):
+        ctxt.db_queries += 1
+
+
 def _create_facade_lazily():
     global _LOCK, _ENGINE_FACADE
     if _ENGINE_FACADE is None:
         with _LOCK:
             if _ENGINE_FACADE is None:
-                _ENGINE_FACADE = db_session.EngineFacade.from_config(CONF)
+                facade = db_session.EngineFacade.from_config(CONF)
+                # Count the queries made for the current request context
+                engines = set([facade.get_engine(),
+                               facade.get_engine(use_slave=True)])
+                for engine in engines:
+                    event.listen(engine, 'before_cursor_execute',
+                                 _count_query)
+                _ENGINE_FACADE = facade
     return _ENGINE_FACADE
 
 
@@ -605,6 +622,15 @@ def compute_node_search_by_hypervisor(context, hypervisor_match):
             all()
 
 
+@require_admin_context
+def compute_node_search_by_stats(context, stats_match):
+    field = models.ComputeNode.stats
+    return model_query(context, models.ComputeNode).\
+            options(joinedload('service')).\
+            filter(field.like('%%%s%%' % stats_match)).\
+            all()
+
+
 @require_admin_context
 def compute_node_create(context, values):
     """Creates a new ComputeNode and populates the capacity fields
@@ -774,17 +800,34 @@ def floating_ip_bulk_create(context, ips):
     session = get_session()
     result = []
     with session.begin():
+        # NOTE: look for existing addresses a block at a time rather than
+        # flushing every new row on its own, so that creating a large pool
+        # only takes a few queries and a single flush.
+        addresses = set()
+        for ip in ips:
+            if ip['address'] in addresses:
+                raise exception.FloatingIpExists(address=ip['address'])
+            addresses.add(ip['address'])
+        for ip_block in _ip_range_splitter(ips):
+            existing = model_query(context, models.FloatingIp.address,
+                                   base_model=models.FloatingIp,
+                                   session=session).\
+                filter(models.FloatingIp.address.in_(ip_block)).\
+                first()
+            if existing:
+                raise exception.FloatingIpExists(address=existing[0])
+
         for ip in ips:
             model = models.FloatingIp()
             model.update(ip)
             result.append(model)
-            try:
-                # NOTE(boris-42): To get existing address we have to do each
-                #                  time session.flush()..
-                session.add(model)
-                session.flush()
-            except db_exc.DBDuplicateEntry:
-                raise exception.FloatingIpExists(address=ip['address'])
+            session.add(model)
+        try:
+            session.flush()
+        except db_exc.DBDuplicateEntry:
+            # NOTE: an address was created concurrently in the meantime.
+            raise exception.FloatingIpExists(
+                address=', '.join(ip['address'] for ip in ips))
     return result
 
 
@@ -3635,6 +3678,17 @@ def block_device_mapping_get_all_by_instance(context, instance_uuid,
                  all()
 
 
+@require_context
+def block_device_mapping_get_all_by_instance_uuids(context, instance_uuids,
+                                                   use_slave=False):
+    if not instance_uuids:
+        return []
+    return _block_device_mapping_get_query(context, use_slave=use_slave).\
+                 filter(models.BlockDeviceMapping.instance_uuid.in_(
+                     instance_uuids)).\
+                 all()
+
+
 @require_context
 def block_device_mapping_get_by_volume_id(context, volume_id,
         columns_to_join=None):
@@ -5569,6 +5623,15 @@ def ec2_instance_get_by_id(context, instance_id):
     return result
 
 
+@require_context
+def ec2_instance_get_all_by_uuids(context, instance_uuids):
+    if not instance_uuids:
+        return []
+    return _ec2_instance_get_query(context).\
+                    filter(models.InstanceIdMapping.uuid.in_(instance_uuids)).\
+                    all()
+
+
 @require_context
 def get_instance_uuid_by_ec2_id(context, ec2_id):
     result = ec2_instance_get_by_id(context, ec2_id)
@@ -0,0 +1,114 @@
+# Copyright 2014 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import hashlib
+import httplib
+import logging
+import random
+import socket
+
+from oslo.config import cfg
+
+from nova import exception
+from nova.i18n import _
+import nova.image.download.base as xfer_base
+from nova import objects
+from nova.virt.libvirt import imagepeer
+
+
+CONF = cfg.CONF
+LOG = logging.getLogger(__name__)
+
+opt_group = cfg.IntOpt(name='max_peers', default=3,
+                       help=_('Maximum number of compute nodes an image is '
+                              'tried to be fetched from before falling back '
+                              'to glance'))
+CONF.register_opt(opt_group, group='image_peer')
+CONF.import_opt('force_raw_images', 'nova.virt.images')
+
+
+#  This module fetches an image from the image cache of another compute node
+#  that advertises it in its host stats, see nova.virt.libvirt.imagepeer. To
+#  use it add 'peer' to the [glance] allowed_direct_url_schemes list, and
+#  set [libvirt] image_peer_port and image_peer_secret on the compute nodes
+#  serving their cached images. Only images cached as downloaded from glance,
+#  that is raw images or any image when force_raw_images is disabled, are
+#  fetched from other compute nodes, as the copies are checked against the
+#  checksum glance has.
+
+
+class PeerTransfer(xfer_base.TransferBase):
+
+    def _find_peers(self, context, fname):
+        own_url = imagepeer.get_url() if imagepeer.enabled() else None
+        peers = []
+        nodes = objects.ComputeNodeList.get_by_stats(context.elevated(),
+                                                     fname)
+        for node in nodes:
+            stats = node.stats or {}
+            url = stats.get('image_peer_url')
+            if (url and url != own_url and
+                    fname in (stats.get('cached_images') or '').split(',')):
+                peers.append(url)
+        random.shuffle(peers)
+        return peers[:CONF.image_peer.max_peers]
+
+    def download(self, context, url_parts, dst_file, metadata, **kwargs):
+        image_id = url_parts.path.strip('/')
+        checksum = metadata.get('checksum')
+        if not checksum:
+            msg = _('Image %s has no checksum to check copies '
+                    'against') % image_id
+            raise exception.ImageDownloadModuleError(reason=msg,
+                                                     module=str(self))
+        if CONF.force_raw_images and metadata.get('disk_format') != 'raw':
+            msg = _('Compute nodes cache image %s converted to '
+                    'raw') % image_id
+            raise exception.ImageDownloadModuleError(reason=msg,
+                                                     module=str(self))
+
+        fname = hashlib.sha1(image_id).hexdigest()
+        for url in self._find_peers(context, fname):
+            # NOTE: socket.error includes socket.timeout, a peer that
+            # stops sending data is skipped like one that fails.
+            try:
+                received = imagepeer.fetch(url, fname, dst_file)
+            except (IOError, httplib.HTTPException, socket.error) as ex:
+                LOG.warn(_('Fetching image %(image_id)s from %(url)s '
+                           'failed: %(ex)s') %
+                         {'image_id': image_id, 'url': url, 'ex': ex})
+                continue
+            if received != checksum:
+                LOG.warn(_('Image %(image_id)s fetched from %(url)s has '
+                           'checksum %(received)s instead of %(checksum)s') %
+                         {'image_id': image_id, 'url': url,
+                          'received': received, 'checksum': checksum})
+                continue
+            LOG.info(_('Fetched image %(image_id)s from %(url)s using '
+                       '%(module_str)s') %
+                     {'image_id': image_id, 'url': url,
+                      'module_str': str(self)})
+            return
+        msg = _('No compute node could serve image %s') % image_id
+        raise exception.ImageDownloadModuleError(reason=msg,
+                                                 module=str(self))
+
+
+def get_download_handler(**kwargs):
+    return PeerTransfer()
+
+
+def get_schemes():
+    return ['peer']
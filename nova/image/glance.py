@@ -18,11 +18,18 @@
 from __future__ import absolute_import
 
 import copy
+import hashlib
+import httplib
 import itertools
+import os
 import random
+import socket
+import ssl
 import sys
 import time
 
+import eventlet
+from eventlet import tpool
 import glanceclient
 import glanceclient.exc
 from oslo.config import cfg
@@ -31,10 +38,12 @@ import six.moves.urllib.parse as urlparse
 
 from nova import exception
 from nova.i18n import _
+from nova.i18n import _LW
 import nova.image.download as image_xfers
 from nova.openstack.common import jsonutils
 from nova.openstack.common import log as logging
 from nova.openstack.common import timeutils
+from nova.openstack.common import units
 from nova import utils
 
 
@@ -67,6 +76,15 @@ glance_opts = [
                      'glance',
                deprecated_group='DEFAULT',
                deprecated_name='glance_api_insecure'),
+    cfg.StrOpt('ca_file',
+               help='CA certificate file used to verify glance api servers '
+                    'over SSL. The system CAs are used if it is not set.'),
+    cfg.StrOpt('cert_file',
+               help='Client certificate file sent to glance api servers '
+                    'over SSL'),
+    cfg.StrOpt('key_file',
+               help='Private key file of the client certificate sent to '
+                    'glance api servers over SSL'),
     cfg.IntOpt('num_retries',
                default=0,
                help='Number of retries when downloading an image from glance',
@@ -78,6 +96,15 @@ glance_opts = [
                      'via the direct_url.  Currently supported schemes: '
                      '[file].',
                deprecated_group='DEFAULT'),
+    cfg.IntOpt('download_streams',
+               default=1,
+               help='Number of parallel HTTP range requests used to download '
+                    'an image from glance to a local file. The default of 1 '
+                    'downloads the image as a single stream.'),
+    cfg.IntOpt('range_timeout',
+               default=60,
+               help='Timeout in seconds of the socket operations of each '
+                    'HTTP range request. 0 means no timeout.'),
     ]
 
 LOG = logging.getLogger(__name__)
@@ -88,6 +115,13 @@ CONF.import_opt('auth_strategy', 'nova.api.auth')
 CONF.import_opt('my_ip', 'nova.netconf')
 
 
+# Images are fetched in ranges of this size when download_streams > 1
+_RANGE_SIZE = 64 * units.Mi
+_READ_CHUNK_SIZE = units.Mi
+# Paths of the image data for each glance API version
+_IMAGE_DATA_PATHS = {1: '/v1/images/%s', 2: '/v2/images/%s/file'}
+
+
 def generate_glance_url():
     """Generate the URL to glance."""
     glance_host = CONF.glance.host
@@ -137,6 +171,12 @@ def _create_glance_client(context, host, port, use_ssl, version=1):
         # https specific params
         params['insecure'] = CONF.glance.api_insecure
         params['ssl_compression'] = False
+        if CONF.glance.ca_file:
+            params['cacert'] = CONF.glance.ca_file
+        if CONF.glance.cert_file:
+            params['cert_file'] = CONF.glance.cert_file
+        if CONF.glance.key_file:
+            params['key_file'] = CONF.glance.key_file
     else:
         scheme = 'http'
 
@@ -202,13 +242,19 @@ class GlanceClientWrapper(object):
 
     def _create_onetime_client(self, context, version):
         """Create a client that will be used for one call."""
-        if self.api_servers is None:
-            self.api_servers = get_api_servers()
-        self.host, self.port, self.use_ssl = self.api_servers.next()
+        self.host, self.port, self.use_ssl = self.next_endpoint()
         return _create_glance_client(context,
                                      self.host, self.port,
                                      self.use_ssl, version)
 
+    def next_endpoint(self):
+        """Return the (host, port, use_ssl) of the next glance server."""
+        if self.client is not None:
+            return self.host, self.port, self.use_ssl
+        if self.api_servers is None:
+            self.api_servers = get_api_servers()
+        return self.api_servers.next()
+
     def call(self, context, version, method, *args, **kwargs):
         """Call a glance client method.  If we get a connection error,
         retry the request according to CONF.glance.num_retries.
@@ -331,7 +377,17 @@ class GlanceImageService(object):
         """Calls out to Glance for data and writes data."""
         if CONF.glance.allowed_direct_url_schemes and dst_path is not None:
             image = self.show(context, image_id, include_locations=True)
-            for entry in image.get('locations', []):
+            locations = image.get('locations', [])
+            if 'peer' in self._download_handlers:
+                # NOTE: other compute nodes caching the image are tried
+                # before the locations glance knows about, their copies
+                # are checked against the checksum glance has.
+                locations.insert(0, {'url': 'peer:///%s' % image_id,
+                                     'metadata': {
+                                         'checksum': image.get('checksum'),
+                                         'disk_format':
+                                             image.get('disk_format')}})
+            for entry in locations:
                 loc_url = entry['url']
                 loc_meta = entry['metadata']
                 o = urlparse.urlparse(loc_url)
@@ -346,8 +402,20 @@ class GlanceImageService(object):
                     except Exception as ex:
                         LOG.exception(ex)
 
+        version = 1
+        if (CONF.glance.download_streams > 1 and data is None and
+                dst_path is not None):
+            try:
+                self._download_ranges(context, image_id, dst_path, version)
+                return
+            except Exception as ex:
+                LOG.warn(_LW('Ranged download of image %(image_id)s failed, '
+                             'downloading it as a single stream: %(ex)s'),
+                         {'image_id': image_id, 'ex': ex})
+
         try:
-            image_chunks = self._client.call(context, 1, 'data', image_id)
+            image_chunks = self._client.call(context, version, 'data',
+                                             image_id)
         except Exception:
             _reraise_translated_image_exception(image_id)
 
@@ -366,6 +434,38 @@ class GlanceImageService(object):
                 if close_file:
                     data.close()
 
+    def _download_ranges(self, context, image_id, dst_path, version):
+        """Download an image with parallel HTTP range requests to the
+        image data path of the given glance API version.
+
+        Each range is written at its offset in dst_path and is retried
+        on its own, then the checksum of the whole file is verified.
+        """
+        if version not in _IMAGE_DATA_PATHS:
+            raise exception.ImageUnacceptable(image_id=image_id,
+                reason=_('ranged downloads are not supported by glance API '
+                         'version %s') % version)
+        image = self.show(context, image_id)
+        size = image.get('size')
+        if not size:
+            raise exception.ImageUnacceptable(image_id=image_id,
+                reason=_('image size is unknown'))
+
+        host, port, use_ssl = self._client.next_endpoint()
+        headers = {}
+        if CONF.auth_strategy == 'keystone':
+            headers = generate_identity_headers(context)
+        path = _IMAGE_DATA_PATHS[version] % image_id
+
+        download_ranges(host, port, use_ssl, path, headers, dst_path, size,
+                        CONF.glance.download_streams)
+
+        checksum = image.get('checksum')
+        # NOTE: hashing the whole image would block other greenthreads
+        if checksum and tpool.execute(_file_md5, dst_path) != checksum:
+            raise exception.ImageUnacceptable(image_id=image_id,
+                reason=_('checksum of the downloaded image does not match'))
+
     def create(self, context, image_meta, data=None):
         """Store the image data and return the new image object."""
         sent_service_image_meta = _translate_to_glance(image_meta)
@@ -416,6 +516,113 @@ class GlanceImageService(object):
         return True
 
 
+class _RangeNotSupported(Exception):
+    pass
+
+
+def _ssl_context():
+    """Return the SSL context of range requests, set up from the same
+    options as the glance client.
+    """
+    context = ssl.create_default_context(cafile=CONF.glance.ca_file)
+    if CONF.glance.api_insecure:
+        context.check_hostname = False
+        context.verify_mode = ssl.CERT_NONE
+    if CONF.glance.cert_file:
+        context.load_cert_chain(CONF.glance.cert_file,
+                                CONF.glance.key_file)
+    return context
+
+
+def _fetch_range(host, port, use_ssl, path, headers, dst_path, start, end):
+    """Write bytes start to end of an HTTP resource at the same offset
+    in dst_path.
+    """
+    timeout = CONF.glance.range_timeout or None
+    if use_ssl:
+        conn = httplib.HTTPSConnection(host, port, timeout=timeout,
+                                       context=_ssl_context())
+    else:
+        conn = httplib.HTTPConnection(host, port, timeout=timeout)
+    fd = os.open(dst_path, os.O_WRONLY)
+    try:
+        headers = dict(headers, Range='bytes=%d-%d' % (start, end))
+        conn.request('GET', path, headers=headers)
+        resp = conn.getresponse()
+        if resp.status != httplib.PARTIAL_CONTENT:
+            raise _RangeNotSupported(_('range request to %(host)s:%(port)s '
+                                       'returned status %(status)d') %
+                                     {'host': host, 'port': port,
+                                      'status': resp.status})
+        os.lseek(fd, start, os.SEEK_SET)
+        remaining = end - start + 1
+        while remaining:
+            chunk = resp.read(min(remaining, _READ_CHUNK_SIZE))
+            if not chunk:
+                raise IOError(_('range %(start)d-%(end)d ended early') %
+                              {'start': start, 'end': end})
+            while chunk:
+                written = os.write(fd, chunk)
+                remaining -= written
+                chunk = chunk[written:]
+    finally:
+        os.close(fd)
+        conn.close()
+
+
+def _fetch_range_with_retries(host, port, use_ssl, path, headers, dst_path,
+                              start, end):
+    num_attempts = 1 + CONF.glance.num_retries
+    for attempt in xrange(1, num_attempts + 1):
+        try:
+            return _fetch_range(host, port, use_ssl, path, headers,
+                                dst_path, start, end)
+        except (httplib.HTTPException, socket.error, IOError) as ex:
+            if attempt == num_attempts:
+                raise
+            LOG.warn(_LW('Error fetching range %(start)d-%(end)d of '
+                         '%(path)s, retrying: %(ex)s'),
+                     {'start': start, 'end': end, 'path': path, 'ex': ex})
+            time.sleep(1)
+
+
+def download_ranges(host, port, use_ssl, path, headers, dst_path, size,
+                    streams):
+    """Download size bytes of an HTTP resource into dst_path using the
+    given number of parallel range requests.
+    """
+    with open(dst_path, 'wb') as f:
+        f.truncate(size)
+
+    ranges = iter([(start, min(start + _RANGE_SIZE, size) - 1)
+                   for start in xrange(0, size, _RANGE_SIZE)])
+    errors = []
+
+    def _worker():
+        for start, end in ranges:
+            if errors:
+                return
+            try:
+                _fetch_range_with_retries(host, port, use_ssl, path,
+                                          headers, dst_path, start, end)
+            except Exception as ex:
+                errors.append(ex)
+
+    workers = [eventlet.spawn(_worker) for _i in xrange(streams)]
+    for worker in workers:
+        worker.wait()
+    if errors:
+        raise errors[0]
+
+
+def _file_md5(path):
+    md5 = hashlib.md5()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(_READ_CHUNK_SIZE), ''):
+            md5.update(chunk)
+    return md5.hexdigest()
+
+
 def _extract_query_params(params):
     _params = {}
     accepted_params = ('filters', 'marker', 'limit',
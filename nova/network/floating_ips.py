@@ -15,6 +15,8 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import collections
+
 from oslo.config import cfg
 from oslo import messaging
 import six
@@ -78,6 +80,10 @@ class FloatingIP(object):
         except exception.NotFound:
             return
 
+        # NOTE: the addresses are restored per interface in one go, so
+        # that re-binding thousands of them after a failover only costs a
+        # single ip invocation and iptables apply per interface.
+        by_interface = collections.OrderedDict()
         for floating_ip in floating_ips:
             if floating_ip.fixed_ip_id:
                 try:
@@ -87,14 +93,16 @@ class FloatingIP(object):
                     LOG.debug(msg)
                     continue
                 interface = CONF.public_interface or floating_ip.interface
-                try:
-                    self.l3driver.add_floating_ip(floating_ip.address,
-                                                  fixed_ip.address,
-                                                  interface,
-                                                  fixed_ip.network)
-                except processutils.ProcessExecutionError:
-                    LOG.debug('Interface %s not found', interface)
-                    raise exception.NoFloatingIpInterface(interface=interface)
+                by_interface.setdefault(interface, []).append(
+                    (floating_ip.address, fixed_ip.address, interface,
+                     fixed_ip.network))
+
+        for interface, addresses in by_interface.items():
+            try:
+                self.l3driver.add_floating_ips(addresses)
+            except processutils.ProcessExecutionError:
+                LOG.debug('Interface %s not found', interface)
+                raise exception.NoFloatingIpInterface(interface=interface)
 
     def allocate_for_instance(self, context, **kwargs):
         """Handles allocating the floating IP resources for an instance.
@@ -535,6 +543,7 @@ class FloatingIP(object):
 
         LOG.info(_("Starting migration network for instance %s"),
                  instance_uuid)
+        migrated = []
         for address in floating_addresses:
             floating_ip = objects.FloatingIP.get_by_address(context, address)
 
@@ -544,14 +553,18 @@ class FloatingIP(object):
                            "migrate it "),
                          {'address': address, 'instance_uuid': instance_uuid})
                 continue
+            migrated.append(floating_ip)
 
+        addresses = []
+        for floating_ip in migrated:
             interface = CONF.public_interface or floating_ip.interface
             fixed_ip = floating_ip.fixed_ip
-            self.l3driver.remove_floating_ip(floating_ip.address,
-                                             fixed_ip.address,
-                                             interface,
-                                             fixed_ip.network)
+            addresses.append((floating_ip.address, fixed_ip.address,
+                              interface, fixed_ip.network))
+        if addresses:
+            self.l3driver.remove_floating_ips(addresses)
 
+        for floating_ip in migrated:
             # NOTE(wenjianhn): Make this address will not be bound to public
             # interface when restarts nova-network on dest compute node
             floating_ip.host = None
@@ -571,6 +584,7 @@ class FloatingIP(object):
         LOG.info(_("Finishing migration network for instance %s"),
                  instance_uuid)
 
+        addresses = []
         for address in floating_addresses:
             floating_ip = objects.FloatingIP.get_by_address(context, address)
 
@@ -586,10 +600,10 @@ class FloatingIP(object):
 
             interface = CONF.public_interface or floating_ip.interface
             fixed_ip = floating_ip.fixed_ip
-            self.l3driver.add_floating_ip(floating_ip.address,
-                                          fixed_ip.address,
-                                          interface,
-                                          fixed_ip.network)
+            addresses.append((floating_ip.address, fixed_ip.address,
+                              interface, fixed_ip.network))
+        if addresses:
+            self.l3driver.add_floating_ips(addresses)
 
     def _prepare_domain_entry(self, context, domainref):
         scope = domainref.scope
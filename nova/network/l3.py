@@ -13,6 +13,8 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import collections
+
 from nova.network import linux_net
 from nova.openstack.common import log as logging
 from nova import utils
@@ -59,6 +61,24 @@ class L3Driver(object):
                            network=None):
         raise NotImplementedError()
 
+    def add_floating_ips(self, floating_ips):
+        """Add a list of (floating_ip, fixed_ip, l3_interface_id, network)
+           tuples. Drivers which can set them up in one go should
+           override this.
+        """
+        for floating_ip, fixed_ip, l3_interface_id, network in floating_ips:
+            self.add_floating_ip(floating_ip, fixed_ip, l3_interface_id,
+                                 network)
+
+    def remove_floating_ips(self, floating_ips):
+        """Remove a list of (floating_ip, fixed_ip, l3_interface_id, network)
+           tuples. Drivers which can tear them down in one go should
+           override this.
+        """
+        for floating_ip, fixed_ip, l3_interface_id, network in floating_ips:
+            self.remove_floating_ip(floating_ip, fixed_ip, l3_interface_id,
+                                    network)
+
     def add_vpn(self, public_ip, port, private_ip):
         raise NotImplementedError()
 
@@ -121,6 +141,17 @@ class LinuxNetL3(L3Driver):
                                           l3_interface_id, network)
         linux_net.clean_conntrack(fixed_ip)
 
+    def add_floating_ips(self, floating_ips):
+        linux_net.ensure_floating_forwards(floating_ips)
+        for l3_interface_id, addresses in _group_by_interface(floating_ips):
+            linux_net.bind_floating_ips(addresses, l3_interface_id)
+
+    def remove_floating_ips(self, floating_ips):
+        for l3_interface_id, addresses in _group_by_interface(floating_ips):
+            linux_net.unbind_floating_ips(addresses, l3_interface_id)
+        linux_net.remove_floating_forwards(floating_ips)
+        linux_net.clean_conntracks([args[1] for args in floating_ips])
+
     def add_vpn(self, public_ip, port, private_ip):
         linux_net.ensure_vpn_forward(public_ip, port, private_ip)
 
@@ -133,6 +164,14 @@ class LinuxNetL3(L3Driver):
         pass
 
 
+def _group_by_interface(floating_ips):
+    """Return (l3_interface_id, [floating_ip, ...]) pairs in input order."""
+    interfaces = collections.OrderedDict()
+    for floating_ip, _fixed_ip, l3_interface_id, _network in floating_ips:
+        interfaces.setdefault(l3_interface_id, []).append(floating_ip)
+    return interfaces.items()
+
+
 class NullL3(L3Driver):
     """The L3 driver that doesn't do anything.  This class can be used when
        nova-network should not manipulate L3 forwarding at all (e.g., in a Flat
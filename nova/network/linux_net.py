@@ -279,6 +279,31 @@ class IptablesTable(object):
             self.rules.append(IptablesRule(chain, rule, wrap, top))
             self.dirty = True
 
+    def add_rules(self, rules, wrap=True, top=False):
+        """Add a list of (chain, rule) pairs to the table.
+
+        This behaves like calling add_rule for every pair, but looks up
+        duplicates of the existing rules only once for the whole list.
+
+        """
+        existing = set((r.chain, r.rule, r.wrap, r.top) for r in self.rules)
+        for chain, rule in rules:
+            if wrap and chain not in self.chains:
+                raise ValueError(_('Unknown chain: %r') % chain)
+
+            if '$' in rule:
+                rule = ' '.join(map(self._wrap_target_chain,
+                                    rule.split(' ')))
+
+            if (chain, rule, wrap, top) in existing:
+                LOG.debug("Skipping duplicate iptables rule addition. "
+                          "%(chain)r %(rule)r already present",
+                          {'chain': chain, 'rule': rule})
+                continue
+            existing.add((chain, rule, wrap, top))
+            self.rules.append(IptablesRule(chain, rule, wrap, top))
+            self.dirty = True
+
     def _wrap_target_chain(self, s):
         if s.startswith('$'):
             return '%s-%s' % (binary_name, s[1:])
@@ -744,6 +769,57 @@ def unbind_floating_ip(floating_ip, device):
              run_as_root=True, check_exit_code=[0, 2, 254])
 
 
+# Errors of ip for addresses which are already bound or already gone, as
+# reported by older and newer iproute2 versions
+_FLOATING_IP_BATCH_IGNORED_ERRORS = {
+    'add': ('File exists', 'Address already assigned'),
+    'del': ('Cannot assign requested address', 'Address not found'),
+}
+
+
+def _floating_ip_batch(action, floating_ips, device):
+    """Add or delete a list of ips on a device with a single ip command.
+
+    Addresses which are already bound (or already gone) are not errors,
+    so the batch is run with -force and any other error is raised.
+
+    """
+    commands = ''.join('addr %s %s/32 dev %s\n' % (action, floating_ip,
+                                                   device)
+                       for floating_ip in floating_ips)
+    out, err = _execute('ip', '-force', '-batch', '-',
+                        process_input=commands, run_as_root=True,
+                        check_exit_code=[0, 1, 2, 254])
+    if not err:
+        return
+    ignored = _FLOATING_IP_BATCH_IGNORED_ERRORS[action]
+    for line in err.splitlines():
+        line = line.strip()
+        if (not line or line.startswith('Command failed') or
+                any(error in line for error in ignored)):
+            continue
+        raise processutils.ProcessExecutionError(
+            stdout=out, stderr=err, cmd='ip -force -batch -')
+
+
+def bind_floating_ips(floating_ips, device):
+    """Bind a list of ips to public interface."""
+    if not floating_ips:
+        return
+    _floating_ip_batch('add', floating_ips, device)
+
+    if CONF.send_arp_for_ha and CONF.send_arp_for_ha_count > 0:
+        for floating_ip in floating_ips:
+            send_arp_for_ip(floating_ip, device, CONF.send_arp_for_ha_count)
+
+
+def unbind_floating_ips(floating_ips, device):
+    """Unbind a list of public ips from public interface."""
+    if not floating_ips:
+        return
+    _floating_ip_batch('del', floating_ips, device)
+
+
 def ensure_metadata_ip():
     """Sets up local metadata ip."""
     _execute('ip', 'addr', 'add', '169.254.169.254/32',
@@ -770,26 +846,80 @@ def ensure_vpn_forward(public_ip, port, private_ip):
 
 def ensure_floating_forward(floating_ip, fixed_ip, device, network):
     """Ensure floating ip forwarding rule."""
+    ensure_floating_forwards([(floating_ip, fixed_ip, device, network)])
+
+
+def _remove_floating_ip_rules(table, floating_ips):
+    """Remove all rules of a table which mention any of floating_ips."""
+    addresses = set(str(floating_ip) for floating_ip in floating_ips)
+
+    def _mentions_address(rule):
+        for token in str(rule).split()[1:]:
+            if token.endswith('/32'):
+                token = token[:-3]
+            if token in addresses:
+                return True
+        return False
+
+    num_rules = len(table.rules)
+    table.rules = [rule for rule in table.rules
+                   if not _mentions_address(rule)]
+    removed = num_rules - len(table.rules)
+    if removed > 0:
+        table.dirty = True
+    return removed
+
+
+def ensure_floating_forwards(floating_ips):
+    """Ensure forwarding rules for a list of floating ips.
+
+    floating_ips is a list of (floating_ip, fixed_ip, device, network)
+    tuples, the rules of all of them are applied at once.
+
+    """
+    nat = iptables_manager.ipv4['nat']
+    addresses = [str(args[0]) for args in floating_ips]
     # NOTE(vish): Make sure we never have duplicate rules for the same ip
-    regex = '.*\s+%s(/32|\s+|$)' % floating_ip
-    num_rules = iptables_manager.ipv4['nat'].remove_rules_regex(regex)
+    num_rules = _remove_floating_ip_rules(nat, addresses)
     if num_rules:
         msg = _('Removed %(num)d duplicate rules for floating ip %(float)s')
-        LOG.warn(msg % {'num': num_rules, 'float': floating_ip})
-    for chain, rule in floating_forward_rules(floating_ip, fixed_ip, device):
-        iptables_manager.ipv4['nat'].add_rule(chain, rule)
+        LOG.warn(msg % {'num': num_rules, 'float': ', '.join(addresses)})
+    rules = []
+    ebtables_rules = []
+    for floating_ip, fixed_ip, device, network in floating_ips:
+        rules.extend(floating_forward_rules(floating_ip, fixed_ip, device))
+        if device != network['bridge']:
+            ebtables_rules.extend(
+                floating_ebtables_rules(fixed_ip, network)[0])
+    nat.add_rules(rules)
     iptables_manager.apply()
-    if device != network['bridge']:
-        ensure_ebtables_rules(*floating_ebtables_rules(fixed_ip, network))
+    if ebtables_rules:
+        ensure_ebtables_rules(ebtables_rules, 'nat')
 
 
 def remove_floating_forward(floating_ip, fixed_ip, device, network):
     """Remove forwarding for floating ip."""
-    for chain, rule in floating_forward_rules(floating_ip, fixed_ip, device):
-        iptables_manager.ipv4['nat'].remove_rule(chain, rule)
+    remove_floating_forwards([(floating_ip, fixed_ip, device, network)])
+
+
+def remove_floating_forwards(floating_ips):
+    """Remove forwarding for a list of floating ips.
+
+    floating_ips is a list of (floating_ip, fixed_ip, device, network)
+    tuples, the rules of all of them are removed at once.
+
+    """
+    ebtables_rules = []
+    for floating_ip, fixed_ip, device, network in floating_ips:
+        for chain, rule in floating_forward_rules(floating_ip, fixed_ip,
+                                                  device):
+            iptables_manager.ipv4['nat'].remove_rule(chain, rule)
+        if device != network['bridge']:
+            ebtables_rules.extend(
+                floating_ebtables_rules(fixed_ip, network)[0])
     iptables_manager.apply()
-    if device != network['bridge']:
-        remove_ebtables_rules(*floating_ebtables_rules(fixed_ip, network))
+    if ebtables_rules:
+        remove_ebtables_rules(ebtables_rules, 'nat')
 
 
 def floating_ebtables_rules(fixed_ip, network):
@@ -825,6 +955,17 @@ def clean_conntrack(fixed_ip):
         LOG.exception(_('Error deleting conntrack entries for %s'), fixed_ip)
 
 
+def clean_conntracks(fixed_ips):
+    """Delete the conntrack entries of a list of fixed ips.
+
+    conntrack only takes a single address per call, so this just makes
+    sure every address is only cleaned once.
+
+    """
+    for fixed_ip in sorted(set(str(fixed_ip) for fixed_ip in fixed_ips)):
+        clean_conntrack(fixed_ip)
+
+
 def _enable_ipv4_forwarding():
     sysctl_key = 'net.ipv4.ip_forward'
     stdout, stderr = _execute('sysctl', '-n', sysctl_key)
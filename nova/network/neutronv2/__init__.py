@@ -13,9 +13,14 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import collections
+import time
+
 from neutronclient.common import exceptions
 from neutronclient.v2_0 import client as clientv20
 from oslo.config import cfg
+import requests
+from requests import adapters
 
 from nova.openstack.common import lockutils
 from nova.openstack.common import log as logging
@@ -38,6 +43,101 @@ class AdminTokenStore(object):
         return cls._instance
 
 
+class ClientPool(object):
+    """Per-process pool of neutron clients.
+
+    Clients are keyed by endpoint, token and whether admin credentials are
+    used, so the authentication state and transport of a client are reused
+    by later API calls instead of being set up again for every call. The
+    admin client keeps its token until neutron rejects it, at which point
+    the client re-authenticates and the AdminTokenStore is updated.
+
+    Entries expire after CONF.neutron.client_pool_ttl seconds and the least
+    recently used entry is evicted once CONF.neutron.client_pool_size
+    clients are pooled.
+
+    All clients of an endpoint send their requests through one HTTP session,
+    which keeps up to CONF.neutron.connection_pool_size connections alive.
+    """
+
+    _instance = None
+
+    def __init__(self):
+        self.clients = collections.OrderedDict()
+        self.sessions = {}
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def get(cls):
+        if cls._instance is None:
+            cls._instance = cls()
+        return cls._instance
+
+    def get_client(self, token=None, admin=False):
+        if CONF.neutron.client_pool_size <= 0:
+            return _get_client(token, admin=admin)
+
+        # NOTE: the admin client is pooled regardless of the token it was
+        # created with as it re-authenticates by itself once the token has
+        # expired.
+        key = (CONF.neutron.url, None if admin else token, admin)
+        now = time.time()
+        entry = self.clients.pop(key, None)
+        if entry is not None and now - entry[1] < CONF.neutron.client_pool_ttl:
+            self.hits += 1
+            client = entry[0]
+            created_at = entry[1]
+        else:
+            self.misses += 1
+            client = _get_client(token, admin=admin)
+            created_at = now
+        # Re-inserting the entry keeps the dict ordered from least to most
+        # recently used.
+        self.clients[key] = (client, created_at)
+        while len(self.clients) > CONF.neutron.client_pool_size:
+            self.clients.popitem(last=False)
+        return client
+
+    def get_session(self, url):
+        session = self.sessions.get(url)
+        if session is None:
+            session = requests.Session()
+            adapter = adapters.HTTPAdapter(
+                pool_maxsize=CONF.neutron.connection_pool_size)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            self.sessions[url] = session
+        return session
+
+    def stats(self):
+        return {'size': len(self.clients),
+                'hits': self.hits,
+                'misses': self.misses}
+
+
+class ExtensionCache(object):
+    """Per-process cache of the extensions loaded in neutron."""
+
+    _instance = None
+
+    def __init__(self):
+        self.last_sync = None
+        self.extensions = {}
+
+    @classmethod
+    def get(cls):
+        if cls._instance is None:
+            cls._instance = cls()
+        return cls._instance
+
+
+def reset():
+    """Drop the pooled clients and cached extensions of this process."""
+    ClientPool._instance = None
+    ExtensionCache._instance = None
+
+
 def _get_client(token=None, admin=False):
     params = {
         'endpoint_url': CONF.neutron.url,
@@ -59,7 +159,29 @@ def _get_client(token=None, admin=False):
             params['tenant_name'] = CONF.neutron.admin_tenant_name
         params['password'] = CONF.neutron.admin_password
         params['auth_url'] = CONF.neutron.admin_auth_url
-    return clientv20.Client(**params)
+    client = clientv20.Client(**params)
+    _use_session(client, ClientPool.get().get_session(CONF.neutron.url))
+    return client
+
+
+def _use_session(client, session):
+    """Send the requests of a neutron client through the given session.
+
+    The HTTP client of neutronclient sends each request with
+    requests.request(), which opens a new connection every time, so its
+    transport is replaced by one keeping the connections alive.
+    """
+    httpclient = client.httpclient
+
+    def _request(url, method, body=None, headers=None, **kwargs):
+        headers = headers or {}
+        headers['User-Agent'] = httpclient.USER_AGENT
+        resp = session.request(method, url, data=body, headers=headers,
+                               verify=httpclient.verify_cert,
+                               timeout=httpclient.timeout, **kwargs)
+        return resp, resp.text
+
+    httpclient._request = _request
 
 
 class ClientWrapper(clientv20.Client):
@@ -103,13 +225,13 @@ def get_client(context, admin=False):
     if admin or (context.is_admin and not context.auth_token):
         with lockutils.lock('neutron_admin_auth_token_lock'):
             orig_token = AdminTokenStore.get().admin_auth_token
-        client = _get_client(orig_token, admin=True)
+        client = ClientPool.get().get_client(orig_token, admin=True)
         return ClientWrapper(client)
 
     # We got a user token that we can use that as-is
     if context.auth_token:
         token = context.auth_token
-        return _get_client(token=token)
+        return ClientPool.get().get_client(token=token)
 
     # We did not get a user token and we should not be using
     # an admin token so log an error
@@ -15,8 +15,10 @@
 #    under the License.
 #
 
+import sys
 import time
 
+import eventlet
 from neutronclient.common import exceptions as neutron_client_exc
 from oslo.config import cfg
 
@@ -112,6 +114,28 @@ neutron_opts = [
                 default=False,
                 help='Allow an instance to have multiple vNICs attached to '
                     'the same Neutron network.'),
+    cfg.BoolOpt('bulk_port_create',
+                default=True,
+                help='Create all of the ports of an instance with a single '
+                     'request to the neutron bulk API.'),
+    cfg.IntOpt('port_create_concurrency',
+               default=4,
+               help='Maximum number of ports of an instance created '
+                    'concurrently when bulk_port_create is disabled.'),
+    cfg.IntOpt('client_pool_size',
+               default=100,
+               help='Maximum number of neutron clients kept per process '
+                    'for reuse by API calls with the same token. Set to 0 '
+                    'to create a new client for every call.'),
+    cfg.IntOpt('client_pool_ttl',
+               default=300,
+               help='Number of seconds a pooled neutron client is reused '
+                    'before it is replaced by a new one.'),
+    cfg.IntOpt('connection_pool_size',
+               default=10,
+               help='Maximum number of HTTP connections to each neutron '
+                    'endpoint kept open per process for reuse by API '
+                    'calls.'),
    ]
 
 CONF = cfg.CONF
@@ -125,16 +149,42 @@ soft_external_network_attach_authorize = extensions.soft_core_authorizer(
     'network', 'attach_external_network')
 
 
+class NetworkInfoCache(object):
+    """Request-scoped cache of neutron resources used to build nw_info.
+
+    Networks and subnets fetched while building the network info model are
+    kept here so that they are not fetched again for other ports, or for
+    other instances when the cache is shared by a batch of builds. The
+    number of neutron calls made through the cache is recorded in
+    neutron_calls.
+    """
+
+    def __init__(self):
+        self.neutron_calls = 0
+        self.networks = {}
+        self.subnets = {}
+        self.dhcp_servers = {}
+
+
 class API(base_api.NetworkAPI):
     """API for interacting with the neutron 2.x API."""
 
     def __init__(self):
         super(API, self).__init__()
-        self.last_neutron_extension_sync = None
-        self.extensions = {}
         self.conductor_api = conductor.API()
         self.security_group_api = (
             openstack_driver.get_openstack_security_group_driver())
+        # Set once neutron refused a bulk port create that succeeded port
+        # by port, i.e. when its bulk API is disabled.
+        self._bulk_port_create_unsupported = False
+
+    @property
+    def extensions(self):
+        return neutronv2.ExtensionCache.get().extensions
+
+    @property
+    def last_neutron_extension_sync(self):
+        return neutronv2.ExtensionCache.get().last_sync
 
     def setup_networks_on_host(self, context, instance, host=None,
                                teardown=False):
@@ -179,12 +229,11 @@ class API(base_api.NetworkAPI):
 
         return nets
 
-    def _create_port(self, port_client, instance, network_id, port_req_body,
-                     fixed_ip=None, security_group_ids=None,
-                     available_macs=None, dhcp_opts=None):
-        """Attempts to create a port for the instance on the given network.
+    def _populate_port_req_body(self, instance, network_id, port_req_body,
+                                fixed_ip=None, security_group_ids=None,
+                                available_macs=None, dhcp_opts=None):
+        """Populate a request to create a port for the instance.
 
-        :param port_client: The client to use to create the port.
         :param instance: Create the port for the given instance.
         :param network_id: Create the port on the given network.
         :param port_req_body: Pre-populated port request. Should have the
@@ -194,41 +243,59 @@ class API(base_api.NetworkAPI):
             apply to the port.
         :param available_macs: Optional set of available MAC addresses to use.
         :param dhcp_opts: Optional DHCP options.
-        :returns: ID of the created port.
+        :raises PortNotFree: If available_macs is empty.
+        """
+        if fixed_ip:
+            port_req_body['port']['fixed_ips'] = [{'ip_address': fixed_ip}]
+        port_req_body['port']['network_id'] = network_id
+        port_req_body['port']['admin_state_up'] = True
+        port_req_body['port']['tenant_id'] = instance['project_id']
+        if security_group_ids:
+            port_req_body['port']['security_groups'] = security_group_ids
+        if available_macs is not None:
+            if not available_macs:
+                raise exception.PortNotFree(
+                    instance=instance['uuid'])
+            mac_address = available_macs.pop()
+            port_req_body['port']['mac_address'] = mac_address
+        if dhcp_opts is not None:
+            port_req_body['port']['extra_dhcp_opts'] = dhcp_opts
+
+    def _send_create_port(self, port_client, instance, port_req_bodies):
+        """Create ports from populated requests with a single neutron call.
+
+        More than one port is created through neutron's bulk API, which
+        either creates all of the ports or none of them.
+
+        :returns: IDs of the created ports in the order of the requests.
         :raises PortLimitExceeded: If neutron fails with an OverQuota error.
         :raises NoMoreFixedIps: If neutron fails with
             IpAddressGenerationFailure error.
+        :raises PortInUse: If neutron fails with MacAddressInUse error.
         """
+        ports = [body['port'] for body in port_req_bodies]
+        network_id = ', '.join(port['network_id'] for port in ports)
         try:
-            if fixed_ip:
-                port_req_body['port']['fixed_ips'] = [{'ip_address': fixed_ip}]
-            port_req_body['port']['network_id'] = network_id
-            port_req_body['port']['admin_state_up'] = True
-            port_req_body['port']['tenant_id'] = instance['project_id']
-            if security_group_ids:
-                port_req_body['port']['security_groups'] = security_group_ids
-            if available_macs is not None:
-                if not available_macs:
-                    raise exception.PortNotFree(
-                        instance=instance['uuid'])
-                mac_address = available_macs.pop()
-                port_req_body['port']['mac_address'] = mac_address
-            if dhcp_opts is not None:
-                port_req_body['port']['extra_dhcp_opts'] = dhcp_opts
-            port_id = port_client.create_port(port_req_body)['port']['id']
-            LOG.debug('Successfully created port: %s', port_id,
+            if len(ports) == 1:
+                created = [port_client.create_port(port_req_bodies[0])['port']]
+            else:
+                created = port_client.create_port({'ports': ports})['ports']
+            port_ids = [port['id'] for port in created]
+            LOG.debug('Successfully created port(s): %s', port_ids,
                       instance=instance)
-            return port_id
+            return port_ids
         except neutron_client_exc.OverQuotaClient:
             LOG.warning(_LW(
                 'Neutron error: Port quota exceeded in tenant: %s'),
-                port_req_body['port']['tenant_id'], instance=instance)
+                ports[0]['tenant_id'], instance=instance)
             raise exception.PortLimitExceeded()
         except neutron_client_exc.IpAddressGenerationFailureClient:
             LOG.warning(_LW('Neutron error: No more fixed IPs in network: %s'),
                         network_id, instance=instance)
             raise exception.NoMoreFixedIps()
         except neutron_client_exc.MacAddressInUseClient:
+            mac_address = ', '.join(port.get('mac_address', '')
+                                    for port in ports)
             LOG.warning(_LW('Neutron error: MAC address %(mac)s is already '
                             'in use on network %(network)s.') %
                         {'mac': mac_address, 'network': network_id},
@@ -239,6 +306,95 @@ class API(base_api.NetworkAPI):
                 LOG.exception(_LE('Neutron error creating port on network %s'),
                               network_id, instance=instance)
 
+    def _create_port(self, port_client, instance, network_id, port_req_body,
+                     fixed_ip=None, security_group_ids=None,
+                     available_macs=None, dhcp_opts=None):
+        """Attempts to create a port for the instance on the given network.
+
+        :param port_client: The client to use to create the port.
+        :param instance: Create the port for the given instance.
+        :param network_id: Create the port on the given network.
+        :param port_req_body: Pre-populated port request. Should have the
+            device_id, device_owner, and any required neutron extension values.
+        :param fixed_ip: Optional fixed IP to use from the given network.
+        :param security_group_ids: Optional list of security group IDs to
+            apply to the port.
+        :param available_macs: Optional set of available MAC addresses to use.
+        :param dhcp_opts: Optional DHCP options.
+        :returns: ID of the created port.
+        :raises PortLimitExceeded: If neutron fails with an OverQuota error.
+        :raises NoMoreFixedIps: If neutron fails with
+            IpAddressGenerationFailure error.
+        """
+        self._populate_port_req_body(instance, network_id, port_req_body,
+                                     fixed_ip, security_group_ids,
+                                     available_macs, dhcp_opts)
+        return self._send_create_port(port_client, instance,
+                                      [port_req_body])[0]
+
+    def _create_ports(self, port_client, instance, port_req_bodies,
+                      created_port_ids):
+        """Create several ports for the instance.
+
+        When CONF.neutron.bulk_port_create is set, the ports are created with
+        a single call to neutron's bulk API. Otherwise, or when neutron
+        refuses the bulk request, they are created concurrently by at most
+        CONF.neutron.port_create_concurrency greenthreads. The ID of each
+        created port is appended to created_port_ids as soon as the port
+        exists so the caller can delete it if creating another port fails.
+
+        :param port_req_bodies: Populated port requests, see
+            _populate_port_req_body().
+        :returns: IDs of the created ports in the order of the requests.
+        """
+        bulk_refused = False
+        if (len(port_req_bodies) > 1 and CONF.neutron.bulk_port_create and
+                not self._bulk_port_create_unsupported):
+            try:
+                port_ids = self._send_create_port(port_client, instance,
+                                                  port_req_bodies)
+            except neutron_client_exc.BadRequest as ex:
+                # NOTE: neutron answers bulk requests with BadRequest when
+                # its allow_bulk option is disabled. Nothing was created.
+                LOG.warning(_LW('Neutron refused to create %(count)d ports '
+                                'in bulk, creating them one by one: '
+                                '%(ex)s'),
+                            {'count': len(port_req_bodies), 'ex': ex},
+                            instance=instance)
+                bulk_refused = True
+            else:
+                created_port_ids.extend(port_ids)
+                return port_ids
+
+        port_ids = [None] * len(port_req_bodies)
+        errors = []
+
+        def _create(index, port_req_body):
+            try:
+                port_id = self._send_create_port(port_client, instance,
+                                                 [port_req_body])[0]
+            except Exception:
+                errors.append(sys.exc_info())
+            else:
+                port_ids[index] = port_id
+                created_port_ids.append(port_id)
+
+        pool = eventlet.GreenPool(max(1, CONF.neutron.port_create_concurrency))
+        for index, port_req_body in enumerate(port_req_bodies):
+            # Don't create more ports once one of them has failed.
+            if errors:
+                break
+            pool.spawn_n(_create, index, port_req_body)
+        pool.waitall()
+        if errors:
+            exc_info = errors[0]
+            raise exc_info[0], exc_info[1], exc_info[2]
+        if bulk_refused:
+            # The requests were valid, so bulk creation is what neutron
+            # doesn't support: don't try it again.
+            self._bulk_port_create_unsupported = True
+        return port_ids
+
     def allocate_for_instance(self, context, instance, **kwargs):
         """Allocate network resources for the instance.
 
@@ -361,6 +517,11 @@ class API(base_api.NetworkAPI):
         created_port_ids = []
         ports_in_requested_order = []
         nets_in_requested_order = []
+        # Requests for the ports to create and their index in
+        # ports_in_requested_order.
+        port_req_bodies = []
+        port_indexes = []
+        port_client = neutron
         for request in ordered_networks:
             # Network lookup for available network_id
             network = None
@@ -402,35 +563,30 @@ class API(base_api.NetworkAPI):
                     touched_port_ids.append(port['id'])
                     ports_in_requested_order.append(port['id'])
                 else:
-                    created_port = self._create_port(
-                            port_client, instance, request.network_id,
-                            port_req_body, request.address,
-                            security_group_ids, available_macs, dhcp_opts)
-                    created_port_ids.append(created_port)
-                    ports_in_requested_order.append(created_port)
+                    self._populate_port_req_body(
+                            instance, request.network_id, port_req_body,
+                            request.address, security_group_ids,
+                            available_macs, dhcp_opts)
+                    port_req_bodies.append(port_req_body)
+                    port_indexes.append(len(ports_in_requested_order))
+                    ports_in_requested_order.append(None)
             except Exception:
                 with excutils.save_and_reraise_exception():
-                    for port_id in touched_port_ids:
-                        try:
-                            port_req_body = {'port': {'device_id': ''}}
-                            # Requires admin creds to set port bindings
-                            if self._has_port_binding_extension(context):
-                                port_req_body['port']['binding:host_id'] = None
-                                port_client = neutronv2.get_client(
-                                    context, admin=True)
-                            else:
-                                port_client = neutron
-                            port_client.update_port(port_id, port_req_body)
-                        except Exception:
-                            msg = _LE("Failed to update port %s")
-                            LOG.exception(msg, port_id)
-
-                    for port_id in created_port_ids:
-                        try:
-                            neutron.delete_port(port_id)
-                        except Exception:
-                            msg = _LE("Failed to delete port %s")
-                            LOG.exception(msg, port_id)
+                    self._unbind_ports(context, neutron, touched_port_ids)
+
+        # All ports are created at once after the requested ports have been
+        # updated so that their creation is not serialized.
+        if port_req_bodies:
+            try:
+                port_ids = self._create_ports(port_client, instance,
+                                              port_req_bodies,
+                                              created_port_ids)
+            except Exception:
+                with excutils.save_and_reraise_exception():
+                    self._unbind_ports(context, neutron, touched_port_ids)
+                    self._delete_ports(neutron, created_port_ids)
+            for index, port_id in zip(port_indexes, port_ids):
+                ports_in_requested_order[index] = port_id
 
         nw_info = self.get_instance_nw_info(context, instance,
                                             networks=nets_in_requested_order,
@@ -444,17 +600,46 @@ class API(base_api.NetworkAPI):
                                           if vif['id'] in created_port_ids +
                                                            touched_port_ids])
 
+    def _unbind_ports(self, context, neutron, port_ids):
+        """Reset the device of ports that were bound to an instance."""
+        for port_id in port_ids:
+            try:
+                port_req_body = {'port': {'device_id': ''}}
+                # Requires admin creds to set port bindings
+                if self._has_port_binding_extension(context):
+                    port_req_body['port']['binding:host_id'] = None
+                    port_client = neutronv2.get_client(
+                        context, admin=True)
+                else:
+                    port_client = neutron
+                port_client.update_port(port_id, port_req_body)
+            except Exception:
+                msg = _LE("Failed to update port %s")
+                LOG.exception(msg, port_id)
+
+    def _delete_ports(self, neutron, port_ids):
+        """Delete ports, logging rather than raising on failure."""
+        for port_id in port_ids:
+            try:
+                neutron.delete_port(port_id)
+            except Exception:
+                msg = _LE("Failed to delete port %s")
+                LOG.exception(msg, port_id)
+
     def _refresh_neutron_extensions_cache(self, context):
-        """Refresh the neutron extensions cache when necessary."""
-        if (not self.last_neutron_extension_sync or
-            ((time.time() - self.last_neutron_extension_sync)
+        """Refresh the neutron extensions cache when necessary.
+
+        The cache is shared by all API objects of the process.
+        """
+        cache = neutronv2.ExtensionCache.get()
+        if (not cache.last_sync or
+            ((time.time() - cache.last_sync)
              >= CONF.neutron.extension_sync_interval)):
             neutron = neutronv2.get_client(context)
             extensions_list = neutron.list_extensions()['extensions']
-            self.last_neutron_extension_sync = time.time()
-            self.extensions.clear()
-            self.extensions = dict((ext['name'], ext)
-                                   for ext in extensions_list)
+            cache.last_sync = time.time()
+            cache.extensions = dict((ext['name'], ext)
+                                    for ext in extensions_list)
 
     def _has_port_binding_extension(self, context, refresh_cache=False):
         if refresh_cache:
@@ -572,7 +757,7 @@ class API(base_api.NetworkAPI):
         return network_model.NetworkInfo.hydrate(nw_info)
 
     def _gather_port_ids_and_networks(self, context, instance, networks=None,
-                                      port_ids=None):
+                                      port_ids=None, cache=None):
         """Return an instance's complete list of port_ids and networks."""
 
         if ((networks is None and port_ids is not None) or
@@ -589,9 +774,18 @@ class API(base_api.NetworkAPI):
             net_ids = [iface['network']['id'] for iface in ifaces]
 
         if networks is None:
-            networks = self._get_available_networks(context,
-                                                    instance['project_id'],
-                                                    net_ids)
+            if (cache is not None and net_ids and
+                    all(net_id in cache.networks for net_id in net_ids)):
+                networks = [cache.networks[net_id] for net_id in net_ids]
+            else:
+                networks = self._get_available_networks(
+                    context, instance['project_id'], net_ids)
+                if cache is not None:
+                    # Without net_ids the tenant and shared networks are
+                    # listed separately.
+                    cache.neutron_calls += 1 if net_ids else 2
+                    for net in networks:
+                        cache.networks[net['id']] = net
         # an interface was added/removed from instance.
         else:
             # Since networks does not contain the existing networks on the
@@ -1074,21 +1268,30 @@ class API(base_api.NetworkAPI):
             raise exception.FloatingIpMultipleFoundForAddress(address=address)
         return fips[0]
 
-    def _get_floating_ips_by_fixed_and_port(self, client, fixed_ip, port):
-        """Get floatingips from fixed ip and port."""
+    def _get_floating_ips_by_ports(self, client, port_ids, cache=None):
+        """Get floatingips for a set of ports with a single neutron call.
+
+        :returns: dict of floatingip lists keyed by (port_id, fixed_ip).
+        """
+        floating_ips = {}
+        if not port_ids:
+            return floating_ips
+        if cache is not None:
+            cache.neutron_calls += 1
         try:
-            data = client.list_floatingips(fixed_ip_address=fixed_ip,
-                                           port_id=port)
+            data = client.list_floatingips(port_id=list(port_ids))
         # If a neutron plugin does not implement the L3 API a 404 from
         # list_floatingips will be raised.
         except neutronv2.exceptions.NeutronClientException as e:
             if e.status_code == 404:
-                return []
+                return floating_ips
             with excutils.save_and_reraise_exception():
-                LOG.exception(_LE('Unable to access floating IP %(fixed_ip)s '
-                                  'for port %(port_id)s'),
-                              {'fixed_ip': fixed_ip, 'port_id': port})
-        return data['floatingips']
+                LOG.exception(_LE('Unable to access floating IPs for '
+                                  'ports %s'), port_ids)
+        for fip in data['floatingips']:
+            key = (fip['port_id'], fip['fixed_ip_address'])
+            floating_ips.setdefault(key, []).append(fip)
+        return floating_ips
 
     def release_floating_ip(self, context, address,
                             affect_auto_assigned=False):
@@ -1166,12 +1369,12 @@ class API(base_api.NetworkAPI):
         """Force add a network to the project."""
         raise NotImplementedError()
 
-    def _nw_info_get_ips(self, client, port):
+    def _nw_info_get_ips(self, port, floating_ips):
         network_IPs = []
         for fixed_ip in port['fixed_ips']:
             fixed = network_model.FixedIP(address=fixed_ip['ip_address'])
-            floats = self._get_floating_ips_by_fixed_and_port(
-                client, fixed_ip['ip_address'], port['id'])
+            floats = floating_ips.get((port['id'], fixed_ip['ip_address']),
+                                      [])
             for ip in floats:
                 fip = network_model.IP(address=ip['floating_ip_address'],
                                        type='floating')
@@ -1179,8 +1382,8 @@ class API(base_api.NetworkAPI):
             network_IPs.append(fixed)
         return network_IPs
 
-    def _nw_info_get_subnets(self, context, port, network_IPs):
-        subnets = self._get_subnets_from_port(context, port)
+    def _nw_info_get_subnets(self, context, port, network_IPs, cache=None):
+        subnets = self._get_subnets_from_port(context, port, cache=cache)
         for subnet in subnets:
             subnet['ips'] = [fixed_ip for fixed_ip in network_IPs
                              if fixed_ip.is_in_subnet(subnet)]
@@ -1243,7 +1446,7 @@ class API(base_api.NetworkAPI):
         return network, ovs_interfaceid
 
     def _build_network_info_model(self, context, instance, networks=None,
-                                  port_ids=None):
+                                  port_ids=None, cache=None):
         """Return list of ordered VIFs attached to instance.
 
         :param context - request context.
@@ -1255,16 +1458,23 @@ class API(base_api.NetworkAPI):
                           instance in order of attachment. If value is None
                           this value will be populated from the existing
                           cached value.
+        :param cache - Optional NetworkInfoCache shared between several
+                       builds, e.g. for a batch of instances, so networks
+                       and subnets are only fetched from neutron once.
         """
+        if cache is None:
+            cache = NetworkInfoCache()
+        calls_before = cache.neutron_calls
 
         search_opts = {'tenant_id': instance['project_id'],
                        'device_id': instance['uuid'], }
         client = neutronv2.get_client(context, admin=True)
+        cache.neutron_calls += 1
         data = client.list_ports(**search_opts)
 
         current_neutron_ports = data.get('ports', [])
         networks, port_ids = self._gather_port_ids_and_networks(
-                context, instance, networks, port_ids)
+                context, instance, networks, port_ids, cache=cache)
         nw_info = network_model.NetworkInfo()
 
         current_neutron_port_map = {}
@@ -1272,72 +1482,123 @@ class API(base_api.NetworkAPI):
             current_neutron_port_map[current_neutron_port['id']] = (
                 current_neutron_port)
 
-        for port_id in port_ids:
-            current_neutron_port = current_neutron_port_map.get(port_id)
-            if current_neutron_port:
-                vif_active = False
-                if (current_neutron_port['admin_state_up'] is False
-                    or current_neutron_port['status'] == 'ACTIVE'):
-                    vif_active = True
-
-                network_IPs = self._nw_info_get_ips(client,
-                                                    current_neutron_port)
-                subnets = self._nw_info_get_subnets(context,
-                                                    current_neutron_port,
-                                                    network_IPs)
-
-                devname = "tap" + current_neutron_port['id']
-                devname = devname[:network_model.NIC_NAME_LEN]
-
-                network, ovs_interfaceid = (
-                    self._nw_info_build_network(current_neutron_port,
-                                                networks, subnets))
-
-                nw_info.append(network_model.VIF(
-                    id=current_neutron_port['id'],
-                    address=current_neutron_port['mac_address'],
-                    network=network,
-                    type=current_neutron_port.get('binding:vif_type'),
-                    details=current_neutron_port.get('binding:vif_details'),
-                    ovs_interfaceid=ovs_interfaceid,
-                    devname=devname,
-                    active=vif_active))
-
+        ports = [current_neutron_port_map[port_id] for port_id in port_ids
+                 if port_id in current_neutron_port_map]
+
+        # Fetch everything needed for all of the ports up front so the
+        # number of neutron calls does not grow with the number of ports.
+        floating_ips = self._get_floating_ips_by_ports(
+            client, [port['id'] for port in ports if port.get('fixed_ips')],
+            cache=cache)
+        self._prefetch_subnets(context, ports, cache)
+
+        for current_neutron_port in ports:
+            vif_active = False
+            if (current_neutron_port['admin_state_up'] is False
+                or current_neutron_port['status'] == 'ACTIVE'):
+                vif_active = True
+
+            network_IPs = self._nw_info_get_ips(current_neutron_port,
+                                                floating_ips)
+            subnets = self._nw_info_get_subnets(context,
+                                                current_neutron_port,
+                                                network_IPs,
+                                                cache=cache)
+
+            devname = "tap" + current_neutron_port['id']
+            devname = devname[:network_model.NIC_NAME_LEN]
+
+            network, ovs_interfaceid = (
+                self._nw_info_build_network(current_neutron_port,
+                                            networks, subnets))
+
+            nw_info.append(network_model.VIF(
+                id=current_neutron_port['id'],
+                address=current_neutron_port['mac_address'],
+                network=network,
+                type=current_neutron_port.get('binding:vif_type'),
+                details=current_neutron_port.get('binding:vif_details'),
+                ovs_interfaceid=ovs_interfaceid,
+                devname=devname,
+                active=vif_active))
+
+        LOG.debug('Built network info for %(ports)d port(s) using '
+                  '%(calls)d neutron call(s)',
+                  {'ports': len(ports),
+                   'calls': cache.neutron_calls - calls_before},
+                  instance=instance)
         return nw_info
 
-    def _get_subnets_from_port(self, context, port):
+    def _prefetch_subnets(self, context, ports, cache):
+        """Fetch the subnets and DHCP servers of ports into the cache.
+
+        Subnets already present in the cache are not fetched again. All
+        missing subnets are fetched with one neutron call and the DHCP ports
+        of their networks with another.
+        """
+        subnet_ids = set()
+        for port in ports:
+            for fixed_ip in port.get('fixed_ips', []):
+                subnet_ids.add(fixed_ip['subnet_id'])
+        missing = subnet_ids - set(cache.subnets)
+        # Since list_subnets(id=[]) returns all subnets visible for the
+        # current tenant, returned subnets may contain subnets which are not
+        # related to the ports. To avoid this, return early.
+        if not missing:
+            return
+
+        client = neutronv2.get_client(context)
+        cache.neutron_calls += 1
+        data = client.list_subnets(id=list(missing))
+        ipam_subnets = data.get('subnets', [])
+        for subnet in ipam_subnets:
+            cache.subnets[subnet['id']] = subnet
+        # Do not look the missing subnets up again if neutron did not
+        # return them, e.g. because they have been deleted.
+        for subnet_id in missing:
+            cache.subnets.setdefault(subnet_id, None)
+        if not ipam_subnets:
+            return
+
+        # attempt to populate DHCP server field
+        network_ids = set(subnet['network_id'] for subnet in ipam_subnets)
+        cache.neutron_calls += 1
+        data = client.list_ports(network_id=list(network_ids),
+                                 device_owner='network:dhcp')
+        for p in data.get('ports', []):
+            for ip_pair in p['fixed_ips']:
+                cache.dhcp_servers.setdefault(ip_pair['subnet_id'],
+                                              ip_pair['ip_address'])
+
+    def _get_subnets_from_port(self, context, port, cache=None):
         """Return the subnets for a given port."""
 
         fixed_ips = port['fixed_ips']
         # No fixed_ips for the port means there is no subnet associated
         # with the network the port is created on.
-        # Since list_subnets(id=[]) returns all subnets visible for the
-        # current tenant, returned subnets may contain subnets which is not
-        # related to the port. To avoid this, the method returns here.
         if not fixed_ips:
             return []
-        search_opts = {'id': [ip['subnet_id'] for ip in fixed_ips]}
-        data = neutronv2.get_client(context).list_subnets(**search_opts)
-        ipam_subnets = data.get('subnets', [])
+        if cache is None:
+            cache = NetworkInfoCache()
+        self._prefetch_subnets(context, [port], cache)
+
         subnets = []
+        seen = set()
+        for ip in fixed_ips:
+            subnet = cache.subnets.get(ip['subnet_id'])
+            if subnet is None or subnet['id'] in seen:
+                continue
+            seen.add(subnet['id'])
 
-        for subnet in ipam_subnets:
+            # NOTE: a new Subnet model is built for every port because the
+            # caller attaches the port's own IPs to it.
             subnet_dict = {'cidr': subnet['cidr'],
                            'gateway': network_model.IP(
                                 address=subnet['gateway_ip'],
                                 type='gateway'),
             }
-
-            # attempt to populate DHCP server field
-            search_opts = {'network_id': subnet['network_id'],
-                           'device_owner': 'network:dhcp'}
-            data = neutronv2.get_client(context).list_ports(**search_opts)
-            dhcp_ports = data.get('ports', [])
-            for p in dhcp_ports:
-                for ip_pair in p['fixed_ips']:
-                    if ip_pair['subnet_id'] == subnet['id']:
-                        subnet_dict['dhcp_server'] = ip_pair['ip_address']
-                        break
+            if subnet['id'] in cache.dhcp_servers:
+                subnet_dict['dhcp_server'] = cache.dhcp_servers[subnet['id']]
 
             subnet_object = network_model.Subnet(**subnet_dict)
             for dns in subnet.get('dns_nameservers', []):
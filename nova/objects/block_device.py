@@ -199,7 +199,8 @@ class BlockDeviceMappingList(base.ObjectListBase, base.NovaObject):
     # Version 1.1: BlockDeviceMapping <= version 1.1
     # Version 1.2: Added use_slave to get_by_instance_uuid
     # Version 1.3: BlockDeviceMapping <= version 1.2
-    VERSION = '1.3'
+    # Version 1.4: Added get_by_instance_uuids
+    VERSION = '1.4'
 
     fields = {
         'objects': fields.ListOfObjectsField('BlockDeviceMapping'),
@@ -209,6 +210,7 @@ class BlockDeviceMappingList(base.ObjectListBase, base.NovaObject):
         '1.1': '1.1',
         '1.2': '1.1',
         '1.3': '1.2',
+        '1.4': '1.2',
     }
 
     @base.remotable_classmethod
@@ -218,6 +220,13 @@ class BlockDeviceMappingList(base.ObjectListBase, base.NovaObject):
         return base.obj_make_list(
                 context, cls(), objects.BlockDeviceMapping, db_bdms or [])
 
+    @base.remotable_classmethod
+    def get_by_instance_uuids(cls, context, instance_uuids, use_slave=False):
+        db_bdms = db.block_device_mapping_get_all_by_instance_uuids(
+                context, instance_uuids, use_slave=use_slave)
+        return base.obj_make_list(
+                context, cls(), objects.BlockDeviceMapping, db_bdms or [])
+
     def root_bdm(self):
         try:
             return (bdm_obj for bdm_obj in self if bdm_obj.is_root).next()
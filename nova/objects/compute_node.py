@@ -143,7 +143,8 @@ class ComputeNodeList(base.ObjectListBase, base.NovaObject):
     # Version 1.3 ComputeNode version 1.4
     # Version 1.4 ComputeNode version 1.5
     # Version 1.5 Add use_slave to get_by_service
-    VERSION = '1.5'
+    # Version 1.6 Add get_by_stats()
+    VERSION = '1.6'
     fields = {
         'objects': fields.ListOfObjectsField('ComputeNode'),
         }
@@ -155,6 +156,7 @@ class ComputeNodeList(base.ObjectListBase, base.NovaObject):
         '1.3': '1.4',
         '1.4': '1.5',
         '1.5': '1.5',
+        '1.6': '1.5',
         }
 
     @base.remotable_classmethod
@@ -170,6 +172,12 @@ class ComputeNodeList(base.ObjectListBase, base.NovaObject):
         return base.obj_make_list(context, cls(context), objects.ComputeNode,
                                   db_computes)
 
+    @base.remotable_classmethod
+    def get_by_stats(cls, context, stats_match):
+        db_computes = db.compute_node_search_by_stats(context, stats_match)
+        return base.obj_make_list(context, cls(context), objects.ComputeNode,
+                                  db_computes)
+
     @base.remotable_classmethod
     def _get_by_service(cls, context, service_id, use_slave=False):
         db_service = db.service_get(context, service_id,
@@ -56,6 +56,24 @@ class EC2InstanceMapping(base.NovaPersistentObject, base.NovaObject):
             return cls._from_db_object(context, cls(), db_imap)
 
 
+class EC2InstanceMappingList(base.ObjectListBase, base.NovaObject):
+    # Version 1.0: Initial version
+    VERSION = '1.0'
+
+    fields = {
+        'objects': fields.ListOfObjectsField('EC2InstanceMapping'),
+    }
+    child_versions = {
+        '1.0': '1.0',
+    }
+
+    @base.remotable_classmethod
+    def get_by_uuids(cls, context, instance_uuids):
+        db_imaps = db.ec2_instance_get_all_by_uuids(context, instance_uuids)
+        return base.obj_make_list(context, cls(), EC2InstanceMapping,
+                                  db_imaps)
+
+
 class EC2VolumeMapping(base.NovaPersistentObject, base.NovaObject):
     # Version 1.0: Initial version
     VERSION = '1.0'
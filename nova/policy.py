@@ -15,12 +15,293 @@
 
 """Policy Engine For Nova."""
 
+import ast
+import re
+import time
+
+from oslo.config import cfg
+import six
+
 from nova import exception
 from nova.openstack.common import policy
 
+policy_opts = [
+    cfg.IntOpt('policy_check_interval',
+               default=5,
+               help='Number of seconds between checks of whether the policy '
+                    'file changed. 0 checks it on every policy check.'),
+]
+
+CONF = cfg.CONF
+CONF.register_opts(policy_opts)
 
 _ENFORCER = None
 
+# Target attributes interpolated into generic checks, e.g. %(project_id)s
+_TARGET_KEY_RE = re.compile(r'%\((\w+)\)s')
+
+# Decisions a context keeps at most, see enforce()
+_MAX_DECISIONS = 100
+
+_MISSING = object()
+
+
+class _RuleCompiler(object):
+    """Compiles a tree of checks into nested functions.
+
+    The functions take the same arguments as checks and return the same
+    results, but the work which doesn't depend on the target and the
+    credentials, like lower casing roles or interpreting literals, is done
+    once. Checks of unknown types, like http checks, are called as they
+    are.
+
+    The compiler records the keys of the credentials and the target the
+    checks read, and the rules they reference. pure is False if the tree
+    contains checks of unknown types, whose result may depend on anything.
+    """
+
+    def __init__(self):
+        self.cred_keys = set()
+        self.target_keys = set()
+        self.rules = set()
+        self.pure = True
+
+    def compile(self, check):
+        check_type = type(check)
+
+        if check_type is policy.TrueCheck:
+            return lambda target, creds, enforcer: True
+
+        if check_type is policy.FalseCheck:
+            return lambda target, creds, enforcer: False
+
+        if check_type is policy.NotCheck:
+            func = self.compile(check.rule)
+            return lambda target, creds, enforcer: not func(target, creds,
+                                                            enforcer)
+
+        if check_type is policy.AndCheck:
+            funcs = [self.compile(rule) for rule in check.rules]
+
+            def and_check(target, creds, enforcer):
+                for func in funcs:
+                    if not func(target, creds, enforcer):
+                        return False
+                return True
+            return and_check
+
+        if check_type is policy.OrCheck:
+            funcs = [self.compile(rule) for rule in check.rules]
+
+            def or_check(target, creds, enforcer):
+                for func in funcs:
+                    if func(target, creds, enforcer):
+                        return True
+                return False
+            return or_check
+
+        if check_type is policy.RuleCheck:
+            return self._compile_rule_check(check)
+
+        if check_type is policy.RoleCheck:
+            role = check.match.lower()
+            self.cred_keys.add('roles')
+            return lambda target, creds, enforcer: role in [
+                r.lower() for r in creds['roles']]
+
+        if check_type is IsAdminCheck:
+            expected = check.expected
+            self.cred_keys.add('is_admin')
+            return lambda target, creds, enforcer: (
+                creds['is_admin'] == expected)
+
+        if check_type is policy.GenericCheck:
+            func = self._compile_generic_check(check)
+            if func is not None:
+                return func
+
+        self.pure = False
+        return check
+
+    def _compile_rule_check(self, check):
+        name = check.match
+        self.rules.add(name)
+
+        def rule_check(target, creds, enforcer):
+            compiled = enforcer.compiled_rules.get(name)
+            try:
+                if compiled is None:
+                    # NOTE: falls back to the default rule
+                    return check(target, creds, enforcer)
+                return compiled.func(target, creds, enforcer)
+            except KeyError:
+                return False
+        return rule_check
+
+    def _compile_generic_check(self, check):
+        template = check.match
+        if '%' in _TARGET_KEY_RE.sub('', template):
+            return None
+        try:
+            expected = six.text_type(ast.literal_eval(check.kind))
+            cred_key = None
+        except ValueError:
+            expected = None
+            cred_key = check.kind
+        except Exception:
+            return None
+
+        target_keys = _TARGET_KEY_RE.findall(template)
+        self.target_keys.update(target_keys)
+        if cred_key is not None:
+            self.cred_keys.add(cred_key)
+
+        def generic_check(target, creds, enforcer):
+            if target_keys:
+                try:
+                    match = template % target
+                except KeyError:
+                    return False
+            else:
+                match = template
+            if cred_key is None:
+                return match == expected
+            try:
+                return match == six.text_type(creds[cred_key])
+            except KeyError:
+                return False
+        return generic_check
+
+
+class _CompiledRule(object):
+    def __init__(self, check):
+        compiler = _RuleCompiler()
+        self.func = compiler.compile(check)
+        self.cred_keys = compiler.cred_keys
+        self.target_keys = compiler.target_keys
+        self.rules = compiler.rules
+        self.pure = compiler.pure
+        # The keys of the credentials and the target the decision depends
+        # on, including those of the rules referenced, or None if unknown
+        self.decision_keys = None
+
+
+def _decision_keys(name, compiled_rules, path=frozenset()):
+    compiled = compiled_rules.get(name)
+    if compiled is None or not compiled.pure or name in path:
+        return None
+    path = path | set([name])
+    cred_keys = set(compiled.cred_keys)
+    target_keys = set(compiled.target_keys)
+    for rule in compiled.rules:
+        keys = _decision_keys(rule, compiled_rules, path)
+        if keys is None:
+            return None
+        cred_keys.update(keys[0])
+        target_keys.update(keys[1])
+    return cred_keys, target_keys
+
+
+def _freeze(value):
+    if isinstance(value, list):
+        return tuple(value)
+    return value
+
+
+class Enforcer(policy.Enforcer):
+    """Enforcer which compiles the rules it loads and checks the policy
+    file for changes at most every policy_check_interval seconds.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super(Enforcer, self).__init__(*args, **kwargs)
+        self._checked_at = None
+        self._compile_rules()
+
+    def _compile_rules(self):
+        compiled_rules = dict((name, _CompiledRule(check))
+                              for name, check in self.rules.items())
+        for name, compiled in compiled_rules.items():
+            keys = _decision_keys(name, compiled_rules)
+            if keys is not None:
+                compiled.decision_keys = (tuple(sorted(keys[0])),
+                                          tuple(sorted(keys[1])))
+        self.compiled_rules = compiled_rules
+        # Decisions made with other rules don't apply anymore
+        self.generation = object()
+
+    def set_rules(self, rules, overwrite=True, use_conf=False):
+        super(Enforcer, self).set_rules(rules, overwrite, use_conf)
+        self._compile_rules()
+
+    def load_rules(self, force_reload=False):
+        if not (self.use_conf or force_reload):
+            return
+        now = time.time()
+        if (not force_reload and self.rules and
+                self._checked_at is not None and
+                now - self._checked_at < CONF.policy_check_interval):
+            return
+        super(Enforcer, self).load_rules(force_reload)
+        # NOTE: common policy stops checking the policy file for changes
+        # once it loaded it
+        self.use_conf = True
+        self._checked_at = now
+
+    def check(self, rule, target, creds, decisions=None):
+        """Checks rule against the target and credentials, like enforce()
+        without raising.
+
+        :param decisions: optional dictionary remembering the decisions
+                          made, to return them again for the same rule
+                          and the same values of the credentials and
+                          target the rule reads.
+        """
+        self.load_rules()
+        compiled = self.compiled_rules.get(rule)
+        if compiled is None:
+            return super(Enforcer, self).enforce(rule, target, creds)
+
+        key = None
+        if decisions is not None and compiled.decision_keys is not None:
+            key = self._decision_key(rule, compiled, target, creds)
+            if key is not None and key in decisions:
+                return decisions[key]
+
+        try:
+            result = compiled.func(target, creds, self)
+        except KeyError:
+            # NOTE: like common policy, which takes this for a missing rule
+            result = False
+
+        if key is not None:
+            if len(decisions) >= _MAX_DECISIONS:
+                decisions.clear()
+            decisions[key] = result
+        return result
+
+    def _decision_key(self, rule, compiled, target, creds):
+        if not isinstance(target, dict):
+            return None
+        cred_keys, target_keys = compiled.decision_keys
+        key = (self.generation, rule,
+               tuple(_freeze(creds.get(k, _MISSING)) for k in cred_keys),
+               tuple(_freeze(target.get(k, _MISSING)) for k in target_keys))
+        try:
+            hash(key)
+        except TypeError:
+            return None
+        return key
+
+    def enforce(self, rule, target, creds, do_raise=False,
+                exc=None, *args, **kwargs):
+        result = self.check(rule, target, creds)
+        if do_raise and not result:
+            if exc:
+                raise exc(*args, **kwargs)
+            raise policy.PolicyNotAuthorized(rule)
+        return result
+
 
 def reset():
     global _ENFORCER
@@ -43,10 +324,10 @@ def init(policy_file=None, rules=None, default_rule=None, use_conf=True):
 
     global _ENFORCER
     if not _ENFORCER:
-        _ENFORCER = policy.Enforcer(policy_file=policy_file,
-                                    rules=rules,
-                                    default_rule=default_rule,
-                                    use_conf=use_conf)
+        _ENFORCER = Enforcer(policy_file=policy_file,
+                             rules=rules,
+                             default_rule=default_rule,
+                             use_conf=use_conf)
 
 
 def set_rules(rules, overwrite=True, use_conf=False):
@@ -83,13 +364,21 @@ def enforce(context, action, target, do_raise=True, exc=None):
        :return: returns a non-False value (not necessarily "True") if
            authorized, and the exact value False if not authorized and
            do_raise is False.
+
+       Decisions are remembered in the context, and made again only if the
+       rule, or the credentials or target attributes it reads changed.
     """
     init()
     credentials = context.to_dict()
     if not exc:
         exc = exception.PolicyNotAuthorized
-    return _ENFORCER.enforce(action, target, credentials, do_raise=do_raise,
-                             exc=exc, action=action)
+    decisions = getattr(context, 'policy_decisions', None)
+    if not isinstance(decisions, dict):
+        decisions = None
+    result = _ENFORCER.check(action, target, credentials, decisions)
+    if do_raise and not result:
+        raise exc(action=action)
+    return result
 
 
 def check_is_admin(context):
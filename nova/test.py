@@ -42,6 +42,7 @@ from nova import db
 from nova.db import migration
 from nova.db.sqlalchemy import api as session
 from nova.network import manager as network_manager
+from nova.network import neutronv2
 from nova import objects
 from nova.objects import base as objects_base
 from nova.openstack.common.fixture import logging as log_fixture
@@ -311,6 +312,10 @@ class TestCase(testtools.TestCase):
         # caching of that value.
         utils._IS_NEUTRON = None
 
+        # NOTE: neutron clients and extensions are cached per process, drop
+        # them so that they do not leak between tests.
+        neutronv2.reset()
+
         mox_fixture = self.useFixture(moxstubout.MoxStubout())
         self.mox = mox_fixture.mox
         self.stubs = mox_fixture.stubs
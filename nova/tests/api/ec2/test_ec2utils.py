@@ -12,6 +12,8 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import mock
+
 from nova.api.ec2 import ec2utils
 from nova import context
 from nova import objects
@@ -59,3 +61,43 @@ class EC2UtilsTestCase(test.TestCase):
         s3imap_id = ec2utils.glance_id_to_id(self.ctxt, 'fake-uuid')
         s3imap = objects.S3ImageMapping.get_by_id(self.ctxt, s3imap_id)
         self.assertEqual('fake-uuid', s3imap.uuid)
+
+    def test_ids_to_ec2_inst_ids(self):
+        imap = objects.EC2InstanceMapping(self.ctxt, uuid='fake-uuid1')
+        imap.create()
+        cached_id = ec2utils.get_int_id_from_instance_uuid(self.ctxt,
+                                                           'fake-uuid2')
+
+        with mock.patch.object(objects.EC2InstanceMappingList,
+                               'get_by_uuids',
+                               wraps=objects.EC2InstanceMappingList.
+                               get_by_uuids) as get_by_uuids:
+            ec2_ids = ec2utils.ids_to_ec2_inst_ids(
+                ['fake-uuid1', 'fake-uuid2', 'fake-uuid3'])
+
+        self.assertEqual(1, get_by_uuids.call_count)
+        self.assertEqual(['fake-uuid1', 'fake-uuid3'],
+                         sorted(get_by_uuids.call_args[0][1]))
+        imap3 = objects.EC2InstanceMapping.get_by_uuid(self.ctxt,
+                                                       'fake-uuid3')
+        self.assertEqual({'fake-uuid1': ec2utils.id_to_ec2_id(imap.id),
+                          'fake-uuid2': ec2utils.id_to_ec2_id(cached_id),
+                          'fake-uuid3': ec2utils.id_to_ec2_id(imap3.id)},
+                         ec2_ids)
+
+    def test_ids_to_ec2_inst_ids_caches_mappings(self):
+        imap = objects.EC2InstanceMapping(self.ctxt, uuid='fake-uuid')
+        imap.create()
+        ec2utils.ids_to_ec2_inst_ids(['fake-uuid'])
+
+        with mock.patch.object(objects.EC2InstanceMapping,
+                               'get_by_id') as get_by_id:
+            self.assertEqual('fake-uuid',
+                             ec2utils.get_instance_uuid_from_int_id(
+                                 self.ctxt, imap.id))
+        self.assertFalse(get_by_id.called)
+        with mock.patch.object(objects.EC2InstanceMappingList,
+                               'get_by_uuids') as get_by_uuids:
+            self.assertEqual({'fake-uuid': ec2utils.id_to_ec2_id(imap.id)},
+                             ec2utils.ids_to_ec2_inst_ids(['fake-uuid']))
+        self.assertFalse(get_by_uuids.called)
@@ -14,6 +14,7 @@
 #    under the License.
 
 from lxml import etree
+import mock
 import webob
 
 from nova.api.openstack.compute.contrib import extended_volumes
@@ -54,6 +55,13 @@ def fake_bdms_get_all_by_instance(*args, **kwargs):
              'destination_type': 'volume', 'id': 2})]
 
 
+def fake_bdms_get_all_by_instance_uuids(context, instance_uuids,
+                                        use_slave=False):
+    return [dict(bdm, instance_uuid=instance_uuid)
+            for instance_uuid in set(instance_uuids)
+            for bdm in fake_bdms_get_all_by_instance()]
+
+
 class ExtendedVolumesTest(test.TestCase):
     content_type = 'application/json'
     prefix = 'os-extended-volumes:'
@@ -65,6 +73,8 @@ class ExtendedVolumesTest(test.TestCase):
         self.stubs.Set(compute.api.API, 'get_all', fake_compute_get_all)
         self.stubs.Set(db, 'block_device_mapping_get_all_by_instance',
                        fake_bdms_get_all_by_instance)
+        self.stubs.Set(db, 'block_device_mapping_get_all_by_instance_uuids',
+                       fake_bdms_get_all_by_instance_uuids)
         self.flags(
             osapi_compute_extension=[
                 'nova.api.openstack.compute.contrib.select_extensions'],
@@ -112,6 +122,13 @@ class ExtendedVolumesTest(test.TestCase):
                           server.findall('%svolume_attached' % self.prefix)]
             self.assertEqual(exp_volumes, actual)
 
+    @mock.patch.object(db, 'block_device_mapping_get_all_by_instance')
+    def test_detail_bdms_prefetched(self, get_all_by_instance):
+        res = self._make_request('/v2/fake/servers/detail')
+
+        self.assertEqual(res.status_int, 200)
+        self.assertFalse(get_all_by_instance.called)
+
 
 class ExtendedVolumesXmlTest(ExtendedVolumesTest):
     content_type = 'application/xml'
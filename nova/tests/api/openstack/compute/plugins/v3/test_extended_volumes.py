@@ -61,6 +61,13 @@ def fake_bdms_get_all_by_instance(*args, **kwargs):
              'destination_type': 'volume', 'id': 2})]
 
 
+def fake_bdms_get_all_by_instance_uuids(context, instance_uuids,
+                                        use_slave=False):
+    return [dict(bdm, instance_uuid=instance_uuid)
+            for instance_uuid in set(instance_uuids)
+            for bdm in fake_bdms_get_all_by_instance()]
+
+
 def fake_attach_volume(self, context, instance, volume_id,
                        device, disk_bus, device_type):
     pass
@@ -139,6 +146,8 @@ class ExtendedVolumesTest(test.TestCase):
         self.stubs.Set(compute.api.API, 'get_all', fake_compute_get_all)
         self.stubs.Set(db, 'block_device_mapping_get_all_by_instance',
                        fake_bdms_get_all_by_instance)
+        self.stubs.Set(db, 'block_device_mapping_get_all_by_instance_uuids',
+                       fake_bdms_get_all_by_instance_uuids)
         self.stubs.Set(volume.cinder.API, 'get', fake_volume_get)
         self.stubs.Set(compute.api.API, 'detach_volume', fake_detach_volume)
         self.stubs.Set(compute.api.API, 'attach_volume', fake_attach_volume)
@@ -185,6 +194,13 @@ class ExtendedVolumesTest(test.TestCase):
                 actual = server.get('%svolumes_attached' % self.prefix)
             self.assertEqual(exp_volumes, actual)
 
+    @mock.patch.object(db, 'block_device_mapping_get_all_by_instance')
+    def test_detail_bdms_prefetched(self, get_all_by_instance):
+        res = self._make_request('/v3/servers/detail')
+
+        self.assertEqual(res.status_int, 200)
+        self.assertFalse(get_all_by_instance.called)
+
     def test_detach(self):
         url = "/v3/servers/%s/action" % UUID1
         res = self._make_request(url, {"detach": {"volume_id": UUID1}})
@@ -372,6 +372,14 @@ class ResourceExtensionTest(ExtensionTestCase):
         self.assertEqual(200, response.status_int)
         self.assertEqual(response_body, response.body)
 
+    def test_routes_built_on_load(self):
+        res_ext = base_extensions.ResourceExtension('tweedles',
+                                  StubController(response_body))
+        manager = StubExtensionManager(res_ext)
+        app = compute.APIRouter(manager)
+        self.assertTrue(app.map._created_regs)
+        self.assertIsNotNone(app.map.match('/fake/tweedles'))
+
     def test_get_resources_with_controller(self):
         res_ext = base_extensions.ResourceExtension('tweedles',
                                                StubController(response_body))
@@ -27,10 +27,12 @@ import webob.exc
 import webob.multidict
 
 from nova.api.openstack import common
+from nova.api.openstack import wsgi
 from nova.api.openstack import xmlutil
 from nova.compute import task_states
 from nova.compute import vm_states
 from nova import exception
+from nova import objects
 from nova import test
 from nova.tests import utils
 
@@ -459,6 +461,28 @@ class MiscFunctionsTest(test.TestCase):
                      task_states.RESIZE_PREP])
         self.assertEqual(expected, actual)
 
+    @mock.patch.object(objects.BlockDeviceMappingList,
+                       'get_by_instance_uuids')
+    def test_prefetch_instances(self, get_bdms):
+        req = wsgi.Request.blank('/')
+        req.environ['nova.context'] = 'context'
+        instances = mock.Mock()
+        instances.__iter__ = mock.Mock(return_value=iter(
+            [{'uuid': 'uuid1'}, {'uuid': 'uuid2'}]))
+        bdm = objects.BlockDeviceMapping(instance_uuid='uuid1', id=1)
+        get_bdms.return_value = [bdm]
+
+        common.prefetch_instances(req, instances)
+        self.assertFalse(instances.fill_faults.called)
+        self.assertFalse(get_bdms.called)
+
+        req.add_prefetch('fault', 'block_device_mapping')
+        common.prefetch_instances(req, instances)
+        instances.fill_faults.assert_called_once_with()
+        get_bdms.assert_called_once_with('context', ['uuid1', 'uuid2'])
+        self.assertEqual([bdm], req.get_db_block_device_mappings('uuid1'))
+        self.assertEqual([], req.get_db_block_device_mappings('uuid2'))
+
 
 class TestCollectionLinks(test.NoDBTestCase):
     """Tests the _get_collection_links method."""
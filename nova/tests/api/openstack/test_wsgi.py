@@ -10,6 +10,7 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import datetime
 import inspect
 
 import webob
@@ -18,6 +19,8 @@ from nova.api.openstack import extensions
 from nova.api.openstack import wsgi
 from nova import exception
 from nova import i18n
+from nova import objects
+from nova.openstack.common import jsonutils
 from nova import test
 from nova.tests.api.openstack import fakes
 from nova.tests import utils
@@ -131,6 +134,23 @@ class RequestTest(test.NoDBTestCase):
                  'id1': compute_nodes[1],
                  'id2': compute_nodes[2]})
 
+    def test_cache_and_retrieve_block_device_mappings(self):
+        request = wsgi.Request.blank('/foo')
+        bdms = [objects.BlockDeviceMapping(instance_uuid='uuid1', id=1),
+                objects.BlockDeviceMapping(instance_uuid='uuid1', id=2)]
+        request.cache_db_block_device_mappings(['uuid1', 'uuid2'], bdms)
+        self.assertEqual(bdms, request.get_db_block_device_mappings('uuid1'))
+        self.assertEqual([], request.get_db_block_device_mappings('uuid2'))
+        self.assertIsNone(request.get_db_block_device_mappings('uuid3'))
+
+    def test_prefetch(self):
+        request = wsgi.Request.blank('/foo')
+        self.assertEqual(set(), request.get_prefetch())
+        request.add_prefetch('fault', 'block_device_mapping')
+        request.add_prefetch('fault')
+        self.assertEqual(set(['fault', 'block_device_mapping']),
+                         request.get_prefetch())
+
     def test_from_request(self):
         self.stubs.Set(i18n, 'get_available_languages',
                        fakes.fake_get_available_languages)
@@ -232,6 +252,39 @@ class JSONDictSerializerTest(test.NoDBTestCase):
         result = result.replace('\n', '').replace(' ', '')
         self.assertEqual(result, expected_json)
 
+    def test_json_datetime(self):
+        input_dict = {'server': {'launched_at':
+                                 datetime.datetime(2014, 5, 2, 19, 26, 46)}}
+        serializer = wsgi.JSONDictSerializer()
+        self.assertEqual(jsonutils.dumps(input_dict),
+                         serializer.serialize(input_dict))
+
+    def test_serialize_chunks(self):
+        self.flags(osapi_json_stream_threshold=2)
+        self.stubs.Set(wsgi, '_JSON_STREAM_CHUNK_ITEMS', 2)
+        input_dict = {'servers': [{'id': i} for i in range(5)],
+                      'servers_links': [{'rel': 'next'}]}
+        serializer = wsgi.JSONDictSerializer()
+        chunks = list(serializer.serialize_chunks(input_dict))
+        self.assertEqual(['{"servers_links": [{"rel": "next"}], '
+                          '"servers": [',
+                          '{"id": 0}, {"id": 1}',
+                          ', {"id": 2}, {"id": 3}',
+                          ', {"id": 4}',
+                          ']}'], chunks)
+        self.assertEqual(input_dict, jsonutils.loads(''.join(chunks)))
+
+    def test_serialize_chunks_not_streamed(self):
+        serializer = wsgi.JSONDictSerializer()
+        input_dict = {'servers': [{'id': i} for i in range(5)]}
+        self.assertIsNone(serializer.serialize_chunks(input_dict))
+        self.flags(osapi_json_stream_threshold=10)
+        self.assertIsNone(serializer.serialize_chunks(input_dict))
+        self.flags(osapi_json_stream_threshold=2)
+        self.assertIsNone(serializer.serialize_chunks(
+            {'a': [1, 2], 'b': [3, 4]}))
+        self.assertIsNone(serializer.serialize_chunks([1, 2, 3]))
+
 
 class TextDeserializerTest(test.NoDBTestCase):
     def test_dispatch_default(self):
@@ -875,6 +928,23 @@ class ResourceTest(test.NoDBTestCase):
         self.assertIsNone(response)
         self.assertEqual(list(post), [extension2, extension1])
 
+    def test_pre_process_extensions_prefetch(self):
+        resource = wsgi.Resource(None)
+
+        @wsgi.prefetch('block_device_mapping')
+        def extension1(req, resp_obj):
+            pass
+
+        def extension2(req, resp_obj):
+            pass
+
+        request = wsgi.Request.blank('/foo')
+        response, post = resource.pre_process_extensions(
+            [extension1, extension2], request, {})
+        self.assertIsNone(response)
+        self.assertEqual(set(['block_device_mapping']),
+                         request.get_prefetch())
+
     def test_pre_process_extensions_generator(self):
         class Controller(object):
             def index(self, req, pants=None):
@@ -1206,6 +1276,16 @@ class ResponseObjectTest(test.NoDBTestCase):
             self.assertEqual(response.status_int, 202)
             self.assertEqual(response.body, mtype)
 
+    def test_serialize_streamed(self):
+        self.flags(osapi_json_stream_threshold=2)
+        robj = wsgi.ResponseObject({'servers': [{'id': 1}, {'id': 2}]})
+        request = wsgi.Request.blank('/tests/123')
+        response = robj.serialize(request, 'application/json',
+                                  {'json': wsgi.JSONDictSerializer})
+        self.assertIsNone(response.content_length)
+        self.assertEqual('{"servers": [{"id": 1}, {"id": 2}]}',
+                         response.body)
+
 
 class ValidBodyTest(test.NoDBTestCase):
 
@@ -749,6 +749,66 @@ class TemplateTest(test.NoDBTestCase):
         self.assertEqual(result[0].tag, 'image')
         self.assertEqual(result[0].get('id'), str(obj['test']['image']))
 
+    def _make_compile_templates(self):
+        class AlwaysTemplateElement(xmlutil.TemplateElement):
+            def will_render(self, datum):
+                return True
+
+        root = xmlutil.TemplateElement('test', selector='test',
+                                       name='name', missing='missing')
+        value = xmlutil.SubTemplateElement(root, 'value', selector='values')
+        value.text = xmlutil.Selector()
+        root.append(AlwaysTemplateElement('always', selector='missing'))
+        attrs = xmlutil.SubTemplateElement(root, 'attrs', selector='attrs')
+        xmlutil.SubTemplateElement(attrs, 'attr', selector=xmlutil.get_items,
+                                   key=0, value=1)
+        master = xmlutil.MasterTemplate(root, 1, nsmap=dict(f='foo'))
+
+        root_slave = xmlutil.TemplateElement('test', selector='test',
+                                             name='image')
+        image = xmlutil.SubTemplateElement(root_slave, 'image',
+                                           selector='image', id='id')
+        image.text = xmlutil.Selector('name')
+        attrs = xmlutil.SubTemplateElement(root_slave, 'attrs',
+                                           selector='attrs', a='a')
+        slave = xmlutil.SlaveTemplate(root_slave, 1, nsmap=dict(b='bar'))
+        master.attach(slave)
+        return master
+
+    def test_serialize_compiled(self):
+        obj = {
+            'test': {
+                'name': 'foobar',
+                'values': [1, 2, 3, 4],
+                'attrs': {'a': 1, 'b': 2},
+                'image': {'name': 'image_foobar', 'id': 42},
+                },
+            }
+        master = self._make_compile_templates()
+
+        expected = etree.tostring(
+            master._serialize(None, obj, master._siblings(), master._nsmap()),
+            encoding='UTF-8', xml_declaration=True)
+        self.assertEqual(expected, master.serialize(obj))
+        # The compiled template is reused
+        self.assertEqual(expected, master.serialize(obj))
+        compiled = xmlutil._COMPILED[tuple(master._siblings())]
+        self.assertTrue(compiled.fast)
+
+    def test_serialize_compiled_template_changed(self):
+        obj = {'test': {'name': 'foobar', 'values': [1], 'attrs': {}}}
+        master = self._make_compile_templates()
+        master.serialize(obj)
+        self.assertIn(tuple(master._siblings()), xmlutil._COMPILED)
+
+        master.root.set('values', 'name')
+        self.assertEqual({}, xmlutil._COMPILED)
+        extra = xmlutil.SubTemplateElement(master.root, 'extra')
+        extra.text = xmlutil.Selector('name')
+        result = etree.fromstring(master.serialize(obj))
+        self.assertEqual('foobar', result.get('values'))
+        self.assertEqual('foobar', result.find('extra').text)
+
 
 class MasterTemplateBuilder(xmlutil.TemplateBuilder):
     def construct(self):
@@ -4778,6 +4778,31 @@ class BlockDeviceMappingTestCase(test.TestCase):
         bmd = db.block_device_mapping_get_all_by_instance(self.ctxt, uuid2)
         self.assertEqual(len(bmd), 2)
 
+    def test_block_device_mapping_get_all_by_instance_uuids(self):
+        uuid1 = self.instance['uuid']
+        uuid2 = db.instance_create(self.ctxt, {})['uuid']
+        uuid3 = db.instance_create(self.ctxt, {})['uuid']
+
+        bmds_values = [{'instance_uuid': uuid1,
+                        'device_name': '/dev/vda'},
+                       {'instance_uuid': uuid2,
+                        'device_name': '/dev/vdb'},
+                       {'instance_uuid': uuid3,
+                        'device_name': '/dev/vdc'}]
+
+        for bdm in bmds_values:
+            self._create_bdm(bdm)
+
+        # The queries are counted for the current context
+        ctxt = context.RequestContext('fake', 'fake', is_admin=True)
+        bmd = db.block_device_mapping_get_all_by_instance_uuids(
+            ctxt, [uuid1, uuid2])
+        self.assertEqual(['/dev/vda', '/dev/vdb'],
+                         sorted(b['device_name'] for b in bmd))
+        self.assertEqual(1, ctxt.db_queries)
+        self.assertEqual([], db.block_device_mapping_get_all_by_instance_uuids(
+            self.ctxt, []))
+
     def test_block_device_mapping_destroy(self):
         bdm = self._create_bdm({})
         db.block_device_mapping_destroy(self.ctxt, bdm['id'])
@@ -5820,6 +5845,23 @@ class ComputeNodeTestCase(test.TestCase, ModelsObjectComparatorMixin):
         self._assertEqualListsOfObjects(nodes_created, nodes,
                         ignored_keys=self._ignored_keys + ['stats', 'service'])
 
+    def test_compute_node_search_by_stats(self):
+        nodes_created = []
+        new_service = copy.copy(self.service_dict)
+        for i in xrange(3):
+            new_service['binary'] += str(i)
+            new_service['topic'] += str(i)
+            service = db.service_create(self.ctxt, new_service)
+            self.compute_node_dict['service_id'] = service['id']
+            self.compute_node_dict['stats'] = jsonutils.dumps(
+                {'cached_images': 'image%d' % i})
+            node = db.compute_node_create(self.ctxt, self.compute_node_dict)
+            nodes_created.append(node)
+        nodes = db.compute_node_search_by_stats(self.ctxt, 'image1')
+        self.assertEqual(1, len(nodes))
+        self._assertEqualListsOfObjects(nodes_created[1:2], nodes,
+                        ignored_keys=self._ignored_keys + ['stats', 'service'])
+
     def test_compute_node_statistics(self):
         stats = db.compute_node_statistics(self.ctxt)
         self.assertEqual(stats.pop('count'), 1)
@@ -6454,6 +6496,16 @@ class Ec2TestCase(test.TestCase):
         inst2 = db.ec2_instance_get_by_id(self.ctxt, inst['id'])
         self.assertEqual(inst['id'], inst2['id'])
 
+    def test_ec2_instance_get_all_by_uuids(self):
+        inst1 = db.ec2_instance_create(self.ctxt, 'fake-uuid1')
+        inst2 = db.ec2_instance_create(self.ctxt, 'fake-uuid2')
+        db.ec2_instance_create(self.ctxt, 'fake-uuid3')
+        insts = db.ec2_instance_get_all_by_uuids(
+            self.ctxt, ['fake-uuid1', 'fake-uuid2', 'uuid-not-present'])
+        self.assertEqual(sorted([inst1['id'], inst2['id']]),
+                         sorted(inst['id'] for inst in insts))
+        self.assertEqual([], db.ec2_instance_get_all_by_uuids(self.ctxt, []))
+
     def test_ec2_instance_get_by_uuid_not_found(self):
         self.assertRaises(exception.InstanceNotFound,
                           db.ec2_instance_get_by_uuid,
@@ -15,8 +15,13 @@
 
 
 import datetime
+import hashlib
+import os
+import socket
+import ssl
 import sys
 
+import fixtures
 import glanceclient.exc
 import mock
 from oslo.config import cfg
@@ -274,6 +279,19 @@ class TestCreateGlanceClient(test.NoDBTestCase):
         init_mock.assert_called_once_with('1', expected_endpoint,
                                           **expected_params)
 
+    @mock.patch('glanceclient.Client')
+    def test_ssl_options_passed_glanceclient(self, init_mock):
+        self.flags(auth_strategy='non-keystone')
+        self.flags(ca_file='/ca', cert_file='/cert', key_file='/key',
+                   group='glance')
+        ctx = context.RequestContext('fake', 'fake')
+        glance._create_glance_client(ctx, 'host4', 9295, True)
+        init_mock.assert_called_once_with('1', 'https://host4:9295',
+                                          insecure=False,
+                                          ssl_compression=False,
+                                          cacert='/ca', cert_file='/cert',
+                                          key_file='/key')
+
 
 class TestGlanceClientWrapper(test.NoDBTestCase):
     @mock.patch('time.sleep')
@@ -533,6 +551,39 @@ class TestDownloadNoDirectUri(test.NoDBTestCase):
                                                   mock.sentinel.dst_path,
                                                   mock.sentinel.loc_meta)
 
+    @mock.patch('nova.image.glance.GlanceImageService._get_transfer_module')
+    @mock.patch('nova.image.glance.GlanceImageService.show')
+    def test_download_direct_peer_first(self, show_mock, get_tran_mock):
+        self.flags(allowed_direct_url_schemes=['file', 'peer'],
+                   group='glance')
+        show_mock.return_value = {
+            'checksum': 'checksum',
+            'disk_format': 'raw',
+            'locations': [
+                {
+                    'url': 'file:///files/image',
+                    'metadata': mock.sentinel.loc_meta
+                }
+            ]
+        }
+        tran_mod = mock.MagicMock()
+        get_tran_mock.return_value = tran_mod
+        client = mock.MagicMock()
+        ctx = mock.sentinel.ctx
+        service = glance.GlanceImageService(client)
+        service._download_handlers['peer'] = mock.sentinel.peer
+        res = service.download(ctx, 'image_id',
+                               dst_path=mock.sentinel.dst_path)
+
+        self.assertIsNone(res)
+        self.assertFalse(client.call.called)
+        get_tran_mock.assert_called_once_with('peer')
+        tran_mod.download.assert_called_once_with(
+            ctx, mock.ANY, mock.sentinel.dst_path,
+            {'checksum': 'checksum', 'disk_format': 'raw'})
+        self.assertEqual('/image_id',
+                         tran_mod.download.call_args[0][1].path)
+
     @mock.patch('__builtin__.open')
     @mock.patch('nova.image.glance.GlanceImageService._get_transfer_module')
     @mock.patch('nova.image.glance.GlanceImageService.show')
@@ -636,6 +687,168 @@ class TestDownloadNoDirectUri(test.NoDBTestCase):
         writer.close.assert_called_once_with()
 
 
+class TestDownloadRanges(test.NoDBTestCase):
+
+    """Tests downloading an image with parallel range requests."""
+
+    IMAGE_DATA = 'abcdefghij'
+
+    def setUp(self):
+        super(TestDownloadRanges, self).setUp()
+        self.flags(download_streams=3, group='glance')
+        self.useFixture(fixtures.MonkeyPatch('nova.image.glance._RANGE_SIZE',
+                                             4))
+        tempdir = self.useFixture(fixtures.TempDir()).path
+        self.dst_path = os.path.join(tempdir, 'image')
+        self.client = mock.MagicMock()
+        self.client.next_endpoint.return_value = ('host', 9292, False)
+        self.client.call.return_value = [self.IMAGE_DATA]
+        self.service = glance.GlanceImageService(self.client)
+
+    def _fake_fetch_range(self, host, port, use_ssl, path, headers,
+                          dst_path, start, end):
+        with open(dst_path, 'r+b') as f:
+            f.seek(start)
+            f.write(self.IMAGE_DATA[start:end + 1])
+
+    def _show(self, checksum):
+        return {'size': len(self.IMAGE_DATA), 'checksum': checksum}
+
+    def _read_image(self):
+        with open(self.dst_path, 'rb') as f:
+            return f.read()
+
+    @mock.patch('nova.image.glance._fetch_range')
+    @mock.patch('nova.image.glance.GlanceImageService.show')
+    def test_download_ranges(self, show_mock, fetch_mock):
+        show_mock.return_value = self._show(
+            hashlib.md5(self.IMAGE_DATA).hexdigest())
+        fetch_mock.side_effect = self._fake_fetch_range
+        ctx = context.RequestContext('fake', 'fake')
+
+        self.service.download(ctx, 'image_id', dst_path=self.dst_path)
+
+        self.assertEqual(self.IMAGE_DATA, self._read_image())
+        self.assertFalse(self.client.call.called)
+        self.assertEqual([(0, 3), (4, 7), (8, 9)],
+                         sorted(c[0][6:] for c in fetch_mock.call_args_list))
+        for c in fetch_mock.call_args_list:
+            self.assertEqual(('host', 9292, False, '/v1/images/image_id'),
+                             c[0][:4])
+
+    @mock.patch('nova.image.glance._fetch_range')
+    @mock.patch('nova.image.glance.GlanceImageService.show')
+    def test_download_ranges_bad_checksum_falls_back(self, show_mock,
+                                                     fetch_mock):
+        show_mock.return_value = self._show('bad')
+        fetch_mock.side_effect = self._fake_fetch_range
+        ctx = context.RequestContext('fake', 'fake')
+
+        self.service.download(ctx, 'image_id', dst_path=self.dst_path)
+
+        self.assertEqual(self.IMAGE_DATA, self._read_image())
+        self.client.call.assert_called_once_with(ctx, 1, 'data', 'image_id')
+
+    @mock.patch('nova.image.glance._fetch_range')
+    @mock.patch('nova.image.glance.GlanceImageService.show')
+    def test_download_ranges_not_supported_falls_back(self, show_mock,
+                                                      fetch_mock):
+        show_mock.return_value = self._show(None)
+        fetch_mock.side_effect = glance._RangeNotSupported()
+        ctx = context.RequestContext('fake', 'fake')
+
+        self.service.download(ctx, 'image_id', dst_path=self.dst_path)
+
+        self.assertEqual(self.IMAGE_DATA, self._read_image())
+        self.client.call.assert_called_once_with(ctx, 1, 'data', 'image_id')
+
+    @mock.patch('time.sleep')
+    @mock.patch('nova.image.glance._fetch_range')
+    def test_fetch_range_retries(self, fetch_mock, sleep_mock):
+        self.flags(num_retries=1, group='glance')
+        fetch_mock.side_effect = [socket.error(), None]
+        glance._fetch_range_with_retries('host', 9292, False, 'path', {},
+                                         self.dst_path, 0, 3)
+        self.assertEqual(2, fetch_mock.call_count)
+        sleep_mock.assert_called_once_with(1)
+
+    @mock.patch('time.sleep')
+    @mock.patch('nova.image.glance._fetch_range')
+    def test_fetch_range_retries_exhausted(self, fetch_mock, sleep_mock):
+        fetch_mock.side_effect = socket.error()
+        self.assertRaises(socket.error, glance._fetch_range_with_retries,
+                          'host', 9292, False, 'path', {}, self.dst_path,
+                          0, 3)
+        self.assertEqual(1, fetch_mock.call_count)
+
+    @mock.patch('httplib.HTTPConnection')
+    def test_fetch_range(self, conn_mock):
+        with open(self.dst_path, 'wb') as f:
+            f.truncate(len(self.IMAGE_DATA))
+        resp = conn_mock.return_value.getresponse.return_value
+        resp.status = 206
+        resp.read.side_effect = ['efg', 'h']
+
+        glance._fetch_range('host', 9292, False, 'path', {'a': 'b'},
+                            self.dst_path, 4, 7)
+
+        conn_mock.assert_called_once_with('host', 9292, timeout=60)
+        conn_mock.return_value.request.assert_called_once_with(
+            'GET', 'path', headers={'a': 'b', 'Range': 'bytes=4-7'})
+        self.assertEqual('\0' * 4 + 'efgh' + '\0' * 2, self._read_image())
+
+    @mock.patch('httplib.HTTPSConnection')
+    def test_fetch_range_ssl(self, conn_mock):
+        self.flags(api_insecure=True, range_timeout=0, group='glance')
+        with open(self.dst_path, 'wb') as f:
+            f.truncate(len(self.IMAGE_DATA))
+        resp = conn_mock.return_value.getresponse.return_value
+        resp.status = 206
+        resp.read.side_effect = ['abcd']
+
+        glance._fetch_range('host', 9292, True, 'path', {},
+                            self.dst_path, 0, 3)
+
+        args, kwargs = conn_mock.call_args
+        self.assertEqual(('host', 9292), args)
+        self.assertIsNone(kwargs['timeout'])
+        self.assertEqual(ssl.CERT_NONE, kwargs['context'].verify_mode)
+
+    @mock.patch('ssl.create_default_context')
+    def test_ssl_context(self, context_mock):
+        self.flags(ca_file='/ca', cert_file='/cert', key_file='/key',
+                   group='glance')
+        context = glance._ssl_context()
+        context_mock.assert_called_once_with(cafile='/ca')
+        context.load_cert_chain.assert_called_once_with('/cert', '/key')
+        self.assertNotEqual(ssl.CERT_NONE, context.verify_mode)
+
+    @mock.patch('nova.image.glance._fetch_range')
+    @mock.patch('nova.image.glance.GlanceImageService.show')
+    def test_download_ranges_api_version(self, show_mock, fetch_mock):
+        show_mock.return_value = self._show(None)
+        fetch_mock.side_effect = self._fake_fetch_range
+        ctx = context.RequestContext('fake', 'fake')
+
+        self.service._download_ranges(ctx, 'image_id', self.dst_path, 2)
+
+        self.assertEqual('/v2/images/image_id/file',
+                         fetch_mock.call_args[0][3])
+        self.assertRaises(exception.ImageUnacceptable,
+                          self.service._download_ranges, ctx, 'image_id',
+                          self.dst_path, 3)
+
+    @mock.patch('httplib.HTTPConnection')
+    def test_fetch_range_not_supported(self, conn_mock):
+        with open(self.dst_path, 'wb') as f:
+            f.truncate(len(self.IMAGE_DATA))
+        resp = conn_mock.return_value.getresponse.return_value
+        resp.status = 200
+        self.assertRaises(glance._RangeNotSupported, glance._fetch_range,
+                          'host', 9292, False, 'path', {}, self.dst_path,
+                          0, 3)
+
+
 class TestIsImageAvailable(test.NoDBTestCase):
     """Tests the internal _is_image_available function."""
 
@@ -12,12 +12,15 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import hashlib
+import socket
 import urlparse
 
 import mock
 
 from nova import exception
 from nova.image.download import file as tm_file
+from nova.image.download import peer as tm_peer
 from nova import test
 
 
@@ -99,3 +102,109 @@ class TestFileTransferModule(test.NoDBTestCase):
                           tm.download, mock.sentinel.ctx, url_parts,
                           dst_file, loc_meta)
         self.assertFalse(copy_mock.called)
+
+
+class TestPeerTransferModule(test.NoDBTestCase):
+
+    FNAME = hashlib.sha1('image-id').hexdigest()
+    CHECKSUM = hashlib.md5('image data').hexdigest()
+
+    def setUp(self):
+        super(TestPeerTransferModule, self).setUp()
+        self.flags(my_ip='10.0.0.1')
+        self.flags(image_peer_port=8776, image_peer_secret='secret',
+                   group='libvirt')
+        self.url_parts = urlparse.urlparse('peer:///image-id')
+        self.ctx = mock.MagicMock()
+        self.meta = {'checksum': self.CHECKSUM, 'disk_format': 'raw'}
+        nodes = [
+            mock.Mock(stats={'image_peer_url': 'http://10.0.0.1:8776',
+                             'cached_images': self.FNAME}),
+            mock.Mock(stats={'image_peer_url': 'http://10.0.0.2:8776',
+                             'cached_images': 'other,' + self.FNAME}),
+            mock.Mock(stats={'image_peer_url': 'http://10.0.0.3:8776',
+                             'cached_images': 'other-' + self.FNAME}),
+            mock.Mock(stats={'cached_images': self.FNAME}),
+        ]
+        patcher = mock.patch('nova.objects.ComputeNodeList.get_by_stats',
+                             return_value=nodes)
+        self.get_by_stats_mock = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    @mock.patch('nova.virt.libvirt.imagepeer.fetch')
+    def test_peer_success(self, fetch_mock):
+        fetch_mock.return_value = self.CHECKSUM
+        tm = tm_peer.PeerTransfer()
+        tm.download(self.ctx, self.url_parts, mock.sentinel.dst_file,
+                    self.meta)
+        self.get_by_stats_mock.assert_called_once_with(self.ctx.elevated(),
+                                                       self.FNAME)
+        fetch_mock.assert_called_once_with('http://10.0.0.2:8776',
+                                           self.FNAME,
+                                           mock.sentinel.dst_file)
+
+    @mock.patch('nova.virt.libvirt.imagepeer.fetch')
+    def test_peer_fetch_fails(self, fetch_mock):
+        fetch_mock.side_effect = IOError()
+        tm = tm_peer.PeerTransfer()
+        self.assertRaises(exception.ImageDownloadModuleError,
+                          tm.download, self.ctx, self.url_parts,
+                          mock.sentinel.dst_file, self.meta)
+        self.assertEqual(1, fetch_mock.call_count)
+
+    @mock.patch('nova.virt.libvirt.imagepeer.fetch')
+    def test_peer_fetch_times_out(self, fetch_mock):
+        self.flags(image_peer_port=0, group='libvirt')
+        fetch_mock.side_effect = [socket.timeout(), self.CHECKSUM]
+        tm = tm_peer.PeerTransfer()
+        tm.download(self.ctx, self.url_parts, mock.sentinel.dst_file,
+                    self.meta)
+        self.assertEqual(2, fetch_mock.call_count)
+
+    @mock.patch('nova.virt.libvirt.imagepeer.fetch')
+    def test_peer_checksum_mismatch(self, fetch_mock):
+        fetch_mock.return_value = hashlib.md5('other data').hexdigest()
+        tm = tm_peer.PeerTransfer()
+        self.assertRaises(exception.ImageDownloadModuleError,
+                          tm.download, self.ctx, self.url_parts,
+                          mock.sentinel.dst_file, self.meta)
+        self.assertEqual(1, fetch_mock.call_count)
+
+    @mock.patch('nova.virt.libvirt.imagepeer.fetch')
+    def test_peer_no_checksum(self, fetch_mock):
+        tm = tm_peer.PeerTransfer()
+        self.assertRaises(exception.ImageDownloadModuleError,
+                          tm.download, self.ctx, self.url_parts,
+                          mock.sentinel.dst_file, {'disk_format': 'raw'})
+        self.assertFalse(fetch_mock.called)
+
+    @mock.patch('nova.virt.libvirt.imagepeer.fetch')
+    def test_peer_converted_image(self, fetch_mock):
+        self.flags(force_raw_images=True)
+        self.meta['disk_format'] = 'qcow2'
+        tm = tm_peer.PeerTransfer()
+        self.assertRaises(exception.ImageDownloadModuleError,
+                          tm.download, self.ctx, self.url_parts,
+                          mock.sentinel.dst_file, self.meta)
+        self.assertFalse(fetch_mock.called)
+
+    @mock.patch('nova.virt.libvirt.imagepeer.fetch')
+    def test_peer_unconverted_image(self, fetch_mock):
+        self.flags(force_raw_images=False)
+        self.meta['disk_format'] = 'qcow2'
+        fetch_mock.return_value = self.CHECKSUM
+        tm = tm_peer.PeerTransfer()
+        tm.download(self.ctx, self.url_parts, mock.sentinel.dst_file,
+                    self.meta)
+        self.assertEqual(1, fetch_mock.call_count)
+
+    @mock.patch('nova.virt.libvirt.imagepeer.fetch')
+    def test_peer_max_peers(self, fetch_mock):
+        self.flags(image_peer_port=0, group='libvirt')
+        self.flags(max_peers=1, group='image_peer')
+        fetch_mock.side_effect = IOError()
+        tm = tm_peer.PeerTransfer()
+        self.assertRaises(exception.ImageDownloadModuleError,
+                          tm.download, self.ctx, self.url_parts,
+                          mock.sentinel.dst_file, self.meta)
+        self.assertEqual(1, fetch_mock.call_count)
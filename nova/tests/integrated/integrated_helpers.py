@@ -31,6 +31,7 @@ from nova.tests import cast_as_call
 from nova.tests import fake_crypto
 import nova.tests.image.fake
 from nova.tests.integrated.api import client
+from nova.tests import policy_fixture
 
 
 CONF = cfg.CONF
@@ -71,6 +72,8 @@ class _IntegratedTestBase(test.TestCase):
         self.flags(verbose=True)
 
         self.useFixture(test.ReplaceModule('crypto', fake_crypto))
+        self.policy_stats = self.useFixture(
+            policy_fixture.EnforceStatsFixture())
         nova.tests.image.fake.stub_out_image_service(self.stubs)
         self.flags(scheduler_driver='nova.scheduler.'
                     'chance.ChanceScheduler')
@@ -883,6 +883,103 @@ class LinuxNetworkTestCase(test.NoDBTestCase):
         dup_forward_rules = len(linux_net.iptables_manager.ipv4['nat'].rules)
         self.assertEqual(two_forward_rules, dup_forward_rules)
 
+    def test_ensure_floating_forwards_applies_once(self):
+        ln = linux_net
+        net = {'bridge': 'br100', 'cidr': '10.0.0.0/24'}
+        ln.ensure_floating_forward('10.10.10.10', '10.0.0.1', 'eth0', net)
+        with contextlib.nested(
+            mock.patch.object(ln.iptables_manager, 'apply'),
+            mock.patch.object(ln, 'ensure_ebtables_rules')
+        ) as (mock_apply, mock_ebtables):
+            ln.ensure_floating_forwards(
+                [('10.10.10.10', '10.0.0.3', 'eth0', net),
+                 ('10.10.10.11', '10.0.0.10', 'eth0', net),
+                 ('10.10.10.12', '10.0.0.11', 'br100', net)])
+            mock_apply.assert_called_once_with()
+            self.assertEqual(1, mock_ebtables.call_count)
+            rules, table = mock_ebtables.call_args[0]
+            self.assertEqual('nat', table)
+            self.assertEqual(2, len(rules))
+        nat_rules = [str(rule) for rule in
+                     ln.iptables_manager.ipv4['nat'].rules]
+        self.assertFalse([rule for rule in nat_rules if '10.0.0.1 ' in rule
+                          or rule.endswith('10.0.0.1')])
+        for fixed_ip in ('10.0.0.3', '10.0.0.10', '10.0.0.11'):
+            self.assertTrue([rule for rule in nat_rules
+                             if rule.endswith('--to %s' % fixed_ip)])
+
+    def test_add_rules_skips_duplicates(self):
+        table = linux_net.IptablesTable()
+        table.add_chain('FORWARD')
+        table.add_rule('FORWARD', '-j ACCEPT')
+        table.dirty = False
+        table.add_rules([('FORWARD', '-j ACCEPT'),
+                         ('FORWARD', '-j $FORWARD'),
+                         ('FORWARD', '-j $FORWARD')])
+        self.assertTrue(table.dirty)
+        self.assertEqual(['-j ACCEPT',
+                          '-j %s-FORWARD' % linux_net.binary_name],
+                         [rule.rule for rule in table.rules])
+        self.assertRaises(ValueError, table.add_rules, [('NOPE', '-j DROP')])
+
+    def test_bind_floating_ips(self):
+        self.flags(send_arp_for_ha=False)
+        with mock.patch.object(linux_net, '_execute',
+                               return_value=('', '')) as mock_execute:
+            linux_net.bind_floating_ips(['1.2.3.4', '1.2.3.5'], 'eth0')
+            mock_execute.assert_called_once_with(
+                'ip', '-force', '-batch', '-',
+                process_input='addr add 1.2.3.4/32 dev eth0\n'
+                              'addr add 1.2.3.5/32 dev eth0\n',
+                run_as_root=True, check_exit_code=[0, 1, 2, 254])
+
+    def test_bind_floating_ips_missing_device(self):
+        with mock.patch.object(linux_net, '_execute',
+                               return_value=('', 'Cannot find device "em0"')):
+            self.assertRaises(processutils.ProcessExecutionError,
+                              linux_net.bind_floating_ips, ['1.2.3.4'], 'em0')
+
+    def test_bind_floating_ips_already_bound(self):
+        self.flags(send_arp_for_ha=False)
+        err = ('RTNETLINK answers: File exists\n'
+               'Command failed -:1\n'
+               'Error: ipv4: Address already assigned.\n'
+               'Command failed -:2\n')
+        with mock.patch.object(linux_net, '_execute', return_value=('', err)):
+            linux_net.bind_floating_ips(['1.2.3.4', '1.2.3.5'], 'eth0')
+
+    def test_bind_floating_ips_other_error(self):
+        err = ('RTNETLINK answers: File exists\n'
+               'Command failed -:1\n'
+               'RTNETLINK answers: Operation not permitted\n'
+               'Command failed -:2\n')
+        with mock.patch.object(linux_net, '_execute', return_value=('', err)):
+            self.assertRaises(processutils.ProcessExecutionError,
+                              linux_net.bind_floating_ips,
+                              ['1.2.3.4', '1.2.3.5'], 'eth0')
+
+    def test_unbind_floating_ips_already_gone(self):
+        err = ('RTNETLINK answers: Cannot assign requested address\n'
+               'Command failed -:1\n'
+               'Error: ipv4: Address not found.\n'
+               'Command failed -:2\n')
+        with mock.patch.object(linux_net, '_execute', return_value=('', err)):
+            linux_net.unbind_floating_ips(['1.2.3.4', '1.2.3.5'], 'eth0')
+
+    def test_unbind_floating_ips_only_ignores_del_errors(self):
+        err = ('RTNETLINK answers: File exists\n'
+               'Command failed -:1\n')
+        with mock.patch.object(linux_net, '_execute', return_value=('', err)):
+            self.assertRaises(processutils.ProcessExecutionError,
+                              linux_net.unbind_floating_ips,
+                              ['1.2.3.4'], 'eth0')
+
+    def test_clean_conntracks(self):
+        with mock.patch.object(linux_net, 'clean_conntrack') as mock_clean:
+            linux_net.clean_conntracks(['10.0.0.2', '10.0.0.1', '10.0.0.2'])
+            self.assertEqual([mock.call('10.0.0.1'), mock.call('10.0.0.2')],
+                             mock_clean.call_args_list)
+
     def test_apply_ran(self):
         manager = linux_net.IptablesManager()
         manager.iptables_apply_deferred = False
@@ -1381,6 +1381,27 @@ class VlanNetworkTestCase(test.TestCase):
                                               'fakeiface',
                                               'fakenet')
 
+    def test_add_floating_ips_batches_by_interface(self):
+        calls = []
+
+        def fake_nat(floating_ips):
+            calls.append(('nat', list(floating_ips)))
+
+        def fake_bind(floating_ips, device):
+            calls.append(('bind', device, floating_ips))
+
+        self.stubs.Set(self.network.driver, 'ensure_floating_forwards',
+                       fake_nat)
+        self.stubs.Set(self.network.driver, 'bind_floating_ips', fake_bind)
+
+        floating_ips = [('1.2.3.4', '10.0.0.1', 'eth0', 'fakenet'),
+                        ('1.2.3.5', '10.0.0.2', 'eth1', 'fakenet'),
+                        ('1.2.3.6', '10.0.0.3', 'eth0', 'fakenet')]
+        self.network.l3driver.add_floating_ips(floating_ips)
+        self.assertEqual([('nat', floating_ips),
+                          ('bind', 'eth0', ['1.2.3.4', '1.2.3.6']),
+                          ('bind', 'eth1', ['1.2.3.5'])], calls)
+
     @mock.patch('nova.db.floating_ip_get_all_by_host')
     @mock.patch('nova.db.fixed_ip_get')
     def _test_floating_ip_init_host(self, fixed_get, floating_get,
@@ -1408,12 +1429,11 @@ class VlanNetworkTestCase(test.TestCase):
             raise exception.FixedIpNotFound(id=fixed_ip_id)
         fixed_get.side_effect = fixed_ip_get
 
-        self.mox.StubOutWithMock(self.network.l3driver, 'add_floating_ip')
+        self.mox.StubOutWithMock(self.network.l3driver, 'add_floating_ips')
         self.flags(public_interface=public_interface)
-        self.network.l3driver.add_floating_ip(netaddr.IPAddress('1.2.3.5'),
-                                              netaddr.IPAddress('1.2.3.4'),
-                                              expected_arg,
-                                              mox.IsA(objects.Network))
+        self.network.l3driver.add_floating_ips(
+            [(netaddr.IPAddress('1.2.3.5'), netaddr.IPAddress('1.2.3.4'),
+              expected_arg, mox.IsA(objects.Network))])
         self.mox.ReplayAll()
         self.network.init_host_floating_ips()
         self.mox.UnsetStubs()
@@ -2799,9 +2819,8 @@ class FloatingIPTestCase(test.TestCase):
         floating_update.return_value = fake_floating_ip_get_by_address(
             None, '1.2.3.4')
 
-        def fake_remove_floating_ip(floating_addr, fixed_addr, interface,
-                                    network):
-            called['count'] += 1
+        def fake_remove_floating_ips(floating_ips):
+            called['count'] += len(floating_ips)
 
         def fake_clean_conntrack(fixed_ip):
             if not str(fixed_ip) == "10.0.0.2":
@@ -2809,8 +2828,8 @@ class FloatingIPTestCase(test.TestCase):
 
         self.stubs.Set(self.network, '_is_stale_floating_ip_address',
                                  fake_is_stale_floating_ip_address)
-        self.stubs.Set(self.network.l3driver, 'remove_floating_ip',
-                       fake_remove_floating_ip)
+        self.stubs.Set(self.network.l3driver, 'remove_floating_ips',
+                       fake_remove_floating_ips)
         self.stubs.Set(self.network.driver, 'clean_conntrack',
                        fake_clean_conntrack)
         self.mox.ReplayAll()
@@ -2845,16 +2864,15 @@ class FloatingIPTestCase(test.TestCase):
         floating_update.return_value = fake_floating_ip_get_by_address(
             None, '1.2.3.4')
 
-        def fake_add_floating_ip(floating_addr, fixed_addr, interface,
-                                 network):
-            called['count'] += 1
+        def fake_add_floating_ips(floating_ips):
+            called['count'] += len(floating_ips)
 
         self.stubs.Set(self.network.db, 'floating_ip_get_by_address',
                        fake_floating_ip_get_by_address)
         self.stubs.Set(self.network, '_is_stale_floating_ip_address',
                                  fake_is_stale_floating_ip_address)
-        self.stubs.Set(self.network.l3driver, 'add_floating_ip',
-                       fake_add_floating_ip)
+        self.stubs.Set(self.network.l3driver, 'add_floating_ips',
+                       fake_add_floating_ips)
         self.mox.ReplayAll()
         addresses = ['172.24.4.23', '172.24.4.24', '172.24.4.25']
         self.network.migrate_instance_finish(self.context,
@@ -23,6 +23,7 @@ import mox
 from neutronclient.common import exceptions
 from neutronclient.v2_0 import client
 from oslo.config import cfg
+import requests
 import six
 
 from nova.compute import flavors
@@ -111,6 +112,9 @@ class TestNeutronClient(test.TestCase):
             timeout=CONF.neutron.url_timeout,
             insecure=False,
             ca_cert=None).AndReturn(None)
+        self.mox.StubOutWithMock(neutronv2, '_use_session')
+        neutronv2._use_session(mox.IsA(client.Client),
+                               mox.IsA(requests.Session))
         self.mox.ReplayAll()
         neutronv2.get_client(my_context)
 
@@ -135,6 +139,9 @@ class TestNeutronClient(test.TestCase):
             timeout=CONF.neutron.url_timeout,
             insecure=False,
             ca_cert=None).AndReturn(None)
+        self.mox.StubOutWithMock(neutronv2, '_use_session')
+        neutronv2._use_session(mox.IsA(client.Client),
+                               mox.IsA(requests.Session))
         self.mox.ReplayAll()
         # Note that although we have admin set in the context we
         # are not asking for an admin client, and so we auth with
@@ -191,6 +198,100 @@ class TestNeutronClient(test.TestCase):
             self.assertEqual('new_token1', token_store.admin_auth_token)
 
 
+class TestNeutronClientPool(test.NoDBTestCase):
+    def setUp(self):
+        super(TestNeutronClientPool, self).setUp()
+        self.flags(url='http://anyhost/', group='neutron')
+        self.context = context.RequestContext('userid', 'my_tenantid',
+                                              auth_token='token')
+        self.pool = neutronv2.ClientPool.get()
+
+    @mock.patch.object(neutronv2, '_get_client')
+    def test_client_reused(self, mock_get_client):
+        client1 = neutronv2.get_client(self.context)
+        client2 = neutronv2.get_client(self.context)
+        self.assertIs(client1, client2)
+        mock_get_client.assert_called_once_with('token', admin=False)
+        self.assertEqual({'size': 1, 'hits': 1, 'misses': 1},
+                         self.pool.stats())
+
+    @mock.patch.object(neutronv2, '_get_client')
+    def test_client_per_token(self, mock_get_client):
+        other_context = context.RequestContext('userid', 'my_tenantid',
+                                               auth_token='other_token')
+        neutronv2.get_client(self.context)
+        neutronv2.get_client(other_context)
+        self.assertEqual(2, mock_get_client.call_count)
+        self.assertEqual({'size': 2, 'hits': 0, 'misses': 2},
+                         self.pool.stats())
+
+    @mock.patch.object(neutronv2, '_get_client')
+    def test_admin_client_reused_across_tokens(self, mock_get_client):
+        token_store = neutronv2.AdminTokenStore.get()
+        token_store.admin_auth_token = 'admin_token'
+        neutronv2.get_client(self.context, admin=True)
+        token_store.admin_auth_token = 'new_admin_token'
+        neutronv2.get_client(self.context, admin=True)
+        mock_get_client.assert_called_once_with('admin_token', admin=True)
+
+    @mock.patch.object(neutronv2, '_get_client')
+    @mock.patch('time.time')
+    def test_client_expired(self, mock_time, mock_get_client):
+        self.flags(client_pool_ttl=10, group='neutron')
+        mock_time.return_value = 100
+        neutronv2.get_client(self.context)
+        mock_time.return_value = 111
+        neutronv2.get_client(self.context)
+        self.assertEqual(2, mock_get_client.call_count)
+        self.assertEqual({'size': 1, 'hits': 0, 'misses': 2},
+                         self.pool.stats())
+
+    @mock.patch.object(neutronv2, '_get_client')
+    def test_least_recently_used_evicted(self, mock_get_client):
+        self.flags(client_pool_size=2, group='neutron')
+        for token in ('token1', 'token2', 'token1', 'token3'):
+            ctxt = context.RequestContext('userid', 'my_tenantid',
+                                          auth_token=token)
+            neutronv2.get_client(ctxt)
+        self.assertEqual([('http://anyhost/', 'token1', False),
+                          ('http://anyhost/', 'token3', False)],
+                         self.pool.clients.keys())
+
+    @mock.patch.object(requests.adapters.HTTPAdapter, 'send',
+                       autospec=True)
+    def test_connections_reused(self, mock_send):
+        self.flags(connection_pool_size=5, group='neutron')
+
+        def fake_send(adapter, request, **kwargs):
+            response = requests.Response()
+            response.status_code = 200
+            response.headers['content-type'] = 'application/json'
+            response._content = '{"networks": []}'
+            response.request = request
+            return response
+
+        mock_send.side_effect = fake_send
+        other_context = context.RequestContext('userid', 'my_tenantid',
+                                               auth_token='other_token')
+        neutronv2.get_client(self.context).list_networks()
+        neutronv2.get_client(other_context).list_networks()
+        self.assertEqual(2, mock_send.call_count)
+        adapter1 = mock_send.call_args_list[0][0][0]
+        adapter2 = mock_send.call_args_list[1][0][0]
+        self.assertIs(adapter1, adapter2)
+        self.assertEqual(5, adapter1._pool_maxsize)
+        self.assertEqual(['http://anyhost/'], self.pool.sessions.keys())
+
+    @mock.patch.object(neutronv2, '_get_client')
+    def test_pool_disabled(self, mock_get_client):
+        self.flags(client_pool_size=0, group='neutron')
+        neutronv2.get_client(self.context)
+        neutronv2.get_client(self.context)
+        self.assertEqual(2, mock_get_client.call_count)
+        self.assertEqual({'size': 0, 'hits': 0, 'misses': 0},
+                         self.pool.stats())
+
+
 class TestNeutronv2Base(test.TestCase):
 
     def setUp(self):
@@ -445,6 +546,7 @@ class TestNeutronv2Base(test.TestCase):
 
         ports_in_requested_net_order = []
         nets_in_requested_net_order = []
+        port_req_bodies = []
         for request in ordered_networks:
             port_req_body = {
                 'port': {
@@ -502,12 +604,20 @@ class TestNeutronv2Base(test.TestCase):
                 if kwargs.get('_break') == 'mac' + request.network_id:
                     self.mox.ReplayAll()
                     return api
-                self.moxed_client.create_port(
-                    MyComparator(port_req_body)).AndReturn(res_port)
+                port_req_bodies.append(port_req_body)
                 ports_in_requested_net_order.append(res_port['port']['id'])
 
             nets_in_requested_net_order.append(network)
 
+        if len(port_req_bodies) == 1:
+            self.moxed_client.create_port(
+                MyComparator(port_req_bodies[0])).AndReturn(res_port)
+        elif port_req_bodies:
+            self.moxed_client.create_port(
+                MyComparator({'ports': [body['port']
+                                        for body in port_req_bodies]})
+                ).AndReturn({'ports': [res_port['port']
+                                       for body in port_req_bodies]})
         api.get_instance_nw_info(mox.IgnoreArg(),
                                  self.instance,
                                  networks=nets_in_requested_net_order,
@@ -559,23 +669,22 @@ class TestNeutronv2Base(test.TestCase):
         nets = number == 1 and self.nets1 or self.nets2
         self.moxed_client.list_networks(
             id=net_ids).AndReturn({'networks': nets})
-        for i in xrange(1, number + 1):
-            float_data = number == 1 and self.float_data1 or self.float_data2
-            for ip in port_data[i - 1]['fixed_ips']:
-                float_data = [x for x in float_data
-                              if x['fixed_ip_address'] == ip['ip_address']]
-                self.moxed_client.list_floatingips(
-                    fixed_ip_address=ip['ip_address'],
-                    port_id=port_data[i - 1]['id']).AndReturn(
-                        {'floatingips': float_data})
-            subnet_data = i == 1 and self.subnet_data1 or self.subnet_data2
-            self.moxed_client.list_subnets(
-                id=mox.SameElementsAs(['my_subid%s' % i])).AndReturn(
-                    {'subnets': subnet_data})
-            self.moxed_client.list_ports(
-                network_id=subnet_data[0]['network_id'],
-                device_owner='network:dhcp').AndReturn(
-                    {'ports': []})
+        float_data = number == 1 and self.float_data1 or self.float_data2
+        self.moxed_client.list_floatingips(
+            port_id=[port['id'] for port in port_data]).AndReturn(
+                {'floatingips': float_data})
+        subnet_data = self.subnet_data1
+        if number == 2:
+            subnet_data = subnet_data + self.subnet_data2
+        self.moxed_client.list_subnets(
+            id=mox.SameElementsAs(['my_subid%s' % i
+                                   for i in xrange(1, number + 1)])
+            ).AndReturn({'subnets': subnet_data})
+        self.moxed_client.list_ports(
+            network_id=mox.SameElementsAs(
+                [subnet['network_id'] for subnet in subnet_data]),
+            device_owner='network:dhcp').AndReturn(
+                {'ports': []})
         self.mox.ReplayAll()
         nw_inf = api.get_instance_nw_info(self.context, instance)
         for i in xrange(0, number):
@@ -730,23 +839,29 @@ class TestNeutronv2(TestNeutronv2Base):
         for current_neutron_port in current_neutron_ports:
             current_neutron_port_map[current_neutron_port['id']] = (
                 current_neutron_port)
+        requested_port_ids = []
+        subnet_ids = []
+        subnet_net_ids = []
         for port_id in port_ids:
             current_neutron_port = current_neutron_port_map.get(port_id)
             if current_neutron_port:
+                requested_port_ids.append(port_id)
                 for ip in current_neutron_port['fixed_ips']:
-                    self.moxed_client.list_floatingips(
-                        fixed_ip_address=ip['ip_address'],
-                        port_id=current_neutron_port['id']).AndReturn(
-                            {'floatingips': [self.float_data2[index]]})
-                    self.moxed_client.list_subnets(
-                        id=mox.SameElementsAs([ip['subnet_id']])
-                        ).AndReturn(
-                            {'subnets': [self.subnet_data_n[index]]})
-                    self.moxed_client.list_ports(
-                        network_id=current_neutron_port['network_id'],
-                        device_owner='network:dhcp').AndReturn(
-                        {'ports': self.dhcp_port_data1})
+                    subnet_ids.append(ip['subnet_id'])
+                    subnet_net_ids.append(
+                        self.subnet_data_n[index]['network_id'])
                     index += 1
+        if requested_port_ids:
+            self.moxed_client.list_floatingips(
+                port_id=requested_port_ids).AndReturn(
+                    {'floatingips': self.float_data2[:index]})
+            self.moxed_client.list_subnets(
+                id=mox.SameElementsAs(subnet_ids)).AndReturn(
+                    {'subnets': self.subnet_data_n[:index]})
+            self.moxed_client.list_ports(
+                network_id=mox.SameElementsAs(subnet_net_ids),
+                device_owner='network:dhcp').AndReturn(
+                    {'ports': self.dhcp_port_data1})
         self.mox.ReplayAll()
 
         self.instance['info_cache'] = network_cache
@@ -817,6 +932,21 @@ class TestNeutronv2(TestNeutronv2Base):
             {constants.QOS_QUEUE: {'name': constants.QOS_QUEUE}},
             api.extensions)
 
+    def test_neutron_extensions_cache_shared(self):
+        # Note: Don't want the default get_client from setUp()
+        self.mox.ResetAll()
+        neutronv2.get_client(mox.IgnoreArg()).AndReturn(
+            self.moxed_client)
+        self.moxed_client.list_extensions().AndReturn(
+            {'extensions': [{'name': constants.QOS_QUEUE}]})
+        self.mox.ReplayAll()
+        neutronapi.API()._refresh_neutron_extensions_cache(self.context)
+        api = neutronapi.API()
+        api._refresh_neutron_extensions_cache(self.context)
+        self.assertEqual(
+            {constants.QOS_QUEUE: {'name': constants.QOS_QUEUE}},
+            api.extensions)
+
     def test_populate_neutron_extension_values_rxtx_factor(self):
         api = neutronapi.API()
 
@@ -979,13 +1109,7 @@ class TestNeutronv2(TestNeutronv2Base):
         nwinfo = api.allocate_for_instance(self.context, self.instance)
         self.assertEqual(len(nwinfo), 0)
 
-    def test_allocate_for_instance_ex1(self):
-        """verify we will delete created ports
-        if we fail to allocate all net resources.
-
-        Mox to raise exception when creating a second port.
-        In this case, the code should delete the first created port.
-        """
+    def _stub_allocate_for_instance_nets2(self):
         self.instance = fake_instance.fake_instance_obj(self.context,
                                                         **self.instance)
         api = neutronapi.API()
@@ -998,7 +1122,7 @@ class TestNeutronv2(TestNeutronv2Base):
                      for net in (self.nets2[0], self.nets2[1])])
         self.moxed_client.list_networks(
             id=['my_netid1', 'my_netid2']).AndReturn({'networks': self.nets2})
-        index = 0
+        port_req_bodies = []
         for network in self.nets2:
             binding_port_req_body = {
                 'port': {
@@ -1014,18 +1138,27 @@ class TestNeutronv2(TestNeutronv2Base):
                 },
             }
             port_req_body['port'].update(binding_port_req_body['port'])
-            port = {'id': 'portid_' + network['id']}
-
+            port_req_bodies.append(port_req_body)
             api._populate_neutron_extension_values(self.context,
                 self.instance, binding_port_req_body).AndReturn(None)
-            if index == 0:
-                self.moxed_client.create_port(
-                    MyComparator(port_req_body)).AndReturn({'port': port})
-            else:
-                NeutronOverQuota = exceptions.OverQuotaClient()
-                self.moxed_client.create_port(
-                    MyComparator(port_req_body)).AndRaise(NeutronOverQuota)
-            index += 1
+        return api, requested_networks, port_req_bodies
+
+    def test_allocate_for_instance_ex1(self):
+        """verify we will delete created ports
+        if we fail to allocate all net resources.
+
+        Mox to raise exception when creating a second port.
+        In this case, the code should delete the first created port.
+        """
+        self.flags(bulk_port_create=False, group='neutron')
+        api, requested_networks, port_req_bodies = (
+            self._stub_allocate_for_instance_nets2())
+        self.moxed_client.create_port(
+            MyComparator(port_req_bodies[0])).AndReturn(
+                {'port': {'id': 'portid_' + self.nets2[0]['id']}})
+        NeutronOverQuota = exceptions.OverQuotaClient()
+        self.moxed_client.create_port(
+            MyComparator(port_req_bodies[1])).AndRaise(NeutronOverQuota)
         self.moxed_client.delete_port('portid_' + self.nets2[0]['id'])
         self.mox.ReplayAll()
         self.assertRaises(exception.PortLimitExceeded,
@@ -1040,42 +1173,97 @@ class TestNeutronv2(TestNeutronv2Base):
         Mox to raise exception when creating the first port.
         In this case, the code should not delete any ports.
         """
-        self.instance = fake_instance.fake_instance_obj(self.context,
-                                                        **self.instance)
-        api = neutronapi.API()
-        self.mox.StubOutWithMock(api, '_populate_neutron_extension_values')
-        self.mox.StubOutWithMock(api, '_has_port_binding_extension')
-        api._has_port_binding_extension(mox.IgnoreArg()).MultipleTimes().\
-                                                         AndReturn(False)
-        requested_networks = objects.NetworkRequestList(
-            objects=[objects.NetworkRequest(network_id=net['id'])
-                     for net in (self.nets2[0], self.nets2[1])])
-        self.moxed_client.list_networks(
-            id=['my_netid1', 'my_netid2']).AndReturn({'networks': self.nets2})
-        binding_port_req_body = {
-            'port': {
-                'device_id': self.instance.uuid,
-                'device_owner': 'compute:nova',
-            },
-        }
-        port_req_body = {
-            'port': {
-                'network_id': self.nets2[0]['id'],
-                'admin_state_up': True,
-                'device_id': self.instance.uuid,
-                'tenant_id': self.instance.project_id,
-            },
-        }
-        api._populate_neutron_extension_values(self.context,
-            self.instance, binding_port_req_body).AndReturn(None)
+        self.flags(bulk_port_create=False, port_create_concurrency=1,
+                   group='neutron')
+        api, requested_networks, port_req_bodies = (
+            self._stub_allocate_for_instance_nets2())
         self.moxed_client.create_port(
-            MyComparator(port_req_body)).AndRaise(
+            MyComparator(port_req_bodies[0])).AndRaise(
                 Exception("fail to create port"))
         self.mox.ReplayAll()
         self.assertRaises(NEUTRON_CLIENT_EXCEPTION, api.allocate_for_instance,
                           self.context, self.instance,
                           requested_networks=requested_networks)
 
+    def test_allocate_for_instance_bulk_fails(self):
+        """verify a failed bulk request deletes no ports.
+
+        Neutron creates either all or none of the ports of a bulk request.
+        """
+        api, requested_networks, port_req_bodies = (
+            self._stub_allocate_for_instance_nets2())
+        NeutronOverQuota = exceptions.OverQuotaClient()
+        self.moxed_client.create_port(
+            MyComparator({'ports': [body['port']
+                                    for body in port_req_bodies]})
+            ).AndRaise(NeutronOverQuota)
+        self.mox.ReplayAll()
+        self.assertRaises(exception.PortLimitExceeded,
+                          api.allocate_for_instance,
+                          self.context, self.instance,
+                          requested_networks=requested_networks)
+
+    def test_allocate_for_instance_bulk_refused(self):
+        """verify ports are created one by one when neutron refuses
+        bulk requests, and that bulk requests are not tried again.
+        """
+        api, requested_networks, port_req_bodies = (
+            self._stub_allocate_for_instance_nets2())
+        self.mox.StubOutWithMock(api, 'get_instance_nw_info')
+        self.moxed_client.create_port(
+            MyComparator({'ports': [body['port']
+                                    for body in port_req_bodies]})
+            ).AndRaise(exceptions.BadRequest())
+        for network, port_req_body in zip(self.nets2, port_req_bodies):
+            self.moxed_client.create_port(
+                MyComparator(port_req_body)).AndReturn(
+                    {'port': {'id': 'portid_' + network['id']}})
+        api.get_instance_nw_info(
+            self.context, self.instance, networks=self.nets2,
+            port_ids=['portid_my_netid1', 'portid_my_netid2']).AndReturn(
+                model.NetworkInfo([]))
+        self.mox.ReplayAll()
+        api.allocate_for_instance(self.context, self.instance,
+                                  requested_networks=requested_networks)
+        self.assertTrue(api._bulk_port_create_unsupported)
+
+    def test_allocate_for_instance_bulk_refused_bad_request(self):
+        """verify bulk requests are still used when the ports neutron
+        refused in bulk can't be created one by one either.
+        """
+        self.flags(port_create_concurrency=1, group='neutron')
+        api, requested_networks, port_req_bodies = (
+            self._stub_allocate_for_instance_nets2())
+        self.moxed_client.create_port(
+            MyComparator({'ports': [body['port']
+                                    for body in port_req_bodies]})
+            ).AndRaise(exceptions.BadRequest())
+        self.moxed_client.create_port(
+            MyComparator(port_req_bodies[0])).AndRaise(
+                exceptions.BadRequest())
+        self.mox.ReplayAll()
+        self.assertRaises(exceptions.BadRequest, api.allocate_for_instance,
+                          self.context, self.instance,
+                          requested_networks=requested_networks)
+        self.assertFalse(api._bulk_port_create_unsupported)
+
+    def test_allocate_for_instance_concurrent_keeps_order(self):
+        self.flags(bulk_port_create=False, group='neutron')
+        api, requested_networks, port_req_bodies = (
+            self._stub_allocate_for_instance_nets2())
+        self.mox.StubOutWithMock(api, 'get_instance_nw_info')
+        for network, port_req_body in zip(self.nets2, port_req_bodies):
+            self.moxed_client.create_port(
+                MyComparator(port_req_body)).AndReturn(
+                    {'port': {'id': 'portid_' + network['id']}})
+        api.get_instance_nw_info(
+            self.context, self.instance, networks=self.nets2,
+            port_ids=['portid_my_netid1', 'portid_my_netid2']).AndReturn(
+                model.NetworkInfo([]))
+        self.mox.ReplayAll()
+        api.allocate_for_instance(self.context, self.instance,
+                                  requested_networks=requested_networks)
+
     def test_allocate_for_instance_no_port_or_network(self):
         class BailOutEarly(Exception):
             pass
@@ -1226,13 +1414,10 @@ class TestNeutronv2(TestNeutronv2Base):
         self.moxed_client.list_networks(id=net_ids).AndReturn(
             {'networks': nets})
         float_data = number == 1 and self.float_data1 or self.float_data2
-        for data in port_data[1:]:
-            for ip in data['fixed_ips']:
-                self.moxed_client.list_floatingips(
-                    fixed_ip_address=ip['ip_address'],
-                    port_id=data['id']).AndReturn(
-                        {'floatingips': float_data[1:]})
-        for port in port_data[1:]:
+        if port_data[1:]:
+            self.moxed_client.list_floatingips(
+                port_id=[data['id'] for data in port_data[1:]]).AndReturn(
+                    {'floatingips': float_data[1:]})
             self.moxed_client.list_subnets(id=['my_subid2']).AndReturn({})
 
         self.mox.ReplayAll()
@@ -2206,12 +2391,28 @@ class TestNeutronv2(TestNeutronv2Base):
         NeutronNotFound = exceptions.NeutronClientException(
             status_code=404)
         self.moxed_client.list_floatingips(
-            fixed_ip_address='1.1.1.1', port_id=1).AndRaise(NeutronNotFound)
+            port_id=[1]).AndRaise(NeutronNotFound)
+        self.mox.ReplayAll()
+        neutronv2.get_client('fake')
+        floatingips = api._get_floating_ips_by_ports(self.moxed_client, [1])
+        self.assertEqual(floatingips, {})
+
+    def test_get_floating_ips_by_ports(self):
+        api = neutronapi.API()
+        cache = neutronapi.NetworkInfoCache()
+        self.moxed_client.list_floatingips(
+            port_id=['my_portid1', 'my_portid2']).AndReturn(
+                {'floatingips': self.float_data2})
         self.mox.ReplayAll()
         neutronv2.get_client('fake')
-        floatingips = api._get_floating_ips_by_fixed_and_port(
-            self.moxed_client, '1.1.1.1', 1)
-        self.assertEqual(floatingips, [])
+        floatingips = api._get_floating_ips_by_ports(
+            self.moxed_client, ['my_portid1', 'my_portid2'], cache=cache)
+        self.assertEqual({('my_portid1', self.port_address):
+                              [self.float_data2[0]],
+                          ('my_portid2', self.port_address2):
+                              [self.float_data2[1]]},
+                         floatingips)
+        self.assertEqual(1, cache.neutron_calls)
 
     def test_nw_info_get_ips(self):
         fake_port = {
@@ -2219,14 +2420,12 @@ class TestNeutronv2(TestNeutronv2Base):
                 {'ip_address': '1.1.1.1'}],
             'id': 'port-id',
             }
+        floating_ips = {('port-id', '1.1.1.1'):
+                            [{'floating_ip_address': '10.0.0.1'}]}
         api = neutronapi.API()
-        self.mox.StubOutWithMock(api, '_get_floating_ips_by_fixed_and_port')
-        api._get_floating_ips_by_fixed_and_port(
-            self.moxed_client, '1.1.1.1', 'port-id').AndReturn(
-                [{'floating_ip_address': '10.0.0.1'}])
         self.mox.ReplayAll()
         neutronv2.get_client('fake')
-        result = api._nw_info_get_ips(self.moxed_client, fake_port)
+        result = api._nw_info_get_ips(fake_port, floating_ips)
         self.assertEqual(len(result), 1)
         self.assertEqual(result[0]['address'], '1.1.1.1')
         self.assertEqual(result[0]['floating_ips'][0]['address'], '10.0.0.1')
@@ -2242,8 +2441,8 @@ class TestNeutronv2(TestNeutronv2Base):
         fake_ips = [model.IP(x['ip_address']) for x in fake_port['fixed_ips']]
         api = neutronapi.API()
         self.mox.StubOutWithMock(api, '_get_subnets_from_port')
-        api._get_subnets_from_port(self.context, fake_port).AndReturn(
-            [fake_subnet])
+        api._get_subnets_from_port(self.context, fake_port,
+                                   cache=None).AndReturn([fake_subnet])
         self.mox.ReplayAll()
         neutronv2.get_client('fake')
         subnets = api._nw_info_get_subnets(self.context, fake_port, fake_ips)
@@ -2370,15 +2569,21 @@ class TestNeutronv2(TestNeutronv2Base):
             tenant_id='fake', device_id='uuid').AndReturn(
                 {'ports': fake_ports})
 
-        self.mox.StubOutWithMock(api, '_get_floating_ips_by_fixed_and_port')
+        self.mox.StubOutWithMock(api, '_get_floating_ips_by_ports')
+        self.mox.StubOutWithMock(api, '_prefetch_subnets')
         self.mox.StubOutWithMock(api, '_get_subnets_from_port')
         requested_ports = [fake_ports[2], fake_ports[0], fake_ports[1]]
+        api._get_floating_ips_by_ports(
+            self.moxed_client, [port['id'] for port in requested_ports],
+            cache=mox.IsA(neutronapi.NetworkInfoCache)).AndReturn(
+                dict(((port['id'], '1.1.1.1'),
+                      [{'floating_ip_address': '10.0.0.1'}])
+                     for port in requested_ports))
+        api._prefetch_subnets(self.context, requested_ports,
+                              mox.IsA(neutronapi.NetworkInfoCache))
         for requested_port in requested_ports:
-            api._get_floating_ips_by_fixed_and_port(
-                self.moxed_client, '1.1.1.1', requested_port['id']).AndReturn(
-                    [{'floating_ip_address': '10.0.0.1'}])
-        for requested_port in requested_ports:
-            api._get_subnets_from_port(self.context, requested_port
+            api._get_subnets_from_port(self.context, requested_port,
+                cache=mox.IsA(neutronapi.NetworkInfoCache)
                 ).AndReturn(fake_subnets)
 
         self.mox.ReplayAll()
@@ -2407,6 +2612,45 @@ class TestNeutronv2(TestNeutronv2Base):
         self.assertEqual(nw_infos[1]['id'], 'port1')
         self.assertEqual(nw_infos[2]['id'], 'port2')
 
+    def test_build_network_info_model_shared_cache(self):
+        api = neutronapi.API()
+        cache = neutronapi.NetworkInfoCache()
+        nets = [{'id': 'my_netid1', 'name': 'my_netname1',
+                 'tenant_id': 'my_tenantid'}]
+        instances = [{'project_id': 'fake', 'uuid': uuid,
+                      'info_cache': {'network_info': []}}
+                     for uuid in ('uuid1', 'uuid2')]
+        neutronv2.get_client(mox.IgnoreArg(), admin=True).MultipleTimes(
+            ).AndReturn(self.moxed_client)
+        for instance in instances:
+            self.moxed_client.list_ports(
+                tenant_id=instance['project_id'],
+                device_id=instance['uuid']).AndReturn(
+                    {'ports': self.port_data1})
+            self.moxed_client.list_floatingips(
+                port_id=['my_portid1']).AndReturn(
+                    {'floatingips': self.float_data1})
+            if instance is instances[0]:
+                # Only the first build fetches the subnets and DHCP ports.
+                self.moxed_client.list_subnets(
+                    id=['my_subid1']).AndReturn(
+                        {'subnets': self.subnet_data1})
+                self.moxed_client.list_ports(
+                    network_id=['my_netid1'],
+                    device_owner='network:dhcp').AndReturn(
+                        {'ports': self.dhcp_port_data1})
+        self.mox.ReplayAll()
+
+        for instance in instances:
+            nw_info = api._build_network_info_model(
+                self.context, instance, nets, ['my_portid1'], cache=cache)
+            self.assertEqual(1, len(nw_info))
+            subnet = nw_info[0]['network']['subnets'][0]
+            self.assertEqual('10.0.1.0/24', subnet['cidr'])
+            self.assertEqual('10.0.1.9', subnet.get_meta('dhcp_server'))
+            self.assertEqual(self.port_address, subnet['ips'][0]['address'])
+        self.assertEqual(6, cache.neutron_calls)
+
     def test_get_subnets_from_port(self):
         api = neutronapi.API()
 
@@ -2420,7 +2664,7 @@ class TestNeutronv2(TestNeutronv2Base):
             id=[port_data['fixed_ips'][0]['subnet_id']]
         ).AndReturn({'subnets': subnet_data1})
         self.moxed_client.list_ports(
-            network_id=subnet_data1[0]['network_id'],
+            network_id=[subnet_data1[0]['network_id']],
             device_owner='network:dhcp').AndReturn({'ports': []})
         self.mox.ReplayAll()
 
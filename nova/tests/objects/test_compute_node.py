@@ -184,6 +184,18 @@ class _TestComputeNodeObject(object):
                          comparators={'stats': self.json_comparator,
                                       'host_ip': self.str_comparator})
 
+    def test_get_by_stats(self):
+        self.mox.StubOutWithMock(db, 'compute_node_search_by_stats')
+        db.compute_node_search_by_stats(self.context, 'cached').AndReturn(
+            [fake_compute_node])
+        self.mox.ReplayAll()
+        computes = compute_node.ComputeNodeList.get_by_stats(self.context,
+                                                             'cached')
+        self.assertEqual(1, len(computes))
+        self.compare_obj(computes[0], fake_compute_node,
+                         comparators={'stats': self.json_comparator,
+                                      'host_ip': self.str_comparator})
+
     @mock.patch('nova.db.service_get')
     def test_get_by_service(self, service_get):
         service_get.return_value = {'compute_node': [fake_compute_node]}
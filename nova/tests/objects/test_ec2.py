@@ -60,6 +60,15 @@ class _TestEC2InstanceMapping(object):
             imap = ec2_obj.EC2InstanceMapping.get_by_id(self.context, 1)
             self._compare(self, fake_map, imap)
 
+    def test_get_list_by_uuids(self):
+        with mock.patch.object(db, 'ec2_instance_get_all_by_uuids') as get:
+            get.return_value = [fake_map]
+            imaps = ec2_obj.EC2InstanceMappingList.get_by_uuids(
+                self.context, ['fake-uuid-2'])
+            get.assert_called_once_with(self.context, ['fake-uuid-2'])
+            self.assertEqual(1, len(imaps))
+            self._compare(self, fake_map, imaps[0])
+
 
 class TestEC2InstanceMapping(test_objects._LocalTest, _TestEC2InstanceMapping):
     pass
@@ -936,12 +936,13 @@ object_data = {
     'BandwidthUsage': '1.1-bdab751673947f0ac7de108540a1a8ce',
     'BandwidthUsageList': '1.1-76898106a9db393cd5f42c557389c507',
     'BlockDeviceMapping': '1.2-9968ffe513e7672484b0f528b034cd0f',
-    'BlockDeviceMappingList': '1.3-de607d5ae2f379c75c49a125bb3b4515',
+    'BlockDeviceMappingList': '1.4-1bd383bbe4e797d5fc9b338a78d87db9',
     'ComputeNode': '1.5-57ce5a07c727ffab6c51723bb8dccbfe',
-    'ComputeNodeList': '1.5-a1641ab314063538470d57daaa5c7831',
+    'ComputeNodeList': '1.6-017a5f195cdb4092a71c1594665639ef',
     'DNSDomain': '1.0-5bdc288d7c3b723ce86ede998fd5c9ba',
     'DNSDomainList': '1.0-cfb3e7e82be661501c31099523154db4',
     'EC2InstanceMapping': '1.0-627baaf4b12c9067200979bdc4558a99',
+    'EC2InstanceMappingList': '1.0-c15c4f9fbf5c8128b3ee140b65366c37',
     'EC2SnapshotMapping': '1.0-26cf315be1f8abab4289d4147671c836',
     'EC2VolumeMapping': '1.0-2f8c3bf077c65a425294ec2b361c9143',
     'FixedIP': '1.2-082fb26772ce2db783ce4934edca4652',
@@ -12,10 +12,13 @@
 # License for the specific language governing permissions and limitations
 # under the License.
 
+import collections
 import os
+import time
 
 import fixtures
 from oslo.config import cfg
+from testtools import content
 
 from nova.openstack.common import jsonutils
 from nova.openstack.common import policy as common_policy
@@ -71,3 +74,39 @@ class RoleBasedPolicyFixture(fixtures.Fixture):
         nova.policy.reset()
         nova.policy.init()
         self.addCleanup(nova.policy.reset)
+
+
+class EnforceStatsFixture(fixtures.Fixture):
+    """Records the policy checks made for each request, and their cost.
+
+    The checks are reported in the 'policy-enforce' detail of the test, one
+    line per request id.
+    """
+
+    def setUp(self):
+        super(EnforceStatsFixture, self).setUp()
+        self.calls = collections.OrderedDict()
+        real_enforce = nova.policy.enforce
+
+        def enforce(context, action, *args, **kwargs):
+            start = time.time()
+            try:
+                return real_enforce(context, action, *args, **kwargs)
+            finally:
+                request_id = getattr(context, 'request_id', None)
+                self.calls.setdefault(request_id, []).append(
+                    (action, time.time() - start))
+
+        self.useFixture(fixtures.MonkeyPatch('nova.policy.enforce', enforce))
+        self.addDetail('policy-enforce', content.Content(
+            content.UTF8_TEXT, lambda: [self.report().encode('utf-8')]))
+
+    def report(self):
+        lines = []
+        for request_id, calls in self.calls.items():
+            total = sum(seconds for _action, seconds in calls)
+            lines.append('%s: %d calls, %.2fms (%s)' % (
+                request_id, len(calls), total * 1000,
+                ', '.join('%s %.2fms' % (action, seconds * 1000)
+                          for action, seconds in calls)))
+        return '\n'.join(lines)
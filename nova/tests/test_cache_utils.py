@@ -0,0 +1,98 @@
+# Copyright 2014 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+from nova import cache_utils
+from nova.openstack.common import timeutils
+from nova import test
+
+
+class CacheClientTestCase(test.NoDBTestCase):
+    def setUp(self):
+        super(CacheClientTestCase, self).setUp()
+        timeutils.set_time_override()
+        self.addCleanup(timeutils.clear_time_override)
+        self.client = cache_utils.get_client()
+
+    def _stats(self):
+        return self.client.get_stats()[0][1]
+
+    def test_set_and_get(self):
+        self.assertTrue(self.client.set('key', 'value'))
+        self.assertEqual('value', self.client.get('key'))
+        self.assertIsNone(self.client.get('other'))
+        self.assertEqual(1, self._stats()['get_hits'])
+        self.assertEqual(1, self._stats()['get_misses'])
+
+    def test_expire(self):
+        self.client.set('key', 'value', time=10)
+        self.client.set('forever', 'value')
+        timeutils.advance_time_seconds(9)
+        self.assertEqual('value', self.client.get('key'))
+        timeutils.advance_time_seconds(1)
+        self.assertIsNone(self.client.get('key'))
+        self.assertEqual('value', self.client.get('forever'))
+        self.assertEqual(1, self._stats()['expired'])
+        self.assertEqual(1, self._stats()['curr_items'])
+
+    def test_set_again_resets_timeout(self):
+        self.client.set('key', 'value', time=10)
+        timeutils.advance_time_seconds(5)
+        self.client.set('key', 'value', time=10)
+        timeutils.advance_time_seconds(5)
+        self.assertEqual('value', self.client.get('key'))
+        self.client.set('key', 'value')
+        timeutils.advance_time_seconds(20)
+        self.assertEqual('value', self.client.get('key'))
+
+    def test_add(self):
+        self.assertTrue(self.client.add('key', 'value'))
+        self.assertFalse(self.client.add('key', 'other'))
+        self.assertEqual('value', self.client.get('key'))
+        self.assertEqual(1, self._stats()['get_hits'])
+        self.assertEqual(0, self._stats()['get_misses'])
+
+    def test_incr(self):
+        self.assertIsNone(self.client.incr('key'))
+        self.client.set('key', '1', time=10)
+        self.assertEqual(3, self.client.incr('key', delta=2))
+        self.assertEqual('3', self.client.get('key'))
+        self.assertEqual(1, self._stats()['get_hits'])
+        self.assertEqual(0, self._stats()['get_misses'])
+        timeutils.advance_time_seconds(10)
+        self.assertIsNone(self.client.get('key'))
+
+    def test_delete(self):
+        self.client.set('key', 'value', time=10)
+        self.client.delete('key')
+        self.assertIsNone(self.client.get('key'))
+        self.client.delete('key')
+
+    def test_evict_least_recently_used(self):
+        self.flags(memory_cache_max_entries=2)
+        client = cache_utils.get_client()
+        client.set('key1', 'value1')
+        client.set('key2', 'value2')
+        client.get('key1')
+        client.set('key3', 'value3')
+        self.assertEqual('value1', client.get('key1'))
+        self.assertIsNone(client.get('key2'))
+        self.assertEqual('value3', client.get('key3'))
+        self.assertEqual(1, client.get_stats()[0][1]['evictions'])
+
+    def test_stale_timeouts_are_compacted(self):
+        for i in range(1000):
+            self.client.set('key', i, time=10)
+        self.assertTrue(len(self.client._expiry) < 100)
+        self.assertEqual(999, self.client.get('key'))
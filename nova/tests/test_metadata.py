@@ -26,6 +26,8 @@ try:
 except ImportError:
     import pickle
 
+import eventlet
+import eventlet.event
 import mock
 from oslo.config import cfg
 import webob
@@ -43,6 +45,7 @@ from nova import exception
 from nova.network import api as network_api
 from nova import objects
 from nova.openstack.common import jsonutils
+from nova.openstack.common import timeutils
 from nova import test
 from nova.tests import fake_block_device
 from nova.tests import fake_instance
@@ -494,6 +497,58 @@ class OpenStackMetadataTestCase(test.TestCase):
         mdjson = mdinst.lookup("/openstack/2012-08-10/meta_data.json")
         self.assertNotIn("random_seed", jsonutils.loads(mdjson))
 
+    def test_render(self):
+        inst = self.instance.obj_clone()
+        mdinst = fake_InstanceMetadata(self.stubs, inst)
+
+        with mock.patch.object(mdinst, 'lookup',
+                               wraps=mdinst.lookup) as mock_lookup:
+            body, mimetype, etag = mdinst.render("/2009-04-04/user-data")
+            self.assertEqual((body, mimetype, etag),
+                             mdinst.render("2009-04-04/meta-data/../"
+                                           "user-data"))
+        mock_lookup.assert_called_once_with("/2009-04-04/user-data")
+        self.assertEqual(base64.b64decode(inst['user_data']), body)
+        self.assertEqual(base.MIME_TYPE_TEXT_PLAIN, mimetype)
+        self.assertEqual('"%s"' % hashlib.md5(body).hexdigest(), etag)
+
+        self.assertEqual(password.handle_password,
+                         mdinst.render("/openstack/latest/password"))
+        self.assertRaises(base.InvalidMetadataPath,
+                          mdinst.render, "/openstack/latest/invalid")
+
+    def test_render_random_seed(self):
+        inst = self.instance.obj_clone()
+        mdinst = fake_InstanceMetadata(self.stubs, inst)
+
+        body1, mimetype, etag1 = mdinst.render(
+            "/openstack/2013-04-04/meta_data.json")
+        body2, mimetype, etag2 = mdinst.render(
+            "/openstack/2013-04-04/meta_data.json")
+        self.assertEqual(base.MIME_TYPE_APPLICATION_JSON, mimetype)
+        self.assertTrue(etag1.startswith('W/'))
+        self.assertEqual(etag1, etag2)
+        md1 = jsonutils.loads(body1)
+        md2 = jsonutils.loads(body2)
+        self.assertNotEqual(md1.pop('random_seed'), md2.pop('random_seed'))
+        self.assertEqual(md1, md2)
+
+        body, mimetype, etag = mdinst.render(
+            "/openstack/2012-08-10/meta_data.json")
+        self.assertNotIn("random_seed", jsonutils.loads(body))
+        self.assertFalse(etag.startswith('W/'))
+
+    def test_fingerprint(self):
+        inst = self.instance.obj_clone()
+        mdinst = fake_InstanceMetadata(self.stubs, inst)
+        self.assertEqual(mdinst.fingerprint,
+                         fake_InstanceMetadata(self.stubs, inst).fingerprint)
+
+        inst.metadata = {'changed': 'value'}
+        self.assertNotEqual(
+            mdinst.fingerprint,
+            fake_InstanceMetadata(self.stubs, inst).fingerprint)
+
     def test_no_dashes_in_metadata(self):
         # top level entries in meta_data should not contain '-' in their name
         inst = self.instance.obj_clone()
@@ -567,7 +622,7 @@ class MetadataHandlerTestCase(test.TestCase):
             return "foo"
 
         class CallableMD(object):
-            def lookup(self, path_info):
+            def render(self, path_info):
                 return verify
 
         response = fake_request(self.stubs, CallableMD(), "/bar")
@@ -613,6 +668,205 @@ class MetadataHandlerTestCase(test.TestCase):
         response_ctype = response.headers['Content-Type']
         self.assertTrue(response_ctype.startswith("application/json"))
 
+    def test_etag(self):
+        response = fake_request(self.stubs, self.mdinst,
+                                "/2009-04-04/user-data")
+        self.assertEqual(200, response.status_int)
+        etag = response.headers['ETag']
+
+        response = fake_request(self.stubs, self.mdinst,
+                                "/2009-04-04/user-data",
+                                headers={'If-None-Match': etag})
+        self.assertEqual(304, response.status_int)
+        self.assertEqual('', response.body)
+        self.assertEqual(etag, response.headers['ETag'])
+
+        response = fake_request(self.stubs, self.mdinst,
+                                "/2009-04-04/user-data",
+                                headers={'If-None-Match': '"other"'})
+        self.assertEqual(200, response.status_int)
+
+    def test_etag_weak(self):
+        response = fake_request(self.stubs, self.mdinst,
+                                "/openstack/latest/meta_data.json")
+        etag = response.headers['ETag']
+        self.assertTrue(etag.startswith('W/'))
+
+        response = fake_request(self.stubs, self.mdinst,
+                                "/openstack/latest/meta_data.json",
+                                headers={'If-None-Match': '"x", ' + etag})
+        self.assertEqual(304, response.status_int)
+
+    @mock.patch.object(base, 'get_metadata_fingerprint')
+    @mock.patch.object(base, 'get_metadata_by_instance_id')
+    def test_cache_revalidation(self, mock_get, mock_fingerprint):
+        self.flags(metadata_cache_expiration=15)
+        self.useFixture(test.TimeOverride())
+        mock_get.return_value = self.mdinst
+        mock_fingerprint.return_value = self.mdinst.fingerprint
+        app = handler.MetadataRequestHandler()
+
+        self.assertEqual(self.mdinst,
+                         app.get_metadata_by_instance_id('uuid', None))
+        self.assertEqual(self.mdinst,
+                         app.get_metadata_by_instance_id('uuid', None))
+        self.assertEqual(1, mock_get.call_count)
+        self.assertFalse(mock_fingerprint.called)
+
+        timeutils.advance_time_seconds(15)
+        self.mdinst.uuid = 'uuid'
+        self.assertEqual(self.mdinst,
+                         app.get_metadata_by_instance_id('uuid', None))
+        self.assertEqual(1, mock_get.call_count)
+        mock_fingerprint.assert_called_once_with('uuid')
+
+        timeutils.advance_time_seconds(15)
+        mock_fingerprint.return_value = 'changed'
+        app.get_metadata_by_instance_id('uuid', None)
+        self.assertEqual(2, mock_get.call_count)
+
+    @mock.patch.object(base, 'get_instance_id_by_address')
+    @mock.patch.object(base, 'get_metadata_by_address')
+    def test_cache_revalidation_address_reused(self, mock_get,
+                                               mock_instance_id):
+        self.useFixture(test.TimeOverride())
+        mock_get.return_value = self.mdinst
+        mock_instance_id.return_value = 'other-uuid'
+        app = handler.MetadataRequestHandler()
+
+        app.get_metadata_by_remote_address('192.168.0.3')
+        timeutils.advance_time_seconds(15)
+        app.get_metadata_by_remote_address('192.168.0.3')
+        self.assertEqual(2, mock_get.call_count)
+        mock_instance_id.assert_called_once_with('192.168.0.3',
+                                                 address_index=None)
+
+    @mock.patch.object(base, 'get_metadata_by_instance_id')
+    def test_cache_disabled(self, mock_get):
+        self.flags(metadata_cache_expiration=0)
+        mock_get.return_value = self.mdinst
+        app = handler.MetadataRequestHandler()
+        app.get_metadata_by_instance_id('uuid', None)
+        app.get_metadata_by_instance_id('uuid', None)
+        self.assertEqual(2, mock_get.call_count)
+
+    @mock.patch.object(base.AddressIndex, 'refresh')
+    @mock.patch.object(base, 'get_metadata_by_address')
+    def test_address_index(self, mock_get, mock_refresh):
+        self.flags(metadata_address_index_interval=60)
+        self.useFixture(test.TimeOverride())
+        mock_get.return_value = self.mdinst
+        app = handler.MetadataRequestHandler()
+        mock_refresh.assert_called_once_with()
+
+        app.get_metadata_by_remote_address('192.168.0.3')
+        mock_get.assert_called_once_with(
+            app.conductor_api, '192.168.0.3',
+            address_index=app._address_index)
+        self.assertEqual(1, mock_refresh.call_count)
+
+        timeutils.advance_time_seconds(60)
+        app.get_metadata_by_remote_address('192.168.0.4')
+        self.assertEqual(2, mock_refresh.call_count)
+
+    def test_load_coalesced(self):
+        loaded = eventlet.event.Event()
+        loads = []
+
+        def load():
+            loads.append(1)
+            return loaded.wait()
+
+        app = handler.MetadataRequestHandler()
+        first = eventlet.spawn(app._load_metadata, 'metadata-uuid', load)
+        second = eventlet.spawn(app._load_metadata, 'metadata-uuid', load)
+        eventlet.sleep(0)
+        loaded.send(self.mdinst)
+
+        self.assertEqual(self.mdinst, first.wait())
+        self.assertEqual(self.mdinst, second.wait())
+        self.assertEqual(1, len(loads))
+        self.assertEqual(1, app.get_stats()['coalesced_loads'])
+        self.assertEqual({}, app._loads)
+        self.assertEqual(self.mdinst,
+                         app.get_metadata_by_instance_id('uuid', None))
+
+    def test_load_coalesced_error(self):
+        loaded = eventlet.event.Event()
+
+        def load():
+            loaded.wait()
+            raise exception.InstanceNotFound(instance_id='uuid')
+
+        app = handler.MetadataRequestHandler()
+        first = eventlet.spawn(app._load_metadata, 'metadata-uuid', load)
+        second = eventlet.spawn(app._load_metadata, 'metadata-uuid', load)
+        eventlet.sleep(0)
+        loaded.send()
+
+        self.assertRaises(exception.InstanceNotFound, first.wait)
+        self.assertRaises(exception.InstanceNotFound, second.wait)
+        self.assertEqual({}, app._loads)
+
+    def test_load_concurrency_limit(self):
+        self.flags(metadata_max_concurrent_loads=1)
+        loaded = eventlet.event.Event()
+        running = []
+
+        def load():
+            running.append(1)
+            loaded.wait()
+            return self.mdinst
+
+        app = handler.MetadataRequestHandler()
+        first = eventlet.spawn(app._load_metadata, 'metadata-uuid1', load)
+        second = eventlet.spawn(app._load_metadata, 'metadata-uuid2', load)
+        eventlet.sleep(0)
+        self.assertEqual(1, len(running))
+        loaded.send()
+        first.wait()
+        second.wait()
+        self.assertEqual(2, len(running))
+
+    def test_path_category(self):
+        for path, category in (
+                ('/', 'root'),
+                ('/latest', 'ec2'),
+                ('/2009-04-04/meta-data/instance-id', 'ec2/meta-data'),
+                ('/latest/user-data', 'ec2/user-data'),
+                ('/openstack', 'openstack'),
+                ('/openstack/latest/meta_data.json',
+                 'openstack/meta_data.json'),
+                ('/openstack/2013-04-04/password', 'openstack/password'),
+                ('/openstack/latest/foo', 'openstack')):
+            self.assertEqual(category, handler._path_category(path))
+
+    def test_latency_histogram(self):
+        histogram = handler.LatencyHistogram()
+        for seconds in [0.0005] * 50 + [0.003] * 45 + [0.3] * 4 + [30]:
+            histogram.add(seconds)
+        self.assertEqual(100, histogram.count)
+        self.assertEqual(0.001, histogram.percentile(50))
+        self.assertEqual(0.005, histogram.percentile(90))
+        self.assertEqual(0.5, histogram.percentile(99))
+        self.assertIsNone(histogram.percentile(100))
+        self.assertEqual('count=100 mean=313.6ms p50<=1ms p90<=5ms '
+                         'p99<=500ms', str(histogram))
+
+    def test_request_latency_recorded(self):
+        app = handler.MetadataRequestHandler()
+        self.stubs.Set(app, 'get_metadata_by_remote_address',
+                       lambda address: self.mdinst)
+        request = webob.Request.blank('/2009-04-04/meta-data/instance-id')
+        request.remote_addr = '127.0.0.1'
+        request.get_response(app)
+        request.get_response(app)
+        webob.Request.blank('/').get_response(app)
+
+        latencies = app.get_stats()['latencies']
+        self.assertEqual(['ec2/meta-data', 'root'], sorted(latencies))
+        self.assertEqual(2, latencies['ec2/meta-data'].count)
+
     def test_user_data_non_existing_fixed_address(self):
         self.stubs.Set(network_api.API, 'get_fixed_ip_by_address',
                        return_non_existing_address)
@@ -790,6 +1044,131 @@ class MetadataHandlerTestCase(test.TestCase):
         self.assertEqual(response.status_int, 500)
 
 
+def _fake_indexed_instance(uuid, addresses, deleted=False):
+    instance = mock.Mock(uuid=uuid, deleted=deleted)
+    instance.info_cache.network_info.fixed_ips.return_value = [
+        {'address': address} for address in addresses]
+    return instance
+
+
+class AddressIndexTestCase(test.NoDBTestCase):
+
+    def setUp(self):
+        super(AddressIndexTestCase, self).setUp()
+        self.useFixture(test.TimeOverride())
+        self.context = context.get_admin_context()
+        self.index = base.AddressIndex()
+
+    @mock.patch.object(objects.InstanceList, 'get_by_filters')
+    def test_refresh(self, mock_get):
+        loaded_at = timeutils.utcnow()
+        mock_get.return_value = [
+            _fake_indexed_instance('uuid1', ['10.0.0.1', '10.0.0.2']),
+            _fake_indexed_instance('uuid2', ['10.0.0.3'])]
+        self.index.refresh(self.context)
+        mock_get.assert_called_once_with(
+            self.context, {'deleted': False}, expected_attrs=['info_cache'],
+            use_slave=True)
+        self.assertEqual('uuid1', self.index.get('10.0.0.2'))
+        self.assertEqual('uuid2', self.index.get('10.0.0.3'))
+
+        timeutils.advance_time_seconds(60)
+        mock_get.reset_mock()
+        mock_get.return_value = [
+            _fake_indexed_instance('uuid1', [], deleted=True),
+            _fake_indexed_instance('uuid3', ['10.0.0.1'])]
+        self.index.refresh(self.context)
+        mock_get.assert_called_once_with(
+            self.context, {'changes-since': loaded_at},
+            expected_attrs=['info_cache'], use_slave=True)
+        self.assertEqual('uuid3', self.index.get('10.0.0.1'))
+        self.assertIsNone(self.index.get('10.0.0.2'))
+        self.assertEqual('uuid2', self.index.get('10.0.0.3'))
+
+    @mock.patch.object(objects.InstanceList, 'get_by_filters')
+    def test_refresh_address_moved(self, mock_get):
+        mock_get.return_value = [
+            _fake_indexed_instance('uuid1', ['10.0.0.1', '10.0.0.2'])]
+        self.index.refresh(self.context)
+        mock_get.return_value = [
+            _fake_indexed_instance('uuid1', ['10.0.0.2']),
+            _fake_indexed_instance('uuid2', ['10.0.0.1'])]
+        self.index.refresh(self.context)
+        self.assertEqual('uuid2', self.index.get('10.0.0.1'))
+        self.assertEqual('uuid1', self.index.get('10.0.0.2'))
+
+    @mock.patch.object(base, 'InstanceMetadata')
+    @mock.patch.object(network_api.API, 'get_fixed_ip_by_address')
+    @mock.patch.object(objects.Instance, 'get_by_uuid')
+    @mock.patch.object(objects.InstanceList, 'get_by_filters')
+    def test_shared_address(self, mock_get_all, mock_get, mock_fixed_ip,
+                            mock_md):
+        mock_get_all.return_value = [
+            _fake_indexed_instance('uuid1', ['10.0.0.1']),
+            _fake_indexed_instance('uuid2', ['10.0.0.1'])]
+        self.index.refresh(self.context)
+        self.assertIsNone(self.index.get('10.0.0.1'))
+
+        mock_fixed_ip.side_effect = (
+            exception.FixedIpAssociatedWithMultipleInstances(
+                address='10.0.0.1'))
+        self.assertRaises(exception.FixedIpAssociatedWithMultipleInstances,
+                          base.get_metadata_by_address, None, '10.0.0.1',
+                          self.index)
+        self.assertFalse(mock_get.called)
+        self.assertFalse(mock_md.called)
+
+    @mock.patch.object(network_api.API, 'get_fixed_ip_by_address')
+    @mock.patch.object(objects.Instance, 'get_by_uuid')
+    def test_get_instance_id_by_address(self, mock_get, mock_fixed_ip):
+        self.index.add('10.0.0.1', 'uuid1')
+        mock_get.return_value = _fake_indexed_instance('uuid1', ['10.0.0.1'])
+        self.assertEqual('uuid1', base.get_instance_id_by_address(
+            '10.0.0.1', self.context, self.index))
+        mock_get.assert_called_once_with(self.context, 'uuid1',
+                                         expected_attrs=['info_cache'])
+        self.assertFalse(mock_fixed_ip.called)
+
+    @mock.patch.object(network_api.API, 'get_fixed_ip_by_address')
+    @mock.patch.object(objects.Instance, 'get_by_uuid')
+    def test_get_instance_id_by_address_moved(self, mock_get, mock_fixed_ip):
+        self.index.add('10.0.0.1', 'uuid1')
+        mock_get.return_value = _fake_indexed_instance('uuid1', ['10.0.0.2'])
+        mock_fixed_ip.return_value = {'instance_uuid': 'uuid2'}
+        self.assertEqual('uuid2', base.get_instance_id_by_address(
+            '10.0.0.1', self.context, self.index))
+        self.assertEqual('uuid2', self.index.get('10.0.0.1'))
+
+    @mock.patch.object(network_api.API, 'get_fixed_ip_by_address')
+    @mock.patch.object(objects.Instance, 'get_by_uuid')
+    def test_get_instance_id_by_address_deleted(self, mock_get,
+                                                mock_fixed_ip):
+        self.index.add('10.0.0.1', 'uuid1')
+        mock_get.side_effect = exception.InstanceNotFound(instance_id='uuid1')
+        mock_fixed_ip.side_effect = exception.FixedIpNotFoundForAddress(
+            address='10.0.0.1')
+        self.assertRaises(exception.FixedIpNotFoundForAddress,
+                          base.get_instance_id_by_address, '10.0.0.1',
+                          self.context, self.index)
+        self.assertIsNone(self.index.get('10.0.0.1'))
+
+    @mock.patch.object(base, 'InstanceMetadata')
+    @mock.patch.object(network_api.API, 'get_fixed_ip_by_address')
+    @mock.patch.object(objects.Instance, 'get_by_uuid')
+    def test_get_metadata_by_address(self, mock_get, mock_fixed_ip,
+                                     mock_md):
+        self.index.add('10.0.0.1', 'uuid1')
+        instance = _fake_indexed_instance('uuid1', ['10.0.0.1'])
+        mock_get.return_value = instance
+        self.assertEqual(mock_md.return_value, base.get_metadata_by_address(
+            None, '10.0.0.1', self.index))
+        mock_get.assert_called_once_with(
+            mock.ANY, 'uuid1',
+            expected_attrs=['metadata', 'system_metadata', 'info_cache'])
+        mock_md.assert_called_once_with(instance, '10.0.0.1')
+        self.assertFalse(mock_fixed_ip.called)
+
+
 class MetadataPasswordTestCase(test.TestCase):
     def setUp(self):
         super(MetadataPasswordTestCase, self).setUp()
@@ -20,6 +20,7 @@ import StringIO
 
 import mock
 import six.moves.urllib.request as urlrequest
+from testtools import matchers
 
 from nova import context
 from nova import exception
@@ -57,6 +58,30 @@ class PolicyFileTestCase(test.NoDBTestCase):
             self.assertRaises(exception.PolicyNotAuthorized, policy.enforce,
                               self.context, action, self.target)
 
+    @mock.patch('time.time')
+    def test_modified_policy_check_interval(self, mock_time):
+        self.flags(policy_check_interval=5)
+        mock_time.return_value = 1000
+        with utils.tempdir() as tmpdir:
+            tmpfilename = os.path.join(tmpdir, 'policy')
+            self.flags(policy_file=tmpfilename)
+            policy.reset()
+
+            action = "example:test"
+            with open(tmpfilename, "w") as policyfile:
+                policyfile.write('{"example:test": ""}')
+            policy.enforce(self.context, action, self.target)
+            with open(tmpfilename, "w") as policyfile:
+                policyfile.write('{"example:test": "!"}')
+            os.utime(tmpfilename, (2000000000, 2000000000))
+
+            mock_time.return_value = 1004
+            self.assertTrue(policy.enforce(self.context, action,
+                                           self.target))
+            mock_time.return_value = 1005
+            self.assertRaises(exception.PolicyNotAuthorized, policy.enforce,
+                              self.context, action, self.target)
+
 
 class PolicyTestCase(test.NoDBTestCase):
     def setUp(self):
@@ -145,6 +170,115 @@ class PolicyTestCase(test.NoDBTestCase):
         policy.enforce(admin_context, uppercase_action, self.target)
 
 
+class CompiledPolicyTestCase(test.NoDBTestCase):
+    rules = {
+        "true": '@',
+        "false": '!',
+        "admin": 'role:admin or is_admin:True',
+        "owner": 'project_id:%(project_id)s',
+        "admin_or_owner": 'rule:admin or rule:owner',
+        "not_owner": 'not rule:owner',
+        "owner_not_admin": 'rule:owner and not rule:admin',
+        "literal": '"fake":%(project_id)s',
+        "constant": 'project_id:fake',
+        "user_or_member": 'user_id:%(user_id)s or (role:Member and @)',
+        "nested": 'rule:admin_or_owner and rule:true',
+        "missing_rule": 'rule:noexist',
+        "missing_cred": 'noexist:%(project_id)s',
+        "format": 'project_id:%(project_id)r',
+        "http": 'http://www.example.com',
+        "loop": 'rule:loop2',
+        "loop2": 'rule:loop',
+    }
+
+    def setUp(self):
+        super(CompiledPolicyTestCase, self).setUp()
+        policy.reset()
+        policy.init(use_conf=False)
+        policy.set_rules(dict((k, common_policy.parse_rule(v))
+                              for k, v in self.rules.items()))
+        self.enforcer = policy._ENFORCER
+
+    def _common_enforcer(self):
+        enforcer = common_policy.Enforcer(use_conf=False)
+        enforcer.set_rules(dict(self.enforcer.rules))
+        return enforcer
+
+    def test_compiled_like_common_policy(self):
+        common_enforcer = self._common_enforcer()
+        creds = [{'roles': [], 'is_admin': False, 'project_id': 'fake',
+                  'user_id': 'fake'},
+                 {'roles': ['ADMIN'], 'is_admin': False, 'project_id': 'x',
+                  'user_id': 'y'},
+                 {'roles': ['member'], 'is_admin': True, 'project_id': 'x',
+                  'user_id': 'fake'},
+                 {'roles': []}]
+        targets = [{}, {'project_id': 'fake'}, {'project_id': 'x'},
+                   {'project_id': 'fake', 'user_id': 'fake'}]
+        for rule in self.rules:
+            if rule in ('http', 'loop', 'loop2'):
+                continue
+            for cred in creds:
+                for target in targets:
+                    self.assertEqual(
+                        common_enforcer.enforce(rule, target, cred),
+                        self.enforcer.enforce(rule, target, cred),
+                        '%s %s %s' % (rule, cred, target))
+
+    def test_default_rule(self):
+        self.enforcer.default_rule = 'true'
+        self.enforcer.set_rules(dict(self.enforcer.rules))
+        self.assertTrue(self.enforcer.enforce('noexist', {}, {}))
+        self.assertTrue(self.enforcer.enforce('missing_rule', {}, {}))
+
+    def test_decision_keys(self):
+        compiled = self.enforcer.compiled_rules
+        self.assertEqual((('is_admin', 'project_id', 'roles'),
+                          ('project_id',)),
+                         compiled['admin_or_owner'].decision_keys)
+        self.assertEqual(((), ()), compiled['true'].decision_keys)
+        for rule in ('format', 'http', 'loop', 'missing_rule'):
+            self.assertIsNone(compiled[rule].decision_keys)
+
+    def test_decisions_remembered(self):
+        decisions = {}
+        creds = {'roles': ['member'], 'is_admin': False, 'project_id': 'fake'}
+        compiled = self.enforcer.compiled_rules['owner']
+        with mock.patch.object(compiled, 'func',
+                               wraps=compiled.func) as mock_func:
+            self.assertTrue(self.enforcer.check(
+                'owner', {'project_id': 'fake'}, creds, decisions))
+            self.assertTrue(self.enforcer.check(
+                'owner', {'project_id': 'fake', 'user_id': 'x'}, creds,
+                decisions))
+            self.assertEqual(1, mock_func.call_count)
+            self.assertFalse(self.enforcer.check(
+                'owner', {'project_id': 'x'}, creds, decisions))
+            self.assertEqual(2, mock_func.call_count)
+
+        self.assertEqual(2, len(decisions))
+        policy.set_rules({'owner': common_policy.parse_rule('!')})
+        self.assertFalse(self.enforcer.check(
+            'owner', {'project_id': 'fake'}, creds, decisions))
+
+    @mock.patch.object(urlrequest, 'urlopen')
+    def test_http_decisions_not_remembered(self, mock_urlopen):
+        mock_urlopen.side_effect = [StringIO.StringIO("True"),
+                                    StringIO.StringIO("False")]
+        decisions = {}
+        self.assertTrue(self.enforcer.check('http', {}, {}, decisions))
+        self.assertFalse(self.enforcer.check('http', {}, {}, decisions))
+        self.assertEqual({}, decisions)
+
+    def test_enforce_remembers_decisions(self):
+        ctxt = context.RequestContext('fake', 'fake', roles=['member'])
+        policy.enforce(ctxt, 'owner', {'project_id': 'fake'})
+        self.assertEqual([True], ctxt.policy_decisions.values())
+        self.assertRaises(exception.PolicyNotAuthorized, policy.enforce,
+                          ctxt.elevated(), 'not_owner',
+                          {'project_id': 'fake'})
+
+
 class DefaultPolicyTestCase(test.NoDBTestCase):
 
     def setUp(self):
@@ -229,3 +363,18 @@ class AdminRolePolicyTestCase(test.NoDBTestCase):
         for action in self.actions:
             self.assertRaises(exception.PolicyNotAuthorized, policy.enforce,
                           self.context, action, self.target)
+
+
+class EnforceStatsFixtureTestCase(test.NoDBTestCase):
+    def test_report(self):
+        stats = self.useFixture(policy_fixture.EnforceStatsFixture())
+        ctxt = context.RequestContext('fake', 'fake', request_id='req-1')
+        policy.set_rules({'example:allowed': common_policy.parse_rule('@')})
+        policy.enforce(ctxt, 'example:allowed', {})
+        policy.enforce(ctxt, 'example:allowed', {})
+
+        self.assertEqual(['req-1'], stats.calls.keys())
+        self.assertEqual(['example:allowed'] * 2,
+                         [action for action, _s in stats.calls['req-1']])
+        self.assertThat(stats.report(),
+                        matchers.StartsWith('req-1: 2 calls, '))
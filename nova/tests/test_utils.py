@@ -20,8 +20,10 @@ import importlib
 import os
 import os.path
 import StringIO
+import sys
 import tempfile
 
+import fixtures
 import mox
 import netaddr
 from oslo.config import cfg
@@ -541,6 +543,54 @@ class AuditPeriodTest(test.NoDBTestCase):
                                            year=2011))
 
 
+class ImportProfilerTestCase(test.NoDBTestCase):
+    def setUp(self):
+        super(ImportProfilerTestCase, self).setUp()
+        tmpdir = self.useFixture(fixtures.TempDir()).path
+        pkg_dir = os.path.join(tmpdir, 'profiled_pkg')
+        os.mkdir(pkg_dir)
+        for name, source in (('__init__.py', ''),
+                             ('sub.py', 'from profiled_pkg import other\n'),
+                             ('other.py', '')):
+            with open(os.path.join(pkg_dir, name), 'w') as f:
+                f.write(source)
+        self.stubs.Set(sys, 'path', [tmpdir] + sys.path)
+        self.addCleanup(self._unload)
+
+    def _unload(self):
+        for name in sys.modules.keys():
+            if name.startswith('profiled_pkg'):
+                del sys.modules[name]
+
+    def test_profile(self):
+        import_builtin = __builtin__.__import__
+        times = iter(xrange(6))
+        self.stubs.Set(utils.time, 'time', lambda: float(next(times)))
+        with utils.ImportProfiler() as profiler:
+            import profiled_pkg
+            from profiled_pkg import sub
+        self.assertEqual(import_builtin, __builtin__.__import__)
+
+        self.assertEqual('profiled_pkg.sub', sub.__name__)
+        self.assertEqual('profiled_pkg.other', profiled_pkg.other.__name__)
+        self.assertEqual({'profiled_pkg': (1.0, 1.0),
+                          'profiled_pkg.sub': (3.0, 2.0),
+                          'profiled_pkg.other': (1.0, 1.0)}, profiler.times)
+        self.assertEqual(['%10s %10s  %s' % ('cumul. ms', 'self ms', 'module'),
+                          '    3000.0     2000.0  profiled_pkg.sub'],
+                         profiler.report(limit=1))
+
+    def test_profile_package_and_submodule(self):
+        times = iter(xrange(4))
+        self.stubs.Set(utils.time, 'time', lambda: float(next(times)))
+        with utils.ImportProfiler() as profiler:
+            from profiled_pkg import sub
+        self.assertEqual('profiled_pkg.sub', sub.__name__)
+        self.assertEqual({'profiled_pkg': (1.5, 1.0),
+                          'profiled_pkg.sub': (1.5, 1.0),
+                          'profiled_pkg.other': (1.0, 1.0)}, profiler.times)
+
+
 class MkfsTestCase(test.NoDBTestCase):
 
     def test_mkfs(self):
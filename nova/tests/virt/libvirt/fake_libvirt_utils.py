@@ -103,7 +103,7 @@ def get_disk_type(path):
 
 
 def copy_image(src, dest):
-    pass
+    files[dest] = files.get(src, '')
 
 
 def resize2fs(path):
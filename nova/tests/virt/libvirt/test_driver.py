@@ -7622,6 +7622,8 @@ class LibvirtConnTestCase(test.TestCase,
         libvirt_driver.LibvirtDriver._conn.lookupByName = fake_lookup_name
 
         conn = libvirt_driver.LibvirtDriver(fake.FakeVirtAPI(), False)
+        # NOTE: exercise the per-device calls of libvirt < 1.2.8
+        conn._skip_bulk_domain_stats = True
         actual = conn.get_diagnostics({"name": "testvirt"})
         expect = {'vda_read': 688640L,
                   'vda_read_req': 169L,
@@ -7739,6 +7741,8 @@ class LibvirtConnTestCase(test.TestCase,
         libvirt_driver.LibvirtDriver._conn.lookupByName = fake_lookup_name
 
         conn = libvirt_driver.LibvirtDriver(fake.FakeVirtAPI(), False)
+        # NOTE: exercise the per-device calls of libvirt < 1.2.8
+        conn._skip_bulk_domain_stats = True
         actual = conn.get_diagnostics({"name": "testvirt"})
         expect = {'cpu0_time': 15340000000L,
                   'cpu1_time': 1640000000L,
@@ -7842,6 +7846,8 @@ class LibvirtConnTestCase(test.TestCase,
         libvirt_driver.LibvirtDriver._conn.lookupByName = fake_lookup_name
 
         conn = libvirt_driver.LibvirtDriver(fake.FakeVirtAPI(), False)
+        # NOTE: exercise the per-device calls of libvirt < 1.2.8
+        conn._skip_bulk_domain_stats = True
         actual = conn.get_diagnostics({"name": "testvirt"})
         expect = {'cpu0_time': 15340000000L,
                   'cpu1_time': 1640000000L,
@@ -7950,6 +7956,8 @@ class LibvirtConnTestCase(test.TestCase,
         libvirt_driver.LibvirtDriver._conn.lookupByName = fake_lookup_name
 
         conn = libvirt_driver.LibvirtDriver(fake.FakeVirtAPI(), False)
+        # NOTE: exercise the per-device calls of libvirt < 1.2.8
+        conn._skip_bulk_domain_stats = True
         actual = conn.get_diagnostics({"name": "testvirt"})
         expect = {'cpu0_time': 15340000000L,
                   'cpu1_time': 1640000000L,
@@ -8072,6 +8080,8 @@ class LibvirtConnTestCase(test.TestCase,
         libvirt_driver.LibvirtDriver._conn.lookupByName = fake_lookup_name
 
         conn = libvirt_driver.LibvirtDriver(fake.FakeVirtAPI(), False)
+        # NOTE: exercise the per-device calls of libvirt < 1.2.8
+        conn._skip_bulk_domain_stats = True
         actual = conn.get_diagnostics({"name": "testvirt"})
         expect = {'cpu0_time': 15340000000L,
                   'cpu1_time': 1640000000L,
@@ -8383,6 +8393,80 @@ Active:          8381604 kB
         self.assertEqual(got_events[0].transition,
                          virtevent.EVENT_LIFECYCLE_STOPPED)
 
+    def _domain_cache_driver(self):
+        self.flags(domain_cache_reconcile_interval=300, group='libvirt')
+        conn = libvirt_driver.LibvirtDriver(fake.FakeVirtAPI(), False)
+        conn._domain_cache.enabled = True
+        return conn
+
+    def _fake_cached_domain(self, id, name):
+        dom = FakeVirtDomain(id=id, name=name)
+        dom.vcpus = mock.Mock(return_value=([], [[True], [True]]))
+        return dom
+
+    @mock.patch.object(libvirt_driver.LibvirtDriver,
+                       "_list_instance_domains")
+    def test_list_instances_domain_cache(self, mock_list):
+        vm1 = self._fake_cached_domain(3, 'instance00000001')
+        vm2 = self._fake_cached_domain(-1, 'instance00000002')
+        mock_list.return_value = [vm1, vm2]
+
+        conn = self._domain_cache_driver()
+        self.assertEqual(sorted([vm1.name(), vm2.name()]),
+                         sorted(conn.list_instances()))
+        self.assertEqual(sorted([vm1.UUIDString(), vm2.UUIDString()]),
+                         sorted(conn.list_instance_uuids()))
+        self.assertEqual(2, conn._get_vcpu_used())
+        mock_list.assert_called_once_with(only_running=False)
+        self.assertFalse(vm2.vcpus.called)
+
+    @mock.patch.object(libvirt_driver.LibvirtDriver,
+                       "_list_instance_domains")
+    def test_list_instances_domain_cache_event(self, mock_list):
+        vm1 = self._fake_cached_domain(3, 'instance00000001')
+        vm2 = self._fake_cached_domain(4, 'instance00000002')
+        vm3 = self._fake_cached_domain(5, 'instance00000003')
+        mock_list.return_value = [vm1, vm2]
+
+        def fake_lookup_uuid(uuid):
+            if uuid == vm3.UUIDString():
+                return vm3
+            raise fakelibvirt.make_libvirtError(
+                libvirt.libvirtError,
+                "No such domain",
+                error_code=libvirt.VIR_ERR_NO_DOMAIN)
+
+        conn = self._domain_cache_driver()
+        conn._init_events_pipe()
+        libvirt_conn = conn._conn
+        conn.list_instances()
+        for dom, event in ((vm1, libvirt.VIR_DOMAIN_EVENT_UNDEFINED),
+                           (vm3, libvirt.VIR_DOMAIN_EVENT_STARTED)):
+            conn._event_lifecycle_callback(libvirt_conn, dom, event, 0, conn)
+        conn._dispatch_events()
+        with mock.patch.object(libvirt_conn, 'lookupByUUIDString',
+                               side_effect=fake_lookup_uuid,
+                               create=True) as mock_lookup:
+            self.assertEqual(sorted([vm2.name(), vm3.name()]),
+                             sorted(conn.list_instances()))
+            self.assertEqual(4, conn._get_vcpu_used())
+        self.assertEqual(2, mock_lookup.call_count)
+        mock_list.assert_called_once_with(only_running=False)
+        self.assertEqual(1, vm2.vcpus.call_count)
+
+    def test_domain_cache_needs_events(self):
+        self.flags(domain_cache_reconcile_interval=300, group='libvirt')
+        conn = libvirt_driver.LibvirtDriver(fake.FakeVirtAPI(), False)
+        conn._lifecycle_events = True
+        conn._update_domain_cache_enabled()
+        self.assertFalse(conn._domain_cache.enabled)
+        conn._init_events_pipe()
+        conn._update_domain_cache_enabled()
+        self.assertTrue(conn._domain_cache.enabled)
+        self.flags(domain_cache_reconcile_interval=0, group='libvirt')
+        conn._update_domain_cache_enabled()
+        self.assertFalse(conn._domain_cache.enabled)
+
     def test_set_cache_mode(self):
         self.flags(disk_cachemodes=['file=directsync'], group='libvirt')
         conn = libvirt_driver.LibvirtDriver(fake.FakeVirtAPI(), True)
@@ -9440,8 +9524,9 @@ Active:          8381604 kB
                 mock.patch.object(fake_libvirt_utils, 'create_cow_image'),
                 mock.patch.object(fake_libvirt_utils, 'chown'),
                 mock.patch.object(fake_libvirt_utils, 'extract_snapshot'),
+                mock.patch.object(fake_libvirt_utils, 'file_delete'),
         ) as (mock_define, mock_size, mock_backing, mock_create_cow,
-              mock_chown, mock_snapshot):
+              mock_chown, mock_snapshot, mock_delete):
 
             xmldoc = "<domain/>"
             srcfile = "/first/path"
@@ -9472,6 +9557,40 @@ Active:          8381604 kB
             mock_snapshot.assert_called_once_with(dltfile, "qcow2",
                                                   dstfile, "qcow2")
             mock_define.assert_called_once_with(xmldoc)
+            mock_delete.assert_called_once_with(dltfile)
+
+    @mock.patch.object(os, 'rename')
+    def test_live_snapshot_without_backing_file(self, mock_rename):
+        drvr = libvirt_driver.LibvirtDriver(fake.FakeVirtAPI())
+
+        mock_dom = mock.MagicMock()
+
+        with contextlib.nested(
+                mock.patch.object(drvr._conn, 'defineXML', create=True),
+                mock.patch.object(fake_libvirt_utils, 'get_disk_size'),
+                mock.patch.object(fake_libvirt_utils, 'get_disk_backing_file',
+                                  return_value=None),
+                mock.patch.object(fake_libvirt_utils, 'create_cow_image'),
+                mock.patch.object(fake_libvirt_utils, 'chown'),
+                mock.patch.object(fake_libvirt_utils, 'extract_snapshot'),
+        ) as (mock_define, mock_size, mock_backing, mock_create_cow,
+              mock_chown, mock_snapshot):
+            drvr._live_snapshot(mock_dom, "/first/path", "/second/path",
+                                "qcow2")
+
+            mock_create_cow.assert_called_once_with(None,
+                                                    "/second/path.delta",
+                                                    mock_size.return_value)
+            self.assertFalse(mock_snapshot.called)
+            mock_rename.assert_called_once_with("/second/path.delta",
+                                                "/second/path")
+
+            self.flags(snapshot_compression=True, group='libvirt')
+            drvr._live_snapshot(mock_dom, "/first/path", "/second/path",
+                                "qcow2")
+            mock_snapshot.assert_called_once_with("/second/path.delta",
+                                                  "qcow2", "/second/path",
+                                                  "qcow2")
 
     @mock.patch.object(greenthread, "spawn")
     def test_live_migration_hostname_valid(self, mock_spawn):
@@ -9495,6 +9614,161 @@ Active:          8381604 kB
                           lambda x: x)
 
 
+class DiskInfoCacheTestCase(test.NoDBTestCase):
+    def setUp(self):
+        super(DiskInfoCacheTestCase, self).setUp()
+        self.cache = libvirt_driver.DiskInfoCache()
+        self.stat = mock.Mock(st_ino=1, st_mtime=1.5, st_size=1024)
+
+    @mock.patch.object(libvirt_driver.disk, 'get_disk_size',
+                       return_value=10 * units.Gi)
+    @mock.patch.object(libvirt_driver.libvirt_utils, 'get_disk_backing_file',
+                       return_value='base')
+    def test_get_caches_unchanged_files(self, mock_backing, mock_size):
+        with mock.patch.object(os, 'stat', return_value=self.stat):
+            self.assertEqual((10 * units.Gi, 'base'),
+                             self.cache.get('/test/disk'))
+            self.assertEqual((10 * units.Gi, 'base'),
+                             self.cache.get('/test/disk'))
+            self.stat.st_mtime = 2.5
+            self.cache.get('/test/disk')
+        self.assertEqual(2, mock_backing.call_count)
+        self.assertEqual(2, mock_size.call_count)
+        stats = self.cache.stats()
+        self.assertEqual(1, stats['hits'])
+        self.assertEqual(2, stats['misses'])
+
+    @mock.patch.object(libvirt_driver.disk, 'get_disk_size',
+                       return_value=10 * units.Gi)
+    @mock.patch.object(libvirt_driver.libvirt_utils, 'get_disk_backing_file',
+                       return_value='base')
+    def test_get_does_not_cache_missing_files(self, mock_backing, mock_size):
+        with mock.patch.object(os, 'stat',
+                               side_effect=OSError(errno.ENOENT, 'gone')):
+            self.cache.get('/test/disk')
+            self.cache.get('/test/disk')
+        self.assertEqual(2, mock_size.call_count)
+        self.assertEqual(0, self.cache.stats()['hits'])
+
+    @mock.patch.object(libvirt_driver.disk, 'get_disk_size',
+                       return_value=10 * units.Gi)
+    @mock.patch.object(libvirt_driver.libvirt_utils, 'get_disk_backing_file',
+                       return_value='base')
+    def test_prune(self, mock_backing, mock_size):
+        with mock.patch.object(os, 'stat', return_value=self.stat):
+            self.cache.get('/test/disk1')
+            self.cache.get('/test/disk2')
+            self.cache.prune(['/test/disk2'])
+            self.cache.get('/test/disk1')
+            self.cache.get('/test/disk2')
+        self.assertEqual(1, self.cache.stats()['hits'])
+        self.assertEqual(3, mock_size.call_count)
+
+
+class DomainCacheTestCase(test.NoDBTestCase):
+    def setUp(self):
+        super(DomainCacheTestCase, self).setUp()
+        self.cache = libvirt_driver.DomainCache()
+        self.cache.enabled = True
+        self.entry1 = {'name': 'instance-1', 'uuid': 'uuid-1', 'id': 1,
+                       'vcpus': 1}
+        self.entry2 = {'name': 'instance-2', 'uuid': 'uuid-2', 'id': -1,
+                       'vcpus': 0}
+
+    def test_reconcile_and_get(self):
+        self.assertIsNone(self.cache.get('instance-1'))
+        self.assertIsNone(self.cache.list())
+        self.cache.reconcile([self.entry1, self.entry2],
+                             self.cache.generation)
+        self.assertEqual(sorted([self.entry1, self.entry2]),
+                         sorted(self.cache.list()))
+        self.assertEqual(self.entry2, self.cache.get('instance-2'))
+        self.assertEqual(2, self.cache.hits)
+        self.assertEqual(0, self.cache.misses)
+
+    def test_disabled(self):
+        self.cache.enabled = False
+        self.cache.reconcile([self.entry1], self.cache.generation)
+        self.cache.update('uuid-1', self.entry1, self.cache.generation)
+        self.assertIsNone(self.cache.get('instance-1'))
+        self.assertIsNone(self.cache.list())
+
+    def test_reconcile_stale_generation(self):
+        generation = self.cache.generation
+        self.cache.clear()
+        self.cache.reconcile([self.entry1], generation)
+        self.assertIsNone(self.cache.list())
+
+    def test_invalidate(self):
+        self.cache.reconcile([self.entry1, self.entry2],
+                             self.cache.generation)
+        self.cache.invalidate(uuid='uuid-1')
+        self.assertIsNone(self.cache.get('instance-1'))
+        self.assertEqual(self.entry2, self.cache.get('instance-2'))
+        self.assertEqual(2, len(self.cache.list()))
+        self.assertEqual(set(['uuid-1']), self.cache.take_stale())
+        self.assertEqual(set(), self.cache.take_stale())
+
+    def test_update(self):
+        self.cache.reconcile([self.entry1, self.entry2],
+                             self.cache.generation)
+        renamed = dict(self.entry1, name='instance-3')
+        self.cache.update('uuid-1', renamed, self.cache.generation)
+        self.assertIsNone(self.cache.get('instance-1'))
+        self.assertEqual(renamed, self.cache.get('instance-3'))
+        self.cache.update('uuid-2', None, self.cache.generation)
+        self.assertEqual([renamed], self.cache.list())
+
+    def test_update_stale_generation(self):
+        self.cache.reconcile([self.entry1], self.cache.generation)
+        generation = self.cache.generation
+        self.cache.clear()
+        self.cache.update('uuid-1', self.entry1, generation)
+        self.assertIsNone(self.cache.get('instance-1'))
+
+    @mock.patch('time.time')
+    def test_expire(self, mock_time):
+        self.flags(domain_cache_reconcile_interval=300, group='libvirt')
+        mock_time.return_value = 1000
+        self.cache.reconcile([self.entry1], self.cache.generation)
+        self.cache.invalidate(uuid='uuid-1')
+        mock_time.return_value = 1300
+        self.assertEqual([self.entry1], self.cache.list())
+        mock_time.return_value = 1301
+        self.assertIsNone(self.cache.list())
+        self.assertIsNone(self.cache.get('instance-1'))
+        self.assertEqual(set(), self.cache.take_stale())
+
+
+class SnapshotUploadFileTestCase(test.NoDBTestCase):
+    def setUp(self):
+        super(SnapshotUploadFileTestCase, self).setUp()
+        self.image_file = six.StringIO('x' * 100)
+        self.image_file.fileno = mock.Mock(return_value=3)
+        self.instance = {'uuid': 'fake-uuid'}
+
+    @mock.patch.object(os, 'fstat', return_value=mock.Mock(st_size=100))
+    @mock.patch.object(libvirt_driver.LOG, 'info')
+    def test_read_logs_progress(self, mock_info, mock_fstat):
+        upload_file = libvirt_driver.SnapshotUploadFile(self.image_file,
+                                                        self.instance)
+        self.assertEqual('x' * 5, upload_file.read(5))
+        self.assertFalse(mock_info.called)
+        upload_file.read(20)
+        upload_file.read(4)
+        upload_file.read()
+        self.assertEqual('', upload_file.read(10))
+        self.assertEqual([20, 100], [call[0][1]['progress']
+                                     for call in mock_info.call_args_list])
+
+    @mock.patch.object(os, 'fstat', return_value=mock.Mock(st_size=100))
+    def test_seek_and_tell(self, mock_fstat):
+        upload_file = libvirt_driver.SnapshotUploadFile(self.image_file,
+                                                        self.instance)
+        upload_file.seek(0, os.SEEK_END)
+        self.assertEqual(100, upload_file.tell())
+
+
 class HostStateTestCase(test.TestCase):
 
     cpu_info = ('{"vendor": "Intel", "model": "pentium", "arch": "i686", '
@@ -9581,6 +9855,14 @@ class HostStateTestCase(test.TestCase):
         self.assertEqual(stats["disk_available_least"], 80)
         self.assertEqual(jsonutils.loads(stats["pci_passthrough_devices"]),
                          HostStateTestCase.pci_devices)
+        self.assertNotIn('stats', stats)
+
+    @mock.patch('nova.virt.libvirt.imagepeer.get_stats')
+    def test_update_status_image_peer(self, get_stats_mock):
+        self.flags(image_peer_port=8776, image_peer_secret='secret',
+                   group='libvirt')
+        hs = libvirt_driver.HostState(self.FakeConnection())
+        self.assertEqual(get_stats_mock.return_value, hs._stats['stats'])
 
 
 class NWFilterFakes:
@@ -9885,6 +10167,88 @@ class IptablesFirewallTestCase(test.TestCase):
         self.fw.instance_info[instance_ref['id']] = (instance_ref, None)
         self.fw.do_refresh_security_group_rules("fake")
 
+    @mock.patch.object(objects.SecurityGroupList, 'get_by_instance')
+    def test_instance_rules_caches_security_group_rules(self, mock_get):
+        instance_ref = self._create_instance_ref()
+        network_info = _fake_network_info(self.stubs, 1)
+        mock_get.return_value = [{'id': 1}, {'id': 2}]
+        with mock.patch.object(self.fw, '_security_group_rules') as mock_sgr:
+            mock_sgr.side_effect = [(['-j ACCEPT -p tcp'], []),
+                                    (['-j ACCEPT -p udp'], ['-j ACCEPT'])]
+            first = self.fw.instance_rules(instance_ref, network_info)
+            second = self.fw.instance_rules(instance_ref, network_info)
+            self.assertEqual(2, mock_sgr.call_count)
+        self.assertEqual(first, second)
+        for ipv4_rules, ipv6_rules in (first, second):
+            self.assertEqual(['-j ACCEPT -p tcp', '-j ACCEPT -p udp',
+                              '-j $sg-fallback'], ipv4_rules[-3:])
+            self.assertEqual(['-j ACCEPT', '-j $sg-fallback'],
+                             ipv6_rules[-2:])
+        self.assertEqual((['-j ACCEPT -p tcp'], []),
+                         self.fw.security_group_rules[1])
+
+    @mock.patch.object(objects.SecurityGroupList, 'get_by_instance')
+    def test_instance_rules_refresh_security_groups(self, mock_get):
+        instance_ref = self._create_instance_ref()
+        network_info = _fake_network_info(self.stubs, 1)
+        mock_get.return_value = [{'id': 1}]
+        with mock.patch.object(self.fw, '_security_group_rules') as mock_sgr:
+            mock_sgr.return_value = ([], [])
+            self.fw.instance_rules(instance_ref, network_info)
+            self.fw.instance_rules(instance_ref, network_info,
+                                   refresh_security_groups=True)
+            self.assertEqual(2, mock_sgr.call_count)
+
+    @mock.patch.object(objects.SecurityGroupList, 'get_by_instance')
+    def test_unfilter_instance_drops_unused_security_groups(self, mock_get):
+        network_info = _fake_network_info(self.stubs, 1)
+        instance1 = self._create_instance_ref()
+        instance2 = self._create_instance_ref()
+        self.fw.instance_info = {instance1['id']: (instance1, network_info),
+                                 instance2['id']: (instance2, network_info)}
+        with mock.patch.object(self.fw, '_security_group_rules',
+                               return_value=([], [])):
+            mock_get.return_value = [{'id': 1}, {'id': 2}]
+            self.fw.instance_rules(instance1, network_info)
+            mock_get.return_value = [{'id': 2}]
+            self.fw.instance_rules(instance2, network_info)
+
+        with contextlib.nested(
+            mock.patch.object(self.fw, 'remove_filters_for_instance'),
+            mock.patch.object(self.fw.iptables, 'apply'),
+            mock.patch.object(self.fw.nwfilter, 'unfilter_instance')
+        ):
+            self.fw.unfilter_instance(instance1, network_info)
+            self.assertEqual([2], self.fw.security_group_rules.keys())
+            self.fw.unfilter_instance(instance2, network_info)
+            self.assertEqual({}, self.fw.security_group_rules)
+        self.assertEqual({}, self.fw.instance_security_groups)
+
+    def test_refresh_security_group_rules_clears_cache(self):
+        self.fw.security_group_rules = {1: ([], []), 2: ([], [])}
+        with contextlib.nested(
+            mock.patch.object(self.fw, 'do_refresh_security_group_rules'),
+            mock.patch.object(self.fw.iptables, 'apply')
+        ) as (mock_refresh, mock_apply):
+            self.fw.refresh_security_group_rules(1)
+            self.assertEqual({}, self.fw.security_group_rules)
+            self.fw.security_group_rules = {1: ([], [])}
+            self.fw.refresh_security_group_members(2)
+            self.assertEqual({}, self.fw.security_group_rules)
+            mock_refresh.assert_has_calls([mock.call(1), mock.call(2)])
+
+    def test_do_refresh_instance_rules_refreshes_security_groups(self):
+        instance_ref = {'id': 1, 'uuid': 'fake-uuid1'}
+        self.fw.instance_info = {1: (instance_ref, 'netinfo1')}
+        with contextlib.nested(
+            mock.patch.object(self.fw, 'instance_rules',
+                              return_value=([], [])),
+            mock.patch.object(self.fw, 'add_filters_for_instance')
+        ) as (mock_ir, mock_add):
+            self.fw.do_refresh_instance_rules(instance_ref)
+            mock_ir.assert_called_once_with(instance_ref, 'netinfo1',
+                                            refresh_security_groups=True)
+
     def test_do_refresh_security_group_rules_instance_disappeared(self):
         instance1 = {'id': 1, 'uuid': 'fake-uuid1'}
         instance2 = {'id': 2, 'uuid': 'fake-uuid2'}
@@ -11923,10 +12287,12 @@ class LibvirtVolumeUsageTestCase(test.TestCase):
                       'device_name': 'vda'}]
 
     def test_get_all_volume_usage(self):
-        def fake_block_stats(instance_name, disk):
-            return (169L, 688640L, 0L, 0L, -1L)
+        def fake_get_domain_stats():
+            stats = (169L, 688640L, 0L, 0L, -1L)
+            return {self.ins_ref['name']: {'block': {'vda': stats,
+                                                     'vde': stats}}}
 
-        self.stubs.Set(self.conn, 'block_stats', fake_block_stats)
+        self.stubs.Set(self.conn, '_get_domain_stats', fake_get_domain_stats)
         vol_usage = self.conn.get_all_volume_usage(self.c,
               [dict(instance=self.ins_ref, instance_bdms=self.bdms)])
 
@@ -11943,15 +12309,160 @@ class LibvirtVolumeUsageTestCase(test.TestCase):
         self.assertEqual(vol_usage, expected_usage)
 
     def test_get_all_volume_usage_device_not_found(self):
-        def fake_lookup(instance_name):
-            raise libvirt.libvirtError('invalid path')
+        def fake_get_domain_stats():
+            return {self.ins_ref['name']: {'block': {}}}
 
-        self.stubs.Set(self.conn, '_lookup_by_name', fake_lookup)
+        self.stubs.Set(self.conn, '_get_domain_stats', fake_get_domain_stats)
         vol_usage = self.conn.get_all_volume_usage(self.c,
               [dict(instance=self.ins_ref, instance_bdms=self.bdms)])
         self.assertEqual(vol_usage, [])
 
 
+class LibvirtDomainStatsTestCase(test.NoDBTestCase):
+    """Test for LibvirtDriver._get_domain_stats and its users."""
+
+    def setUp(self):
+        super(LibvirtDomainStatsTestCase, self).setUp()
+        self.conn = libvirt_driver.LibvirtDriver(fake.FakeVirtAPI(), False)
+        self.xml = """
+                <domain type='kvm'>
+                    <devices>
+                        <disk type='file'>
+                            <source file='filename'/>
+                            <target dev='vda' bus='virtio'/>
+                        </disk>
+                        <interface type='bridge'>
+                            <mac address='52:54:00:a4:38:38'/>
+                            <target dev='tap0'/>
+                        </interface>
+                    </devices>
+                </domain>
+            """
+        self.dom = FakeVirtDomain(fake_xml=self.xml, id=3,
+                                  name='instance00000001')
+        self.record = {'state.state': 1,
+                       'vcpu.current': 2,
+                       'vcpu.0.time': 15340000000L,
+                       'vcpu.1.time': 1640000000L,
+                       'block.count': 1,
+                       'block.0.name': 'vda',
+                       'block.0.rd.reqs': 169L,
+                       'block.0.rd.bytes': 688640L,
+                       'block.0.wr.reqs': 0L,
+                       'block.0.wr.bytes': 0L,
+                       'net.count': 1,
+                       'net.0.name': 'tap0',
+                       'net.0.rx.bytes': 4408L,
+                       'net.0.rx.pkts': 82L,
+                       'net.0.rx.errs': 0L,
+                       'net.0.rx.drop': 0L,
+                       'net.0.tx.bytes': 1024L,
+                       'net.0.tx.pkts': 12L,
+                       'net.0.tx.errs': 0L,
+                       'net.0.tx.drop': 0L}
+
+    def _mock_conn(self):
+        mock_conn = mock.Mock()
+        patcher = mock.patch.object(libvirt_driver.LibvirtDriver, '_conn',
+                                    new=mock_conn)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        return mock_conn
+
+    def test_get_domain_stats_bulk(self):
+        dom0 = FakeVirtDomain(id=0, name='Domain-0')
+        mock_conn = self._mock_conn()
+        mock_conn.getAllDomainStats.return_value = [(dom0, {}),
+                                                    (self.dom, self.record)]
+
+        stats = self.conn._get_domain_stats()
+
+        mock_conn.getAllDomainStats.assert_called_once_with(
+            libvirt_driver.BULK_DOMAIN_STATS,
+            libvirt_driver.VIR_CONNECT_GET_ALL_DOMAINS_STATS_ACTIVE)
+        self.assertEqual(['instance00000001'], stats.keys())
+        dom_stats = stats['instance00000001']
+        self.assertEqual(self.dom, dom_stats['domain'])
+        self.assertEqual([15340000000L, 1640000000L],
+                         dom_stats['vcpu_times'])
+        self.assertEqual({'vda': (169L, 688640L, 0L, 0L, -1)},
+                         dom_stats['block'])
+        self.assertEqual({'tap0': (4408L, 82L, 0L, 0L, 1024L, 12L, 0L, 0L)},
+                         dom_stats['net'])
+
+    def test_get_domain_stats_bulk_domains(self):
+        mock_conn = self._mock_conn()
+        mock_conn.domainListGetStats.return_value = [(self.dom, self.record)]
+
+        stats = self.conn._get_domain_stats([self.dom])
+
+        mock_conn.domainListGetStats.assert_called_once_with(
+            [self.dom], libvirt_driver.BULK_DOMAIN_STATS)
+        self.assertEqual(['instance00000001'], stats.keys())
+
+    def test_get_domain_stats_slow(self):
+        self.dom.vcpus = mock.Mock(return_value=(
+            [(0, 1, 15340000000L, 0), (1, 1, 1640000000L, 0)], []))
+        self.dom.blockStats = mock.Mock(
+            return_value=(169L, 688640L, 0L, 0L, -1))
+        self.dom.interfaceStats = mock.Mock(
+            side_effect=libvirt.libvirtError('not supported'))
+        mock_conn = self._mock_conn()
+        mock_conn.getAllDomainStats.side_effect = AttributeError
+
+        with mock.patch.object(self.conn, '_list_instance_domains',
+                               return_value=[self.dom]):
+            stats = self.conn._get_domain_stats()
+            self.conn._get_domain_stats()
+
+        self.assertEqual(1, mock_conn.getAllDomainStats.call_count)
+        dom_stats = stats['instance00000001']
+        self.assertEqual([15340000000L, 1640000000L],
+                         dom_stats['vcpu_times'])
+        self.assertEqual({'vda': (169L, 688640L, 0L, 0L, -1)},
+                         dom_stats['block'])
+        self.assertEqual({}, dom_stats['net'])
+
+    def _test_get_domain_stats_bulk_error(self, error_code, disabled):
+        mock_conn = self._mock_conn()
+        mock_conn.getAllDomainStats.side_effect = (
+            fakelibvirt.make_libvirtError(libvirt.libvirtError, 'error',
+                                          error_code=error_code))
+
+        with mock.patch.object(self.conn, '_list_instance_domains',
+                               return_value=[]):
+            self.assertEqual({}, self.conn._get_domain_stats())
+            self.assertEqual({}, self.conn._get_domain_stats())
+
+        self.assertEqual(disabled, self.conn._skip_bulk_domain_stats)
+        self.assertEqual(1 if disabled else 2,
+                         mock_conn.getAllDomainStats.call_count)
+
+    def test_get_domain_stats_bulk_no_support(self):
+        self._test_get_domain_stats_bulk_error(libvirt.VIR_ERR_NO_SUPPORT,
+                                               True)
+
+    def test_get_domain_stats_bulk_no_domain(self):
+        self._test_get_domain_stats_bulk_error(libvirt.VIR_ERR_NO_DOMAIN,
+                                               False)
+
+    def test_get_domain_stats_bulk_other_error(self):
+        self._test_get_domain_stats_bulk_error(
+            libvirt.VIR_ERR_INTERNAL_ERROR, False)
+
+    def test_get_all_bw_counters(self):
+        mock_conn = self._mock_conn()
+        mock_conn.getAllDomainStats.return_value = [(self.dom, self.record)]
+        instances = [{'name': 'instance00000001', 'uuid': 'fake-uuid'},
+                     {'name': 'instance00000002', 'uuid': 'other-uuid'}]
+
+        self.assertEqual([{'uuid': 'fake-uuid',
+                           'mac_address': '52:54:00:a4:38:38',
+                           'bw_in': 4408L,
+                           'bw_out': 1024L}],
+                         self.conn.get_all_bw_counters(instances))
+
+
 class LibvirtNonblockingTestCase(test.TestCase):
     """Test libvirtd calls are nonblocking."""
 
@@ -19,6 +19,8 @@ import os
 import shutil
 import tempfile
 
+import eventlet
+from eventlet import event
 import fixtures
 import mock
 from oslo.config import cfg
@@ -135,6 +137,21 @@ class RawTestCase(_ImageTestCase, test.NoDBTestCase):
         self.mox.StubOutWithMock(imagebackend.disk, 'extend')
         return fn
 
+    def test_cache_fetched_by_other_verifies_size(self):
+        fn = mock.Mock()
+        image = self.image_class(self.INSTANCE, self.NAME)
+        self.mock_create_image(image)
+        with contextlib.nested(
+                mock.patch.object(imagebackend, '_fetch_once',
+                                  return_value=False),
+                mock.patch.object(image, 'verify_base_size')
+        ) as (mock_fetch_once, mock_verify):
+            image.cache(fn, self.TEMPLATE, image_id='fake_image',
+                        max_size=self.SIZE)
+
+        self.assertFalse(fn.called)
+        mock_verify.assert_called_once_with(self.TEMPLATE_PATH, self.SIZE)
+
     def test_cache(self):
         self.mox.StubOutWithMock(os.path, 'exists')
         if self.OLD_STYLE_INSTANCE_PATH:
@@ -257,6 +274,26 @@ class RawTestCase(_ImageTestCase, test.NoDBTestCase):
         driver_format = image.resolve_driver_format()
         self.assertEqual(driver_format, 'raw')
 
+    def test_snapshot_extract_raw(self):
+        image = self.image_class(self.INSTANCE, self.NAME)
+        with contextlib.nested(
+                mock.patch.object(imagebackend.libvirt_utils, 'copy_image'),
+                mock.patch.object(imagebackend.images, 'convert_image')
+        ) as (mock_copy, mock_convert):
+            image.snapshot_extract('target', 'raw')
+        mock_copy.assert_called_once_with(image.path, 'target')
+        self.assertFalse(mock_convert.called)
+
+    def test_snapshot_extract_convert(self):
+        image = self.image_class(self.INSTANCE, self.NAME)
+        with contextlib.nested(
+                mock.patch.object(imagebackend.libvirt_utils, 'copy_image'),
+                mock.patch.object(imagebackend.images, 'convert_image')
+        ) as (mock_copy, mock_convert):
+            image.snapshot_extract('target', 'qcow2')
+        mock_convert.assert_called_once_with(image.path, 'target', 'qcow2')
+        self.assertFalse(mock_copy.called)
+
 
 class Qcow2TestCase(_ImageTestCase, test.NoDBTestCase):
     SIZE = units.Gi
@@ -1232,6 +1269,51 @@ class RbdTestCase(_ImageTestCase, test.NoDBTestCase):
         self.assertEqual(image.path, rbd_path)
 
 
+class FetchOnceTestCase(test.NoDBTestCase):
+    TARGET = '/fake/_base/fake_image'
+
+    def _start_fetch(self):
+        started = event.Event()
+        finish = event.Event()
+
+        def fetch():
+            started.send()
+            error = finish.wait()
+            if error:
+                raise error
+        thread = eventlet.spawn(imagebackend._fetch_once, self.TARGET, fetch)
+        started.wait()
+        return thread, finish
+
+    def test_fetch(self):
+        fetch = mock.Mock()
+        self.assertTrue(imagebackend._fetch_once(self.TARGET, fetch))
+        fetch.assert_called_once_with()
+        self.assertEqual({}, imagebackend._fetches_in_flight)
+
+    def test_concurrent_fetch_waits(self):
+        thread, finish = self._start_fetch()
+        fetch = mock.Mock()
+        waiter = eventlet.spawn(imagebackend._fetch_once, self.TARGET, fetch)
+        eventlet.sleep(0)
+        finish.send(None)
+        self.assertTrue(thread.wait())
+        self.assertFalse(waiter.wait())
+        self.assertFalse(fetch.called)
+        self.assertEqual({}, imagebackend._fetches_in_flight)
+
+    def test_concurrent_fetch_refetches_after_failure(self):
+        thread, finish = self._start_fetch()
+        fetch = mock.Mock()
+        waiter = eventlet.spawn(imagebackend._fetch_once, self.TARGET, fetch)
+        eventlet.sleep(0)
+        finish.send(exception.FlavorDiskTooSmall())
+        self.assertRaises(exception.FlavorDiskTooSmall, thread.wait)
+        self.assertTrue(waiter.wait())
+        fetch.assert_called_once_with()
+        self.assertEqual({}, imagebackend._fetches_in_flight)
+
+
 class BackendTestCase(test.NoDBTestCase):
     INSTANCE = {'name': 'fake-instance',
                 'uuid': uuidutils.generate_uuid()}
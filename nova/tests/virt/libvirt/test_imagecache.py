@@ -20,6 +20,8 @@ import hashlib
 import os
 import time
 
+import eventlet
+import mock
 from oslo.config import cfg
 
 from nova import conductor
@@ -513,6 +515,43 @@ class ImageCacheManagerTestCase(test.NoDBTestCase):
             self.assertEqual(image_cache_manager.corrupt_base_files,
                              [fname])
 
+    def test_handle_base_image_used_hashed_once(self):
+        self.flags(checksum_base_images=True, checksum_interval_seconds=0,
+                   group='libvirt')
+        self.stubs.Set(libvirt_utils, 'chown', lambda x, y: None)
+
+        with self._make_base_file() as fname:
+            os.utime(fname, (-1, time.time() - 3601))
+
+            with mock.patch.object(imagecache, '_hash_file',
+                                   wraps=imagecache._hash_file) as mock_hash:
+                for _pass in range(2):
+                    image_cache_manager = imagecache.ImageCacheManager()
+                    image_cache_manager.used_images = {
+                        '123': (1, 0, ['banana-42'])}
+                    image_cache_manager._handle_base_image('123', fname)
+                    self.assertEqual([],
+                                     image_cache_manager.corrupt_base_files)
+
+            self.assertEqual(1, mock_hash.call_count)
+
+    def test_handle_base_image_checksum_fails_in_pool(self):
+        self.flags(checksum_base_images=True, group='libvirt')
+        self.stubs.Set(libvirt_utils, 'chown', lambda x, y: None)
+
+        with self._make_base_file() as fname:
+            image_cache_manager = imagecache.ImageCacheManager()
+            image_cache_manager.unexplained_images = [fname]
+            image_cache_manager.used_images = {'123': (1, 0, ['banana-42'])}
+            image_cache_manager.checksum_pool = eventlet.GreenPool(1)
+            self.stubs.Set(image_cache_manager, '_verify_checksum',
+                           lambda img_id, base_file: False)
+            image_cache_manager._handle_base_image('123', fname)
+            image_cache_manager.checksum_pool.waitall()
+
+            self.assertEqual(image_cache_manager.corrupt_base_files,
+                             [fname])
+
     def test_verify_base_images(self):
         hashed_1 = '356a192b7913b04c54574d18c28d46e6395428ab'
         hashed_21 = '472b07b9fcf2c2451e8781e944bf5f77cd8457c8'
@@ -870,6 +909,46 @@ class VerifyChecksumTestCase(test.NoDBTestCase):
                 log = stream.getvalue()
                 self.assertNotEqual(log.find('image verification failed'), -1)
 
+    def test_verify_checksum_skips_unchanged_file(self):
+        with utils.tempdir() as tmpdir:
+            image_cache_manager, fname = self._check_body(tmpdir, "csum valid")
+            imagecache.write_stored_info(fname, field='sha1-stat',
+                                         value=imagecache._file_stat(fname))
+            self.flags(checksum_interval_seconds=0, group='libvirt')
+            with mock.patch.object(imagecache, '_hash_file') as mock_hash:
+                res = image_cache_manager._verify_checksum(self.img, fname)
+                self.assertFalse(mock_hash.called)
+            self.assertTrue(res)
+
+    def test_verify_checksum_records_verified_stat(self):
+        with utils.tempdir() as tmpdir:
+            image_cache_manager, fname = self._check_body(tmpdir, "csum valid")
+            self.flags(checksum_interval_seconds=0, group='libvirt')
+            res = image_cache_manager._verify_checksum(self.img, fname)
+            self.assertTrue(res)
+            self.assertEqual(imagecache._file_stat(fname),
+                             imagecache.read_stored_info(fname,
+                                                         field='sha1-stat'))
+
+            # Changing the file makes it get hashed again
+            with open(fname, 'a') as f:
+                f.write('more')
+            res = image_cache_manager._verify_checksum(self.img, fname)
+            self.assertFalse(res)
+
+    def test_hash_file_throttled(self):
+        self.flags(checksum_max_bandwidth=1, group='libvirt')
+        self.stubs.Set(imagecache, '_HASH_CHUNK_SIZE', 1024)
+        with utils.tempdir() as tmpdir:
+            fname = os.path.join(tmpdir, 'aaa')
+            with open(fname, 'w') as f:
+                f.write('x' * 4096)
+            with mock.patch.object(time, 'sleep') as mock_sleep:
+                checksum = imagecache._hash_file(fname)
+            self.assertEqual(hashlib.sha1('x' * 4096).hexdigest(), checksum)
+            self.assertEqual(4, mock_sleep.call_count)
+            self.assertTrue(mock_sleep.call_args_list[-1][0][0] > 0)
+
     def test_verify_checksum_file_missing(self):
         with utils.tempdir() as tmpdir:
             self.flags(instances_path=tmpdir)
@@ -0,0 +1,132 @@
+# Copyright 2014 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import hashlib
+import os
+
+import fixtures
+import mock
+import webob
+
+from nova import test
+from nova.virt.libvirt import imagepeer
+
+
+class ImagePeerTestCase(test.NoDBTestCase):
+
+    FNAME = hashlib.sha1('image-id').hexdigest()
+
+    def setUp(self):
+        super(ImagePeerTestCase, self).setUp()
+        instances_path = self.useFixture(fixtures.TempDir()).path
+        self.flags(instances_path=instances_path, my_ip='10.0.0.1')
+        self.flags(image_peer_port=8776, image_peer_secret='secret',
+                   group='libvirt')
+        self.base_dir = os.path.join(instances_path, '_base')
+        os.mkdir(self.base_dir)
+        self.app = imagepeer.ImagePeerApp()
+
+    def _make_base_file(self, fname, data='image data'):
+        with open(os.path.join(self.base_dir, fname), 'w') as f:
+            f.write(data)
+
+    def _request(self, fname, expires=None, signature=None):
+        if expires is None:
+            expires = 2000000000
+        if signature is None:
+            signature = imagepeer._signature(fname, expires)
+        req = webob.Request.blank('/images/%s' % fname)
+        req.headers['X-Image-Expires'] = str(expires)
+        req.headers['X-Image-Signature'] = signature
+        return req.get_response(self.app)
+
+    def test_enabled(self):
+        self.assertTrue(imagepeer.enabled())
+        self.flags(image_peer_secret=None, group='libvirt')
+        self.assertFalse(imagepeer.enabled())
+
+    def test_get_stats(self):
+        other = hashlib.sha1('other').hexdigest()
+        for fname in (other, self.FNAME, self.FNAME + '_10',
+                      self.FNAME + '.info', 'ephemeral_10_default'):
+            self._make_base_file(fname)
+
+        stats = imagepeer.get_stats()
+
+        self.assertEqual('http://10.0.0.1:8776', stats['image_peer_url'])
+        self.assertEqual(','.join(sorted([other, self.FNAME])),
+                         stats['cached_images'])
+
+    def test_serve(self):
+        self._make_base_file(self.FNAME)
+        resp = self._request(self.FNAME)
+        self.assertEqual(200, resp.status_int)
+        self.assertEqual('image data', resp.body)
+        self.assertEqual(10, resp.content_length)
+
+    def test_serve_missing(self):
+        resp = self._request(self.FNAME)
+        self.assertEqual(404, resp.status_int)
+
+    def test_serve_bad_path(self):
+        resp = self._request('../' + self.FNAME)
+        self.assertEqual(404, resp.status_int)
+
+    def test_serve_bad_signature(self):
+        self._make_base_file(self.FNAME)
+        resp = self._request(self.FNAME, signature='bad')
+        self.assertEqual(403, resp.status_int)
+
+    def test_serve_expired(self):
+        self._make_base_file(self.FNAME)
+        resp = self._request(self.FNAME, expires=1)
+        self.assertEqual(403, resp.status_int)
+
+    @mock.patch('time.time', return_value=1000)
+    @mock.patch('httplib.HTTPConnection')
+    def test_fetch(self, conn_mock, time_mock):
+        dst_path = os.path.join(self.base_dir, 'dst')
+        resp = conn_mock.return_value.getresponse.return_value
+        resp.status = 200
+        resp.getheader.return_value = '10'
+        resp.read.side_effect = ['image ', 'data', '']
+
+        md5 = imagepeer.fetch('http://10.0.0.2:8776', self.FNAME, dst_path)
+
+        self.assertEqual(hashlib.md5('image data').hexdigest(), md5)
+        conn_mock.assert_called_once_with('10.0.0.2', 8776, timeout=60)
+        conn_mock.return_value.request.assert_called_once_with(
+            'GET', '/images/%s' % self.FNAME,
+            headers={'X-Image-Expires': '1060',
+                     'X-Image-Signature': imagepeer._signature(self.FNAME,
+                                                               1060)})
+        with open(dst_path) as f:
+            self.assertEqual('image data', f.read())
+
+    @mock.patch('httplib.HTTPConnection')
+    def test_fetch_short_read(self, conn_mock):
+        resp = conn_mock.return_value.getresponse.return_value
+        resp.status = 200
+        resp.getheader.return_value = '10'
+        resp.read.side_effect = ['image ', '']
+        self.assertRaises(IOError, imagepeer.fetch, 'http://10.0.0.2:8776',
+                          self.FNAME, os.path.join(self.base_dir, 'dst'))
+
+    @mock.patch('httplib.HTTPConnection')
+    def test_fetch_refused(self, conn_mock):
+        resp = conn_mock.return_value.getresponse.return_value
+        resp.status = 403
+        self.assertRaises(IOError, imagepeer.fetch, 'http://10.0.0.2:8776',
+                          self.FNAME, os.path.join(self.base_dir, 'dst'))
@@ -47,11 +47,116 @@ blah BLAH: bb
         disk_type = libvirt_utils.get_disk_type(path)
         self.assertEqual(disk_type, 'raw')
 
+    _reflink_call = functools.partial(mock.call, 'env', 'LC_ALL=C', 'LANG=C',
+                                      'cp', '--reflink=always')
+
+    def _stub_devices(self, devices):
+        self.stubs.Set(libvirt_utils, '_reflink_unsupported', set())
+        real_stat = os.stat
+
+        def fake_stat(path):
+            if path in devices:
+                return mock.Mock(st_dev=devices[path])
+            return real_stat(path)
+
+        self.stubs.Set(os, 'stat', fake_stat)
+
     @mock.patch('nova.utils.execute')
     def test_copy_image_local_cp(self, mock_execute):
+        self._stub_devices({'src': 1, '.': 2})
+        mock_execute.side_effect = [
+            processutils.ProcessExecutionError(
+                stderr="cp: failed to clone 'dest' from 'src': "
+                       "Operation not supported"),
+            mock.DEFAULT,
+        ]
+
+        libvirt_utils.copy_image('src', 'dest')
+
+        mock_execute.assert_has_calls([
+            self._reflink_call('src', 'dest'),
+            mock.call('cp', 'src', 'dest'),
+        ])
+        self.assertEqual(2, mock_execute.call_count)
+
+        # Reflink copies are not tried again between the same file systems
+        mock_execute.reset_mock()
+        mock_execute.side_effect = None
         libvirt_utils.copy_image('src', 'dest')
         mock_execute.assert_called_once_with('cp', 'src', 'dest')
 
+    @mock.patch('nova.utils.execute')
+    def test_copy_image_local_cp_per_file_systems(self, mock_execute):
+        self._stub_devices({'src': 1, 'other_src': 3, '.': 2})
+        mock_execute.side_effect = [
+            processutils.ProcessExecutionError(
+                stderr="cp: failed to clone 'dest' from 'src': "
+                       "Invalid cross-device link"),
+            mock.DEFAULT,
+            mock.DEFAULT,
+        ]
+
+        libvirt_utils.copy_image('src', 'dest')
+        libvirt_utils.copy_image('other_src', 'dest')
+
+        self.assertEqual(set([(1, 2)]), libvirt_utils._reflink_unsupported)
+        mock_execute.assert_has_calls([
+            self._reflink_call('src', 'dest'),
+            mock.call('cp', 'src', 'dest'),
+            self._reflink_call('other_src', 'dest'),
+        ])
+        self.assertEqual(3, mock_execute.call_count)
+
+    @mock.patch('nova.utils.execute')
+    def test_copy_image_local_cp_without_reflink(self, mock_execute):
+        self._stub_devices({'src': 1, '.': 1})
+        mock_execute.side_effect = [
+            processutils.ProcessExecutionError(
+                stderr="cp: unrecognized option '--reflink=always'"),
+            mock.DEFAULT,
+            mock.DEFAULT,
+        ]
+
+        libvirt_utils.copy_image('src', 'dest')
+        libvirt_utils.copy_image('src', 'dest')
+
+        self.assertEqual(set([(1, 1)]), libvirt_utils._reflink_unsupported)
+        mock_execute.assert_has_calls([
+            self._reflink_call('src', 'dest'),
+            mock.call('cp', 'src', 'dest'),
+            mock.call('cp', 'src', 'dest'),
+        ])
+        self.assertEqual(3, mock_execute.call_count)
+
+    @mock.patch('nova.utils.execute')
+    def test_copy_image_local_cp_other_error(self, mock_execute):
+        self._stub_devices({'src': 1, '.': 1})
+        mock_execute.side_effect = [
+            processutils.ProcessExecutionError(
+                stderr="cp: error writing 'dest': No space left on device"),
+            mock.DEFAULT,
+            mock.DEFAULT,
+        ]
+
+        libvirt_utils.copy_image('src', 'dest')
+        libvirt_utils.copy_image('src', 'dest')
+
+        self.assertEqual(set(), libvirt_utils._reflink_unsupported)
+        mock_execute.assert_has_calls([
+            self._reflink_call('src', 'dest'),
+            mock.call('cp', 'src', 'dest'),
+            self._reflink_call('src', 'dest'),
+        ])
+        self.assertEqual(3, mock_execute.call_count)
+
+    @mock.patch('nova.utils.execute')
+    def test_copy_image_local_reflink(self, mock_execute):
+        self._stub_devices({'src': 1, '.': 1})
+        libvirt_utils.copy_image('src', 'dest')
+        mock_execute.assert_called_once_with('env', 'LC_ALL=C', 'LANG=C',
+                                             'cp', '--reflink=always',
+                                             'src', 'dest')
+
     _rsync_call = functools.partial(mock.call,
                                     'rsync', '--sparse', '--compress')
 
@@ -12,8 +12,15 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import os
+import struct
 
+import fixtures
+import mock
+
+from nova.openstack.common import units
 from nova import test
+from nova import utils
 from nova.virt import images
 
 
@@ -22,3 +29,84 @@ class QemuTestCase(test.NoDBTestCase):
         image_info = images.qemu_img_info("/path/that/does/not/exist")
         self.assertTrue(image_info)
         self.assertTrue(str(image_info))
+
+
+class ImageInfoTestCase(test.NoDBTestCase):
+    def setUp(self):
+        super(ImageInfoTestCase, self).setUp()
+        self.tmpdir = self.useFixture(fixtures.TempDir()).path
+
+    def _write(self, name, data):
+        path = os.path.join(self.tmpdir, name)
+        with open(path, 'wb') as f:
+            f.write(data)
+        return path
+
+    def _qcow2(self, name, size, backing_file=None, version=2,
+               crypt_method=0, nb_snapshots=0, incompatible=0):
+        backing_file_offset = 0
+        if backing_file:
+            backing_file_offset = 512
+        header = images._QCOW2_HEADER.pack(
+            images._QCOW_MAGIC, version, backing_file_offset,
+            len(backing_file or ''), 16, size, crypt_method, 0, 0, 0, 0,
+            nb_snapshots, 0)
+        header += struct.pack('>Q', incompatible)
+        header = header.ljust(512, '\0') + (backing_file or '')
+        return self._write(name, header)
+
+    def test_qcow2(self):
+        path = self._qcow2('disk', 10 * units.Gi, backing_file='/base/img')
+        with mock.patch.object(utils, 'execute') as mock_execute:
+            info = images.qemu_img_info(path)
+            self.assertFalse(mock_execute.called)
+        self.assertEqual(path, info.image)
+        self.assertEqual('qcow2', info.file_format)
+        self.assertEqual(10 * units.Gi, info.virtual_size)
+        self.assertEqual(65536, info.cluster_size)
+        self.assertEqual('/base/img', info.backing_file)
+        self.assertEqual(os.stat(path).st_blocks * 512, info.disk_size)
+
+    def test_qcow2_relative_backing_file(self):
+        path = self._qcow2('disk', units.Gi, backing_file='base', version=3)
+        info = images._read_image_info(path)
+        self.assertEqual(os.path.join(self.tmpdir, 'base'),
+                         info.backing_file)
+
+    def test_qcow2_without_backing_file(self):
+        info = images._read_image_info(self._qcow2('disk', units.Gi))
+        self.assertIsNone(info.backing_file)
+
+    def test_qcow2_left_to_qemu_img(self):
+        for kwargs in ({'crypt_method': 1}, {'nb_snapshots': 1},
+                       {'version': 3, 'incompatible': 1}, {'version': 1}):
+            path = self._qcow2('disk', units.Gi, **kwargs)
+            self.assertIsNone(images._read_image_info(path))
+
+    def test_raw(self):
+        path = self._write('disk', 'x' * 4096)
+        info = images._read_image_info(path)
+        self.assertEqual('raw', info.file_format)
+        self.assertEqual(4096, info.virtual_size)
+
+    def test_other_formats_left_to_qemu_img(self):
+        for data in ('KDMV' + '\0' * 508, 'conectix' + '\0' * 504,
+                     '# Disk DescriptorFile\n',
+                     '\0' * 64 + images._VDI_MAGIC + '\0' * 444):
+            path = self._write('disk', data)
+            self.assertIsNone(images._read_image_info(path))
+        self.assertIsNone(images._read_image_info(
+            self._write('disk.dmg', '\0' * 512)))
+        self.assertIsNone(images._read_image_info(
+            os.path.join(self.tmpdir, 'missing')))
+
+    @mock.patch.object(utils, 'execute')
+    def test_qemu_img_info_falls_back(self, mock_execute):
+        path = self._write('disk', 'KDMV' + '\0' * 508)
+        mock_execute.return_value = ('image: %s\nfile format: vmdk\n'
+                                     'virtual size: 1.0G (1073741824 bytes)\n'
+                                     % path, '')
+        info = images.qemu_img_info(path)
+        mock_execute.assert_called_once_with('env', 'LC_ALL=C', 'LANG=C',
+                                             'qemu-img', 'info', path)
+        self.assertEqual('vmdk', info.file_format)
@@ -32,6 +32,7 @@ import socket
 import struct
 import sys
 import tempfile
+import time
 from xml.sax import saxutils
 
 import eventlet
@@ -813,6 +814,74 @@ class UndoManager(object):
             self._rollback()
 
 
+class ImportProfiler(object):
+    """Records the time spent importing each module while it is active.
+
+    Usable as a context manager. The time of an import is recorded for the
+    modules it added to sys.modules, by their full dotted name. When one
+    import loads several of them, like a package and one of its submodules,
+    its time is shared evenly between them. The cumulative time of a module
+    includes the modules it imports, its own time does not.
+    """
+    def __init__(self):
+        self.times = {}
+        self._nested = []
+        self._known = set()
+        self._import = None
+
+    def __enter__(self):
+        self._known = set(sys.modules)
+        self._import = six.moves.builtins.__import__
+        six.moves.builtins.__import__ = self._profiled_import
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        six.moves.builtins.__import__ = self._import
+
+    def _profiled_import(self, *args, **kwargs):
+        # NOTE: modules are added to sys.modules before they are executed,
+        # so those added since the last check belong to the import that
+        # was running, not to the nested one starting now.
+        loaded = self._loaded_modules()
+        if self._nested:
+            self._nested[-1][1].extend(loaded)
+
+        self._nested.append([0.0, []])
+        start = time.time()
+        try:
+            return self._import(*args, **kwargs)
+        finally:
+            elapsed = time.time() - start
+            nested, loaded = self._nested.pop()
+            loaded.extend(self._loaded_modules())
+            if self._nested:
+                self._nested[-1][0] += elapsed
+            for name in loaded:
+                cumulative, own = self.times.get(name, (0.0, 0.0))
+                self.times[name] = (cumulative + elapsed / len(loaded),
+                                    own + (elapsed - nested) / len(loaded))
+
+    def _loaded_modules(self):
+        """Returns the modules added to sys.modules since the last call."""
+        if len(sys.modules) == len(self._known):
+            return []
+        modules = set(sys.modules)
+        added = modules - self._known
+        self._known = modules
+        # NOTE: failed implicit relative imports leave None in sys.modules
+        return [name for name in added if sys.modules[name] is not None]
+
+    def report(self, limit=None):
+        """Returns the lines of a report of the slowest imports first."""
+        times = sorted(self.times.iteritems(), key=lambda item: item[1],
+                       reverse=True)
+        lines = ['%10s %10s  %s' % ('cumul. ms', 'self ms', 'module')]
+        for name, (cumulative, own) in times[:limit]:
+            lines.append('%10.1f %10.1f  %s' % (cumulative * 1000, own * 1000,
+                                                name))
+        return lines
+
+
 def mkfs(fs, path, label=None, run_as_root=False):
     """Format a file or block device
 
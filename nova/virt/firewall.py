@@ -143,6 +143,10 @@ class IptablesFirewallDriver(FirewallDriver):
         self.iptables = linux_net.iptables_manager
         self.instance_info = {}
         self.basically_filtered = False
+        # Rendered (ipv4_rules, ipv6_rules) of security groups by group id
+        self.security_group_rules = {}
+        # Security group ids of the filtered instances by instance id
+        self.instance_security_groups = {}
 
         # Flags for DHCP request rule
         self.dhcp_create = False
@@ -167,6 +171,7 @@ class IptablesFirewallDriver(FirewallDriver):
         self.iptables.defer_apply_off()
 
     def unfilter_instance(self, instance, network_info):
+        self._forget_security_groups(instance)
         if self.instance_info.pop(instance['id'], None):
             self.remove_filters_for_instance(instance)
             self.iptables.apply()
@@ -174,6 +179,22 @@ class IptablesFirewallDriver(FirewallDriver):
             LOG.info(_('Attempted to unfilter instance which is not '
                      'filtered'), instance=instance)
 
+    def _forget_security_groups(self, instance):
+        """Drop the rendered rules of the security groups of instance that
+        no other filtered instance is in.
+
+        Refreshes are only signalled to the hosts running instances of the
+        groups concerned, so once the last of them leaves, the rendered
+        rules of a group could go stale unnoticed.
+        """
+        security_groups = self.instance_security_groups.pop(instance['id'],
+                                                            [])
+        in_use = set()
+        for group_ids in self.instance_security_groups.itervalues():
+            in_use.update(group_ids)
+        for group_id in set(security_groups) - in_use:
+            self.security_group_rules.pop(group_id, None)
+
     def prepare_instance_filter(self, instance, network_info):
         self.instance_info[instance['id']] = (instance, network_info)
         ipv4_rules, ipv6_rules = self.instance_rules(instance, network_info)
@@ -328,7 +349,67 @@ class IptablesFirewallDriver(FirewallDriver):
                     '--dports', '%s:%s' % (rule['from_port'],
                                            rule['to_port'])]
 
-    def instance_rules(self, instance, network_info):
+    def _security_group_rules(self, ctxt, security_group):
+        """Render the rules of a security group for ipv4 and ipv6."""
+        ipv4_rules = []
+        ipv6_rules = []
+        rules = objects.SecurityGroupRuleList.get_by_security_group(
+                ctxt, security_group)
+
+        for rule in rules:
+            if not rule['cidr']:
+                version = 4
+            else:
+                version = netutils.get_ip_version(rule['cidr'])
+
+            if version == 4:
+                fw_rules = ipv4_rules
+            else:
+                fw_rules = ipv6_rules
+
+            protocol = rule['protocol']
+
+            if protocol:
+                protocol = rule['protocol'].lower()
+
+            if version == 6 and protocol == 'icmp':
+                protocol = 'icmpv6'
+
+            args = ['-j ACCEPT']
+            if protocol:
+                args += ['-p', protocol]
+
+            if protocol in ['udp', 'tcp']:
+                args += self._build_tcp_udp_rule(rule, version)
+            elif protocol == 'icmp':
+                args += self._build_icmp_rule(rule, version)
+            if rule['cidr']:
+                args += ['-s', str(rule['cidr'])]
+                fw_rules += [' '.join(args)]
+            else:
+                if rule['grantee_group']:
+                    insts = (
+                        objects.InstanceList.get_by_security_group(
+                            ctxt, rule['grantee_group']))
+                    for instance in insts:
+                        if instance['info_cache']['deleted']:
+                            LOG.debug('ignoring deleted cache')
+                            continue
+                        nw_info = compute_utils.get_nw_info_for_instance(
+                                instance)
+
+                        ips = [ip['address']
+                            for ip in nw_info.fixed_ips()
+                                if ip['version'] == version]
+
+                        LOG.debug('ips: %r', ips, instance=instance)
+                        for ip in ips:
+                            subrule = args + ['-s %s' % ip]
+                            fw_rules += [' '.join(subrule)]
+        return ipv4_rules, ipv6_rules
+
+    def instance_rules(self, instance, network_info,
+                       refresh_security_groups=False):
         ctxt = context.get_admin_context()
         if isinstance(instance, dict):
             # NOTE(danms): allow old-world instance objects from
@@ -357,62 +438,21 @@ class IptablesFirewallDriver(FirewallDriver):
 
         security_groups = objects.SecurityGroupList.get_by_instance(
             ctxt, instance)
+        self.instance_security_groups[instance['id']] = [
+            security_group['id'] for security_group in security_groups]
 
-        # then, security group chains and rules
+        # then, security group chains and rules. The rules of a group are
+        # only rendered again once they or its grantee groups may have
+        # changed, which is signalled by one of the refresh calls.
         for security_group in security_groups:
-            rules = objects.SecurityGroupRuleList.get_by_security_group(
-                    ctxt, security_group)
-
-            for rule in rules:
-                if not rule['cidr']:
-                    version = 4
-                else:
-                    version = netutils.get_ip_version(rule['cidr'])
-
-                if version == 4:
-                    fw_rules = ipv4_rules
-                else:
-                    fw_rules = ipv6_rules
-
-                protocol = rule['protocol']
-
-                if protocol:
-                    protocol = rule['protocol'].lower()
-
-                if version == 6 and protocol == 'icmp':
-                    protocol = 'icmpv6'
-
-                args = ['-j ACCEPT']
-                if protocol:
-                    args += ['-p', protocol]
-
-                if protocol in ['udp', 'tcp']:
-                    args += self._build_tcp_udp_rule(rule, version)
-                elif protocol == 'icmp':
-                    args += self._build_icmp_rule(rule, version)
-                if rule['cidr']:
-                    args += ['-s', str(rule['cidr'])]
-                    fw_rules += [' '.join(args)]
-                else:
-                    if rule['grantee_group']:
-                        insts = (
-                            objects.InstanceList.get_by_security_group(
-                                ctxt, rule['grantee_group']))
-                        for instance in insts:
-                            if instance['info_cache']['deleted']:
-                                LOG.debug('ignoring deleted cache')
-                                continue
-                            nw_info = compute_utils.get_nw_info_for_instance(
-                                    instance)
-
-                            ips = [ip['address']
-                                for ip in nw_info.fixed_ips()
-                                    if ip['version'] == version]
-
-                            LOG.debug('ips: %r', ips, instance=instance)
-                            for ip in ips:
-                                subrule = args + ['-s %s' % ip]
-                                fw_rules += [' '.join(subrule)]
+            if (refresh_security_groups or
+                    security_group['id'] not in self.security_group_rules):
+                self.security_group_rules[security_group['id']] = (
+                    self._security_group_rules(ctxt, security_group))
+            sg_ipv4_rules, sg_ipv6_rules = (
+                self.security_group_rules[security_group['id']])
+            ipv4_rules += sg_ipv4_rules
+            ipv6_rules += sg_ipv6_rules
 
         ipv4_rules += ['-j $sg-fallback']
         ipv6_rules += ['-j $sg-fallback']
@@ -424,10 +464,14 @@ class IptablesFirewallDriver(FirewallDriver):
         pass
 
     def refresh_security_group_members(self, security_group):
+        # NOTE: the members of a group show up in the rules of every group
+        # granting access to it, so drop all of the rendered rules.
+        self.security_group_rules.clear()
         self.do_refresh_security_group_rules(security_group)
         self.iptables.apply()
 
     def refresh_security_group_rules(self, security_group):
+        self.security_group_rules.clear()
         self.do_refresh_security_group_rules(security_group)
         self.iptables.apply()
 
@@ -465,7 +509,10 @@ class IptablesFirewallDriver(FirewallDriver):
 
     def do_refresh_instance_rules(self, instance):
         _instance, network_info = self.instance_info[instance['id']]
-        ipv4_rules, ipv6_rules = self.instance_rules(instance, network_info)
+        # NOTE: rule and member changes of the instance's security groups
+        # are signalled through this refresh, render the groups again.
+        ipv4_rules, ipv6_rules = self.instance_rules(
+            instance, network_info, refresh_security_groups=True)
         self._inner_do_refresh_rules(instance, network_info, ipv4_rules,
                                      ipv6_rules)
 
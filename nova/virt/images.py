@@ -20,6 +20,9 @@ Handling of VM disk images.
 """
 
 import os
+import stat
+import struct
+import time
 
 from oslo.config import cfg
 
@@ -29,6 +32,7 @@ from nova import image
 from nova.openstack.common import fileutils
 from nova.openstack.common import imageutils
 from nova.openstack.common import log as logging
+from nova.openstack.common import units
 from nova import utils
 
 LOG = logging.getLogger(__name__)
@@ -44,6 +48,107 @@ CONF.register_opts(image_opts)
 IMAGE_API = image.API()
 
 
+_QCOW_MAGIC = 'QFI\xfb'
+# magic, version, backing_file_offset, backing_file_size, cluster_bits,
+# size, crypt_method, l1_size, l1_table_offset, refcount_table_offset,
+# refcount_table_clusters, nb_snapshots, snapshots_offset
+_QCOW2_HEADER = struct.Struct('>4sIQIIQIIQQIIQ')
+_QCOW2_INCOMPATIBLE_FEATURES = struct.Struct('>Q')
+_QCOW2_MAX_BACKING_FILE_SIZE = 1023
+
+# NOTE: leading bytes of the other formats qemu-img probes for. A file
+# starting with any of these is left to qemu-img, so it is never
+# mistaken for a raw image here.
+_OTHER_FORMAT_MAGICS = (
+    'QED\x00',                   # qed
+    'KDMV',                      # vmdk
+    'COWD',                      # vmdk (ESX)
+    '#',                         # vmdk descriptor, cloop
+    'vhdxfile',                  # vhdx
+    'conectix',                  # vpc
+    'Bochs Virtual HD Image',    # bochs
+    'WithoutFreeSpace',          # parallels
+    'WithouFreSpacExt',          # parallels
+    'LUKS\xba\xbe',              # luks
+    'OOOM',                      # cow
+)
+_VDI_MAGIC_OFFSET = 0x40
+_VDI_MAGIC = '\x7f\x10\xda\xbe'
+_PROBE_SIZE = 512
+
+
+def _read_qcow2_info(f, path, header):
+    """Parse a qcow2 header, return None if qemu-img should do it."""
+    if len(header) < _QCOW2_HEADER.size:
+        return None
+    (_magic, version, backing_file_offset, backing_file_size, cluster_bits,
+     size, crypt_method, _l1_size, _l1_table_offset, _refcount_table_offset,
+     _refcount_table_clusters, nb_snapshots,
+     _snapshots_offset) = _QCOW2_HEADER.unpack_from(header)
+
+    # Encrypted images, internal snapshots and images with incompatible
+    # features carry details only qemu-img reports.
+    if version not in (2, 3) or crypt_method or nb_snapshots:
+        return None
+    if version == 3:
+        if len(header) < _QCOW2_HEADER.size + 8:
+            return None
+        incompatible, = _QCOW2_INCOMPATIBLE_FEATURES.unpack_from(
+            header, _QCOW2_HEADER.size)
+        if incompatible:
+            return None
+
+    backing_file = None
+    if backing_file_offset:
+        if backing_file_size > _QCOW2_MAX_BACKING_FILE_SIZE:
+            return None
+        f.seek(backing_file_offset)
+        backing_file = f.read(backing_file_size)
+        if len(backing_file) != backing_file_size:
+            return None
+        if not os.path.isabs(backing_file):
+            # NOTE: this is the "actual path" qemu-img reports.
+            backing_file = os.path.join(os.path.dirname(path), backing_file)
+
+    info = imageutils.QemuImgInfo()
+    info.file_format = 'qcow2'
+    info.virtual_size = size
+    info.cluster_size = 1 << cluster_bits
+    info.backing_file = backing_file
+    return info
+
+
+def _read_image_info(path):
+    """Read qcow2 and raw image details without running qemu-img.
+
+    Returns None for everything else (or anything unexpected), in which
+    case the caller has to ask qemu-img.
+    """
+    try:
+        with open(path, 'rb') as f:
+            st = os.fstat(f.fileno())
+            if not stat.S_ISREG(st.st_mode):
+                return None
+            header = f.read(_PROBE_SIZE)
+            if header.startswith(_QCOW_MAGIC):
+                info = _read_qcow2_info(f, path, header)
+            elif (header.startswith(_OTHER_FORMAT_MAGICS) or
+                    header[_VDI_MAGIC_OFFSET:].startswith(_VDI_MAGIC) or
+                    path.endswith('.dmg')):
+                info = None
+            else:
+                info = imageutils.QemuImgInfo()
+                info.file_format = 'raw'
+                info.virtual_size = st.st_size
+    except (IOError, OSError, struct.error):
+        return None
+
+    if info is not None:
+        info.image = path
+        info.disk_size = st.st_blocks * 512
+    return info
+
+
 def qemu_img_info(path):
     """Return an object containing the parsed output from qemu-img info."""
     # TODO(mikal): this code should not be referring to a libvirt specific
@@ -51,6 +156,12 @@ def qemu_img_info(path):
     if not os.path.exists(path) and CONF.libvirt.images_type != 'rbd':
         return imageutils.QemuImgInfo()
 
+    # NOTE: qcow2 and raw files are inspected in-process, which saves a
+    # fork of qemu-img (and rootwrap) per call on the hot paths.
+    info = _read_image_info(path)
+    if info is not None:
+        return info
+
     out, err = utils.execute('env', 'LC_ALL=C', 'LANG=C',
                              'qemu-img', 'info', path)
     return imageutils.QemuImgInfo(out)
@@ -64,7 +175,21 @@ def convert_image(source, dest, out_format, run_as_root=False):
 
 def fetch(context, image_href, path, _user_id, _project_id, max_size=0):
     with fileutils.remove_path_on_error(path):
+        start = time.time()
         IMAGE_API.download(context, image_href, dest_path=path)
+        _log_throughput('Downloaded image %s' % image_href, path,
+                        time.time() - start)
+
+
+def _log_throughput(what, path, elapsed):
+    try:
+        size = os.path.getsize(path)
+    except OSError:
+        return
+    LOG.debug('%(what)s: %(size)d bytes in %(elapsed).2f seconds '
+              '(%(rate).2f MB/s)',
+              {'what': what, 'size': size, 'elapsed': elapsed,
+               'rate': size / float(units.Mi) / max(elapsed, 0.001)})
 
 
 def fetch_to_raw(context, image_href, path, user_id, project_id, max_size=0):
@@ -108,7 +233,10 @@ def fetch_to_raw(context, image_href, path, user_id, project_id, max_size=0):
             staged = "%s.converted" % path
             LOG.debug("%s was %s, converting to raw" % (image_href, fmt))
             with fileutils.remove_path_on_error(staged):
+                start = time.time()
                 convert_image(path_tmp, staged, 'raw')
+                _log_throughput('Converted image %s to raw' % image_href,
+                                staged, time.time() - start)
                 os.unlink(path_tmp)
 
                 data = qemu_img_info(staged)
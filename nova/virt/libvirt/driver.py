@@ -97,6 +97,7 @@ from nova.virt.libvirt import dmcrypt
 from nova.virt.libvirt import firewall as libvirt_firewall
 from nova.virt.libvirt import imagebackend
 from nova.virt.libvirt import imagecache
+from nova.virt.libvirt import imagepeer
 from nova.virt.libvirt import lvm
 from nova.virt.libvirt import rbd_utils
 from nova.virt.libvirt import utils as libvirt_utils
@@ -246,7 +247,12 @@ libvirt_opts = [
                 default=[],
                 help='List of guid targets and ranges.'
                      'Syntax is guest-gid:host-gid:count'
-                     'Maximum of 5 allowed.')
+                     'Maximum of 5 allowed.'),
+    cfg.IntOpt('domain_cache_reconcile_interval',
+               default=300,
+               help='Number of seconds after which the in-memory table of '
+                    'libvirt domains, kept up to date by lifecycle events, '
+                    'is rebuilt from libvirt. Zero disables the table.'),
     ]
 
 CONF = cfg.CONF
@@ -347,6 +353,15 @@ MIN_LIBVIRT_BLOCKJOBINFO_VERSION = (1, 1, 1)
 #  this version is only used for messaging)
 MIN_LIBVIRT_BLOCKCOMMIT_RELATIVE_VERSION = (1, 2, 7)
 
+# Bulk domain stats (libvirt >= 1.2.8), see _get_domain_stats. The
+# constants are defined here as older libvirt bindings lack them.
+VIR_DOMAIN_STATS_VCPU = 8
+VIR_DOMAIN_STATS_INTERFACE = 16
+VIR_DOMAIN_STATS_BLOCK = 32
+VIR_CONNECT_GET_ALL_DOMAINS_STATS_ACTIVE = 1
+BULK_DOMAIN_STATS = (VIR_DOMAIN_STATS_VCPU | VIR_DOMAIN_STATS_INTERFACE |
+                     VIR_DOMAIN_STATS_BLOCK)
+
 
 def libvirt_error_handler(context, err):
     # Just ignore instead of default outputting to stderr.
@@ -368,6 +383,7 @@ class LibvirtDriver(driver.ComputeDriver):
             libvirt = importutils.import_module('libvirt')
 
         self._skip_list_all_domains = False
+        self._skip_bulk_domain_stats = False
         self._host_state = None
         self._initiator = None
         self._fc_wwnns = None
@@ -391,6 +407,8 @@ class LibvirtDriver(driver.ComputeDriver):
         self.dev_filter = pci_whitelist.get_pci_devices_filter()
 
         self._event_queue = None
+        self._lifecycle_events = False
+        self._domain_cache = DomainCache()
 
         self._disk_cachemode = None
         self.image_cache_manager = imagecache.ImageCacheManager()
@@ -419,6 +437,8 @@ class LibvirtDriver(driver.ComputeDriver):
 
         self._volume_api = volume.API()
         self._image_api = image.API()
+        self._disk_info_cache = DiskInfoCache()
+        self._image_peer_server = None
 
         sysinfo_serial_funcs = {
             'none': lambda: None,
@@ -547,6 +567,10 @@ class LibvirtDriver(driver.ComputeDriver):
 
         if transition is not None:
             self._queue_event(virtevent.LifecycleEvent(uuid, transition))
+        else:
+            # NOTE: other events (like the domain being defined or
+            # undefined) still refresh the entry of the domain cache.
+            self._queue_event(virtevent.InstanceEvent(uuid))
 
     def _queue_event(self, event):
         """Puts an event on the queue for dispatch.
@@ -588,8 +612,10 @@ class LibvirtDriver(driver.ComputeDriver):
         while not self._event_queue.empty():
             try:
                 event = self._event_queue.get(block=False)
-                if isinstance(event, virtevent.LifecycleEvent):
-                    self.emit_event(event)
+                if isinstance(event, virtevent.InstanceEvent):
+                    self._domain_cache.invalidate(uuid=event.uuid)
+                    if isinstance(event, virtevent.LifecycleEvent):
+                        self.emit_event(event)
                 elif 'conn' in event and 'reason' in event:
                     last_close_event = event
             except native_Queue.Empty:
@@ -653,6 +679,14 @@ class LibvirtDriver(driver.ComputeDriver):
 
         LOG.debug("Starting green dispatch thread")
         eventlet.spawn(self._dispatch_thread)
+        self._update_domain_cache_enabled()
+
+    def _update_domain_cache_enabled(self):
+        # NOTE: the domain cache is only correct while lifecycle events
+        # are received and dispatched to drop stale entries.
+        self._domain_cache.enabled = (
+            self._lifecycle_events and self._event_queue is not None and
+            CONF.libvirt.domain_cache_reconcile_interval > 0)
 
     def _do_quality_warnings(self):
         """Warn about untested driver configurations.
@@ -705,6 +739,10 @@ class LibvirtDriver(driver.ComputeDriver):
 
         self._init_events()
 
+        if imagepeer.enabled():
+            self._image_peer_server = imagepeer.get_wsgi_server()
+            self._image_peer_server.start()
+
     def _get_new_connection(self):
         # call with _wrapped_conn_lock held
         LOG.debug('Connecting to libvirt: %s', self.uri())
@@ -722,6 +760,9 @@ class LibvirtDriver(driver.ComputeDriver):
 
         self._wrapped_conn = wrapped_conn
         self._skip_list_all_domains = False
+        self._skip_bulk_domain_stats = False
+        # NOTE: events may have been missed while disconnected
+        self._domain_cache.clear()
 
         try:
             LOG.debug("Registering for lifecycle events %s", self)
@@ -730,9 +771,12 @@ class LibvirtDriver(driver.ComputeDriver):
                 libvirt.VIR_DOMAIN_EVENT_ID_LIFECYCLE,
                 self._event_lifecycle_callback,
                 self)
+            self._lifecycle_events = True
         except Exception as e:
             LOG.warn(_LW("URI %(uri)s does not support events: %(error)s"),
                      {'uri': self.uri(), 'error': e})
+            self._lifecycle_events = False
+        self._update_domain_cache_enabled()
 
         try:
             LOG.debug("Registering for connection events: %s", str(self))
@@ -835,6 +879,8 @@ class LibvirtDriver(driver.ComputeDriver):
 
     def instance_exists(self, instance):
         """Efficient override of base instance_exists method."""
+        if self._domain_cache.get(instance.name) is not None:
+            return True
         try:
             self._lookup_by_name(instance.name)
             return True
@@ -913,7 +959,80 @@ class LibvirtDriver(driver.ComputeDriver):
 
         return doms
 
+    def _get_domain_entry(self, dom):
+        """Return the domain cache entry describing dom."""
+        dom_id = dom.ID()
+        vcpus = None
+        if dom_id != -1:
+            try:
+                vcpus = dom.vcpus()
+            except libvirt.libvirtError as e:
+                LOG.warn(_LW("couldn't obtain the vpu count from domain id:"
+                             " %(uuid)s, exception: %(ex)s") %
+                         {"uuid": dom.UUIDString(), "ex": e})
+        return {'name': dom.name(),
+                'uuid': dom.UUIDString(),
+                'id': dom_id,
+                'vcpus': len(vcpus[1]) if vcpus and len(vcpus) > 1 else 0}
+
+    def _read_domain_entry(self, uuid):
+        """Return the domain cache entry of the guest domain with the given
+        uuid, or None if there is none.
+        """
+        try:
+            entry = self._get_domain_entry(
+                self._conn.lookupByUUIDString(uuid))
+        except libvirt.libvirtError as ex:
+            if ex.get_error_code() == libvirt.VIR_ERR_NO_DOMAIN:
+                return None
+            raise
+        if entry['id'] == 0:
+            # NOTE: not a guest, see _list_instance_domains
+            return None
+        return entry
+
+    def _list_cached_domains(self):
+        """Return the domain cache entries of all guest domains, or None
+        if the domain cache is disabled.
+        """
+        if not self._domain_cache.enabled:
+            return None
+        entries = self._domain_cache.list()
+        if entries is None:
+            generation = self._domain_cache.generation
+            self._domain_cache.take_stale()
+            entries = []
+            for dom in self._list_instance_domains(only_running=False):
+                try:
+                    entries.append(self._get_domain_entry(dom))
+                except libvirt.libvirtError:
+                    # NOTE: the domain went away while listing, the
+                    # event for it refreshes its entry anyway.
+                    continue
+                greenthread.sleep(0)
+            self._domain_cache.reconcile(entries, generation)
+            return entries
+
+        stale = self._domain_cache.take_stale()
+        if stale:
+            # NOTE: only the domains with events are read again
+            generation = self._domain_cache.generation
+            try:
+                for dom_uuid in stale:
+                    self._domain_cache.update(
+                        dom_uuid, self._read_domain_entry(dom_uuid),
+                        generation)
+            except Exception:
+                with excutils.save_and_reraise_exception():
+                    self._domain_cache.clear()
+            entries = self._domain_cache.list()
+        return entries
+
     def list_instances(self):
+        entries = self._list_cached_domains()
+        if entries is not None:
+            return [entry['name'] for entry in entries]
+
         names = []
         for dom in self._list_instance_domains(only_running=False):
             names.append(dom.name())
@@ -921,6 +1040,10 @@ class LibvirtDriver(driver.ComputeDriver):
         return names
 
     def list_instance_uuids(self):
+        entries = self._list_cached_domains()
+        if entries is not None:
+            return [entry['uuid'] for entry in entries]
+
         uuids = []
         for dom in self._list_instance_domains(only_running=False):
             uuids.append(dom.UUIDString())
@@ -1721,7 +1844,8 @@ class LibvirtDriver(driver.ComputeDriver):
                 self._image_api.update(context,
                                        image_id,
                                        metadata,
-                                       image_file)
+                                       SnapshotUploadFile(image_file,
+                                                          instance))
                 LOG.info(_LI("Snapshot image upload complete"),
                          instance=instance)
 
@@ -1803,10 +1927,19 @@ class LibvirtDriver(driver.ComputeDriver):
         finally:
             self._conn.defineXML(xml)
 
+        # A delta without a backing file is a complete qcow2 image already,
+        # so it is uploaded as is instead of being copied once more.
+        if (src_back_path is None and image_format == 'qcow2' and
+                not CONF.libvirt.snapshot_compression):
+            os.rename(disk_delta, out_path)
+            return
+
         # Convert the delta (CoW) image with a backing file to a flat
         # image with no backing file.
         libvirt_utils.extract_snapshot(disk_delta, 'qcow2',
                                        out_path, image_format)
+        # NOTE: free the space taken by the delta before the upload
+        libvirt_utils.file_delete(disk_delta)
 
     def _volume_snapshot_update_status(self, context, snapshot_id, status):
         """Send a snapshot status update to Cinder.
@@ -4325,6 +4458,11 @@ class LibvirtDriver(driver.ComputeDriver):
         if CONF.libvirt.virt_type == 'lxc':
             return total + 1
 
+        entries = self._list_cached_domains()
+        if entries is not None:
+            return sum(entry['vcpus'] for entry in entries
+                       if entry['id'] != -1)
+
         for dom in self._list_instance_domains():
             try:
                 vcpus = dom.vcpus()
@@ -4604,9 +4742,11 @@ class LibvirtDriver(driver.ComputeDriver):
            a given host.
         """
         vol_usage = []
+        dom_stats = self._get_domain_stats()
 
         for instance_bdms in compute_host_bdms:
             instance = instance_bdms['instance']
+            block_stats = dom_stats.get(instance['name'], {}).get('block', {})
 
             for bdm in instance_bdms['instance_bdms']:
                 vol_stats = []
@@ -4617,7 +4757,7 @@ class LibvirtDriver(driver.ComputeDriver):
 
                 LOG.debug("Trying to get stats for the volume %s",
                           volume_id)
-                vol_stats = self.block_stats(instance['name'], mountpoint)
+                vol_stats = block_stats.get(mountpoint)
 
                 if vol_stats:
                     stats = dict(volume=volume_id,
@@ -4636,6 +4776,29 @@ class LibvirtDriver(driver.ComputeDriver):
 
         return vol_usage
 
+    def get_all_bw_counters(self, instances):
+        """Return bandwidth usage counters for each interface on each
+           running VM.
+        """
+        uuids = dict((instance['name'], instance['uuid'])
+                     for instance in instances)
+        bw_counters = []
+        for name, stats in self._get_domain_stats().iteritems():
+            if name not in uuids:
+                continue
+            try:
+                xml = stats['domain'].XMLDesc(0)
+            except libvirt.libvirtError:
+                continue
+            for mac, dev in self._get_interface_macs(xml):
+                iface_stats = stats['net'].get(dev)
+                if iface_stats:
+                    bw_counters.append({'uuid': uuids[name],
+                                        'mac_address': mac,
+                                        'bw_in': iface_stats[0],
+                                        'bw_out': iface_stats[4]})
+        return bw_counters
+
     def block_stats(self, instance_name, disk_id):
         """Note that this function takes an instance name."""
         try:
@@ -5402,8 +5565,7 @@ class LibvirtDriver(driver.ComputeDriver):
 
             disk_type = driver_nodes[cnt].get('type')
             if disk_type == "qcow2":
-                backing_file = libvirt_utils.get_disk_backing_file(path)
-                virt_size = disk.get_disk_size(path)
+                virt_size, backing_file = self._disk_info_cache.get(path)
                 over_commit_size = int(virt_size) - dk_size
             else:
                 backing_file = ""
@@ -5441,6 +5603,7 @@ class LibvirtDriver(driver.ComputeDriver):
         """Return total over committed disk size for all instances."""
         # Disk size that all instance uses : virtual_size - disk_size
         disk_over_committed_size = 0
+        disk_paths = set()
         for dom in self._list_instance_domains():
             try:
                 xml = dom.XMLDesc(0)
@@ -5449,6 +5612,7 @@ class LibvirtDriver(driver.ComputeDriver):
                 for info in disk_infos:
                     disk_over_committed_size += int(
                         info['over_committed_disk_size'])
+                    disk_paths.add(info['path'])
             except libvirt.libvirtError as ex:
                 error_code = ex.get_error_code()
                 LOG.warn(_LW(
@@ -5475,6 +5639,10 @@ class LibvirtDriver(driver.ComputeDriver):
                     raise
             # NOTE(gtt116): give other tasks a chance.
             greenthread.sleep(0)
+        self._disk_info_cache.prune(disk_paths)
+        LOG.debug('Disk info cache: %(hits)d hits, %(misses)d misses, '
+                  '%(elapsed).3f seconds spent inspecting disks',
+                  self._disk_info_cache.stats())
         return disk_over_committed_size
 
     def unfilter_instance(self, instance, network_info):
@@ -5804,40 +5972,155 @@ class LibvirtDriver(driver.ComputeDriver):
                         result[key].append(child.get('dev'))
         return result
 
+    @staticmethod
+    def _get_interface_macs(xml_doc):
+        """get the (mac address, target device) pairs of the interfaces
+        in the xml document.
+        """
+        result = []
+        try:
+            doc = etree.fromstring(xml_doc)
+        except Exception:
+            return result
+        for node in doc.findall('./devices/interface'):
+            mac = node.find('mac')
+            target = node.find('target')
+            if (mac is not None and target is not None and
+                    target.get('dev')):
+                result.append((mac.get('address'), target.get('dev')))
+        return result
+
+    @staticmethod
+    def _parse_domain_stats(record):
+        """Turn a record returned by virConnectGetAllDomainStats into the
+        values returned by virDomainGetVcpus, virDomainBlockStats and
+        virDomainInterfaceStats. Counters the hypervisor doesn't report
+        are -1, as in virDomainBlockStats.
+        """
+        stats = {'vcpu_times': [], 'block': {}, 'net': {}}
+        for i in range(record.get('vcpu.current', 0)):
+            stats['vcpu_times'].append(record.get('vcpu.%d.time' % i, -1))
+        for i in range(record.get('block.count', 0)):
+            prefix = 'block.%d.' % i
+            stats['block'][record[prefix + 'name']] = tuple(
+                record.get(prefix + key, -1)
+                for key in ('rd.reqs', 'rd.bytes', 'wr.reqs', 'wr.bytes',
+                            'errs'))
+        for i in range(record.get('net.count', 0)):
+            prefix = 'net.%d.' % i
+            stats['net'][record[prefix + 'name']] = tuple(
+                record.get(prefix + key, -1)
+                for key in ('rx.bytes', 'rx.pkts', 'rx.errs', 'rx.drop',
+                            'tx.bytes', 'tx.pkts', 'tx.errs', 'tx.drop'))
+        return stats
+
+    def _get_domain_stats_slow(self, domains):
+        # The legacy (< 1.2.8) slow way - O(n) API calls for n devices
+        result = {}
+        for dom in domains:
+            stats = {'domain': dom, 'vcpu_times': [], 'block': {}, 'net': {}}
+            try:
+                # these might launch an exception if the method is not
+                # supported by the underlying hypervisor being used by
+                # libvirt
+                try:
+                    stats['vcpu_times'] = [vcpu[2] for vcpu in dom.vcpus()[0]]
+                except libvirt.libvirtError:
+                    pass
+                dom_io = LibvirtDriver._get_io_devices(dom.XMLDesc(0))
+                for guest_disk in dom_io["volumes"]:
+                    try:
+                        stats['block'][guest_disk] = dom.blockStats(
+                            guest_disk)
+                    except libvirt.libvirtError:
+                        pass
+                for interface in dom_io["ifaces"]:
+                    try:
+                        stats['net'][interface] = dom.interfaceStats(
+                            interface)
+                    except libvirt.libvirtError:
+                        pass
+                result[dom.name()] = stats
+            except libvirt.libvirtError:
+                # NOTE: the domain went away in the meantime
+                continue
+            greenthread.sleep(0)
+        return result
+
+    def _get_domain_stats(self, domains=None):
+        """Get the vcpu, block and interface counters of domains
+
+        :param domains: list of libvirt.Domain objects, or None for all
+                        running guest domains
+
+        Returns a dict of dicts keyed by domain name, each with the
+        libvirt.Domain object as 'domain', the vcpu times as 'vcpu_times',
+        and the values of virDomainBlockStats and virDomainInterfaceStats
+        keyed by target device as 'block' and 'net'. A single libvirt call
+        gathers the counters of all domains where libvirt supports it.
+        """
+        if not self._skip_bulk_domain_stats:
+            try:
+                if domains is None:
+                    records = self._conn.getAllDomainStats(
+                        BULK_DOMAIN_STATS,
+                        VIR_CONNECT_GET_ALL_DOMAINS_STATS_ACTIVE)
+                else:
+                    records = self._conn.domainListGetStats(
+                        domains, BULK_DOMAIN_STATS)
+            except (libvirt.libvirtError, AttributeError) as ex:
+                if (isinstance(ex, AttributeError) or
+                        ex.get_error_code() == libvirt.VIR_ERR_NO_SUPPORT):
+                    # Old libvirt, or a libvirt driver which doesn't
+                    # implement the new API
+                    LOG.info(_LI("Unable to use bulk domain stats APIs, "
+                                 "falling back to slow code path: %(ex)s"),
+                             {'ex': ex})
+                    self._skip_bulk_domain_stats = True
+                elif ex.get_error_code() == libvirt.VIR_ERR_NO_DOMAIN:
+                    # NOTE: a domain went away in the meantime, the slow
+                    # code path skips it.
+                    LOG.debug("Domain gone while getting bulk domain "
+                              "stats, using slow code path: %s", ex)
+                else:
+                    LOG.warn(_LW("Unable to get bulk domain stats, using "
+                                 "slow code path: %(ex)s"), {'ex': ex})
+            else:
+                result = {}
+                for dom, record in records:
+                    if domains is None and dom.ID() == 0:
+                        continue
+                    stats = self._parse_domain_stats(record)
+                    stats['domain'] = dom
+                    result[dom.name()] = stats
+                return result
+
+        if domains is None:
+            domains = self._list_instance_domains()
+        return self._get_domain_stats_slow(domains)
+
     def get_diagnostics(self, instance):
         domain = self._lookup_by_name(instance['name'])
+        dom_stats = self._get_domain_stats([domain]).get(domain.name(), {})
         output = {}
-        # get cpu time, might launch an exception if the method
-        # is not supported by the underlying hypervisor being
-        # used by libvirt
-        try:
-            cputime = domain.vcpus()[0]
-            for i in range(len(cputime)):
-                output["cpu" + str(i) + "_time"] = cputime[i][2]
-        except libvirt.libvirtError:
-            pass
+        # get cpu time, not reported if the underlying hypervisor being
+        # used by libvirt doesn't support it
+        for i, cputime in enumerate(dom_stats.get('vcpu_times', [])):
+            output["cpu" + str(i) + "_time"] = cputime
         # get io status
         xml = domain.XMLDesc(0)
         dom_io = LibvirtDriver._get_io_devices(xml)
         for guest_disk in dom_io["volumes"]:
-            try:
-                # blockStats might launch an exception if the method
-                # is not supported by the underlying hypervisor being
-                # used by libvirt
-                stats = domain.blockStats(guest_disk)
+            stats = dom_stats.get('block', {}).get(guest_disk)
+            if stats:
                 output[guest_disk + "_read_req"] = stats[0]
                 output[guest_disk + "_read"] = stats[1]
                 output[guest_disk + "_write_req"] = stats[2]
                 output[guest_disk + "_write"] = stats[3]
                 output[guest_disk + "_errors"] = stats[4]
-            except libvirt.libvirtError:
-                pass
         for interface in dom_io["ifaces"]:
-            try:
-                # interfaceStats might launch an exception if the method
-                # is not supported by the underlying hypervisor being
-                # used by libvirt
-                stats = domain.interfaceStats(interface)
+            stats = dom_stats.get('net', {}).get(interface)
+            if stats:
                 output[interface + "_rx"] = stats[0]
                 output[interface + "_rx_packets"] = stats[1]
                 output[interface + "_rx_errors"] = stats[2]
@@ -5846,8 +6129,6 @@ class LibvirtDriver(driver.ComputeDriver):
                 output[interface + "_tx_packets"] = stats[5]
                 output[interface + "_tx_errors"] = stats[6]
                 output[interface + "_tx_drop"] = stats[7]
-            except libvirt.libvirtError:
-                pass
         output["memory"] = domain.maxMemory()
         # memoryStats might launch an exception if the method
         # is not supported by the underlying hypervisor being
@@ -5878,36 +6159,23 @@ class LibvirtDriver(driver.ComputeDriver):
         diags.memory_details.maximum = max_mem / units.Mi
         diags.memory_details.used = mem / units.Mi
 
-        # get cpu time, might launch an exception if the method
-        # is not supported by the underlying hypervisor being
-        # used by libvirt
-        try:
-            cputime = domain.vcpus()[0]
-            num_cpus = len(cputime)
-            for i in range(num_cpus):
-                diags.add_cpu(time=cputime[i][2])
-        except libvirt.libvirtError:
-            pass
+        dom_stats = self._get_domain_stats([domain]).get(domain.name(), {})
+        # get cpu time, not reported if the underlying hypervisor being
+        # used by libvirt doesn't support it
+        for cputime in dom_stats.get('vcpu_times', []):
+            diags.add_cpu(time=cputime)
         # get io status
         dom_io = LibvirtDriver._get_io_devices(xml)
         for guest_disk in dom_io["volumes"]:
-            try:
-                # blockStats might launch an exception if the method
-                # is not supported by the underlying hypervisor being
-                # used by libvirt
-                stats = domain.blockStats(guest_disk)
+            stats = dom_stats.get('block', {}).get(guest_disk)
+            if stats:
                 diags.add_disk(read_bytes=stats[1],
                                read_requests=stats[0],
                                write_bytes=stats[3],
                                write_requests=stats[2])
-            except libvirt.libvirtError:
-                pass
         for interface in dom_io["ifaces"]:
-            try:
-                # interfaceStats might launch an exception if the method
-                # is not supported by the underlying hypervisor being
-                # used by libvirt
-                stats = domain.interfaceStats(interface)
+            stats = dom_stats.get('net', {}).get(interface)
+            if stats:
                 diags.add_nic(rx_octets=stats[0],
                               rx_errors=stats[2],
                               rx_drop=stats[3],
@@ -5916,8 +6184,6 @@ class LibvirtDriver(driver.ComputeDriver):
                               tx_errors=stats[6],
                               tx_drop=stats[7],
                               tx_packets=stats[5])
-            except libvirt.libvirtError:
-                pass
 
         # Update mac addresses of interface if stats have been reported
         if len(diags.nic_details) > 0:
@@ -6041,6 +6307,197 @@ class LibvirtDriver(driver.ComputeDriver):
                            disk.FS_FORMAT_EXT4, disk.FS_FORMAT_XFS]
 
 
+class DiskInfoCache(object):
+    """Caches the virtual size and backing file of qcow2 disks.
+
+    Looking them up means running qemu-img for every disk, which adds up
+    when all instance disks are inspected on each resource update. An
+    entry is only reused while the inode, modification time and size of
+    the file are unchanged, so any write to the image (like a resize or
+    a rebase) makes it be inspected again.
+    """
+
+    def __init__(self):
+        self._entries = {}
+        self.hits = 0
+        self.misses = 0
+        self.elapsed = 0.0
+
+    def get(self, path):
+        """Return (virtual_size, backing_file) of the qcow2 disk at path."""
+        start = time.time()
+        try:
+            st = os.stat(path)
+            key = (st.st_ino, st.st_mtime, st.st_size)
+        except OSError:
+            # NOTE: a file which can't be stat'ed is simply not cached,
+            # inspecting it raises the error callers expect.
+            key = None
+
+        entry = self._entries.get(path)
+        if key is not None and entry is not None and entry[0] == key:
+            self.hits += 1
+            result = entry[1]
+        else:
+            self.misses += 1
+            backing_file = libvirt_utils.get_disk_backing_file(path)
+            virt_size = disk.get_disk_size(path)
+            result = (virt_size, backing_file)
+            if key is not None:
+                self._entries[path] = (key, result)
+            else:
+                self._entries.pop(path, None)
+        self.elapsed += time.time() - start
+        return result
+
+    def prune(self, paths):
+        """Drop the entries of all disks not in paths."""
+        for path in set(self._entries) - set(paths):
+            del self._entries[path]
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses,
+                'elapsed': self.elapsed}
+
+
+class DomainCache(object):
+    """In-memory table of the libvirt domains of nova instances.
+
+    Periodic tasks list the instances, check that they exist and count
+    their vcpus, each of which costs a libvirt call per domain. The table
+    answers these from memory instead. When libvirt reports an event for a
+    domain, only the entry of that domain is read again, the next time the
+    table is used, and the whole table is rebuilt every
+    domain_cache_reconcile_interval seconds. Volatile state of the domains,
+    like their memory and cpu time, isn't kept.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self._entries = {}
+        self._stale = set()
+        self._complete = False
+        self._started = time.time()
+        # NOTE: bumped whenever the table is dropped, so that entries read
+        # from libvirt meanwhile aren't stored.
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+
+    def _expire(self):
+        if (time.time() - self._started >
+                CONF.libvirt.domain_cache_reconcile_interval):
+            self.clear()
+
+    def clear(self):
+        self._entries = {}
+        self._stale = set()
+        self._complete = False
+        self._started = time.time()
+        self.generation += 1
+
+    def get(self, name):
+        """Return the entry of the domain called name, if cached and not
+        stale.
+        """
+        if not self.enabled:
+            return None
+        self._expire()
+        entry = self._entries.get(name)
+        if entry is None or entry['uuid'] in self._stale:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return entry
+
+    def list(self):
+        """Return the entries of all domains, or None unless every domain
+        is known to be cached. Stale entries are included, see take_stale.
+        """
+        if not self.enabled:
+            return None
+        self._expire()
+        if not self._complete:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return self._entries.values()
+
+    def take_stale(self):
+        """Return the uuids of the domains with events since their entries
+        were read, for the caller to read them again.
+        """
+        stale, self._stale = self._stale, set()
+        return stale
+
+    def update(self, uuid, entry, generation):
+        """Replace the entry of the domain with the given uuid by one read
+        from libvirt at the given generation, or None if the domain is gone.
+        """
+        if not self.enabled or generation != self.generation:
+            return
+        for name, old_entry in self._entries.items():
+            if old_entry['uuid'] == uuid:
+                del self._entries[name]
+        if entry is not None:
+            self._entries[entry['name']] = entry
+
+    def reconcile(self, entries, generation):
+        """Replace the table with the entries of all domains, read from
+        libvirt at the given generation.
+        """
+        if not self.enabled or generation != self.generation:
+            return
+        LOG.debug('Rebuilt domain cache with %(count)d domains, '
+                  '%(hits)d hits and %(misses)d misses since the last time',
+                  {'count': len(entries), 'hits': self.hits,
+                   'misses': self.misses})
+        self.hits = self.misses = 0
+        self._entries = dict((entry['name'], entry) for entry in entries)
+        self._complete = True
+        self._started = time.time()
+
+    def invalidate(self, uuid):
+        """Mark the entry of the domain with the given uuid as stale."""
+        self._stale.add(uuid)
+
+
+class SnapshotUploadFile(object):
+    """Wraps the file of a snapshot image to log the progress of its
+    upload to the image service.
+    """
+
+    # Percentage of the image read between two log messages
+    PROGRESS_STEP = 10
+
+    def __init__(self, image_file, instance):
+        self._file = image_file
+        self._instance = instance
+        self._read = 0
+        self._logged = 0
+        try:
+            self._size = os.fstat(image_file.fileno()).st_size
+        except (AttributeError, IOError, OSError, ValueError):
+            self._size = None
+
+    def __getattr__(self, name):
+        # NOTE: the image service client uses seek and tell to find the
+        # size of the image.
+        return getattr(self._file, name)
+
+    def read(self, *args):
+        data = self._file.read(*args)
+        self._read += len(data)
+        if self._size:
+            progress = self._read * 100 // self._size
+            if progress - self._logged >= self.PROGRESS_STEP:
+                self._logged = progress - progress % self.PROGRESS_STEP
+                LOG.info(_LI("Snapshot image upload %(progress)d%% "
+                             "complete"), {'progress': self._logged},
+                         instance=self._instance)
+        return data
+
+
 class HostState(object):
     """Manages information about the compute node through libvirt."""
     def __init__(self, driver):
@@ -6103,6 +6560,9 @@ class HostState(object):
         data['pci_passthrough_devices'] = \
             self.driver._get_pci_passthrough_devices()
 
+        if imagepeer.enabled():
+            data['stats'] = imagepeer.get_stats()
+
         self._stats = data
 
         return data
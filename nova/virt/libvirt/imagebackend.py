@@ -17,6 +17,7 @@ import abc
 import contextlib
 import os
 
+from eventlet import event
 from oslo.config import cfg
 import six
 
@@ -83,6 +84,39 @@ CONF.import_opt('rbd_secret_uuid', 'nova.virt.libvirt.volume', group='libvirt')
 LOG = logging.getLogger(__name__)
 IMAGE_API = image.API()
 
+# Events of the template fetches in progress in this process, by target
+_fetches_in_flight = {}
+
+
+def _fetch_once(target, fetch):
+    """Call fetch() unless a fetch of target is already in progress.
+
+    Concurrent callers wait for the fetch in progress instead of queueing
+    up on the template lock to fetch the same image again once it's done.
+    If that fetch fails they call fetch() themselves, as the failure may
+    be specific to the first caller (like a too small flavor).
+
+    Returns False if the target was fetched by another caller.
+    """
+    in_flight = _fetches_in_flight.get(target)
+    if in_flight is not None:
+        LOG.debug('Waiting for the fetch of %s in progress', target)
+        if in_flight.wait():
+            return False
+        LOG.debug('Fetch of %s in progress failed, fetching it', target)
+        fetch()
+        return True
+
+    in_flight = _fetches_in_flight[target] = event.Event()
+    succeeded = False
+    try:
+        fetch()
+        succeeded = True
+    finally:
+        del _fetches_in_flight[target]
+        in_flight.send(succeeded)
+    return True
+
 
 @six.add_metaclass(abc.ABCMeta)
 class Image(object):
@@ -185,9 +219,21 @@ class Image(object):
         :size: Size of created image in bytes (optional)
         """
         @utils.synchronized(filename, external=True, lock_path=self.lock_path)
-        def fetch_func_sync(target, *args, **kwargs):
+        def fetch_func_locked(target, *args, **kwargs):
             fetch_func(target=target, *args, **kwargs)
 
+        def fetch_func_sync(target, *args, **kwargs):
+            # NOTE: only fetches of glance images are shared, generated
+            # images may be created in place in the instance directory.
+            if 'image_id' not in kwargs:
+                return fetch_func_locked(target, *args, **kwargs)
+            fetched = _fetch_once(target, lambda: fetch_func_locked(
+                target, *args, **kwargs))
+            if not fetched and kwargs.get('max_size'):
+                # NOTE: the fetch we waited for only checked the image
+                # against the flavor it was made for.
+                self.verify_base_size(target, kwargs['max_size'])
+
         base_dir = os.path.join(CONF.instances_path,
                                 CONF.image_cache_subdirectory_name)
         if not os.path.exists(base_dir):
@@ -394,7 +440,10 @@ class Raw(Image):
         self.correct_format()
 
     def snapshot_extract(self, target, out_format):
-        images.convert_image(self.path, target, out_format)
+        if out_format == 'raw' and self.driver_format == 'raw':
+            libvirt_utils.copy_image(self.path, target)
+        else:
+            images.convert_image(self.path, target, out_format)
 
 
 class Qcow2(Image):
@@ -25,6 +25,8 @@ import os
 import re
 import time
 
+import eventlet
+from eventlet import tpool
 from oslo.config import cfg
 
 from nova.i18n import _LE
@@ -34,6 +36,7 @@ from nova.openstack.common import fileutils
 from nova.openstack.common import jsonutils
 from nova.openstack.common import log as logging
 from nova.openstack.common import processutils
+from nova.openstack.common import units
 from nova import utils
 from nova.virt import imagecache
 from nova.virt.libvirt import utils as libvirt_utils
@@ -62,6 +65,13 @@ imagecache_opts = [
     cfg.IntOpt('checksum_interval_seconds',
                default=3600,
                help='How frequently to checksum base images'),
+    cfg.IntOpt('checksum_workers',
+               default=2,
+               help='Number of base images to checksum concurrently'),
+    cfg.IntOpt('checksum_max_bandwidth',
+               default=0,
+               help='Maximum rate in MB/s at which each checksum worker '
+                    'reads base images, 0 means unlimited'),
     ]
 
 CONF = cfg.CONF
@@ -210,15 +220,45 @@ def write_stored_info(target, field=None, value=None):
     write_file(info_file, field, value)
 
 
+_HASH_CHUNK_SIZE = units.Mi
+
+
+def _hash_chunk(f, checksum):
+    chunk = f.read(_HASH_CHUNK_SIZE)
+    checksum.update(chunk)
+    return len(chunk)
+
+
 def _hash_file(filename):
-    """Generate a hash for the contents of a file."""
+    """Generate a hash for the contents of a file.
+
+    Chunks are read and hashed in native threads, so that the checksum
+    workers run concurrently and don't block other greenthreads. Reading
+    is throttled to checksum_max_bandwidth.
+    """
     checksum = hashlib.sha1()
+    max_rate = CONF.libvirt.checksum_max_bandwidth * units.Mi
+    start = time.time()
+    read = 0
     with open(filename) as f:
-        for chunk in iter(lambda: f.read(32768), b''):
-            checksum.update(chunk)
+        while True:
+            chunk_size = tpool.execute(_hash_chunk, f, checksum)
+            if not chunk_size:
+                break
+            read += chunk_size
+            delay = 0
+            if max_rate > 0:
+                delay = read / float(max_rate) - (time.time() - start)
+            time.sleep(max(delay, 0))
     return checksum.hexdigest()
 
 
+def _file_stat(filename):
+    """Return the (size, mtime) a checksum was verified against."""
+    st = os.stat(filename)
+    return [st.st_size, st.st_mtime]
+
+
 def read_stored_checksum(target, timestamped=True):
     """Read the checksum.
 
@@ -229,7 +269,9 @@ def read_stored_checksum(target, timestamped=True):
 
 def write_stored_checksum(target):
     """Write a checksum to disk for a file in _base."""
+    file_stat = _file_stat(target)
     write_stored_info(target, field='sha1', value=_hash_file(target))
+    write_stored_info(target, field='sha1-stat', value=file_stat)
 
 
 class ImageCacheManager(imagecache.ImageCacheManager):
@@ -250,6 +292,7 @@ class ImageCacheManager(imagecache.ImageCacheManager):
         self.originals = []
         self.removable_base_files = []
         self.unexplained_images = []
+        self.checksum_pool = None
 
     def _store_image(self, base_dir, ent, original=False):
         """Store a base image for later examination."""
@@ -384,6 +427,14 @@ class ImageCacheManager(imagecache.ImageCacheManager):
                     write_stored_info(base_file, field='sha1',
                                       value=stored_checksum)
 
+                # The file is not rehashed as long as its size and mtime
+                # are the ones it was last verified with.
+                file_stat = _file_stat(base_file)
+                if read_stored_info(base_file, field='sha1-stat') == file_stat:
+                    write_stored_info(base_file, field='sha1',
+                                      value=stored_checksum)
+                    return True
+
                 current_checksum = _hash_file(base_file)
 
                 if current_checksum != stored_checksum:
@@ -394,6 +445,12 @@ class ImageCacheManager(imagecache.ImageCacheManager):
                     return False
 
                 else:
+                    # NOTE: refreshing the timestamp also records progress,
+                    # a restarted pass skips the files verified so far.
+                    write_stored_info(base_file, field='sha1',
+                                      value=stored_checksum)
+                    write_stored_info(base_file, field='sha1-stat',
+                                      value=file_stat)
                     return True
 
             else:
@@ -416,6 +473,16 @@ class ImageCacheManager(imagecache.ImageCacheManager):
 
         return inner_verify_checksum()
 
+    def _verify_checksum_in_pool(self, img_id, base_file):
+        """Verify a checksum in a worker, recording a failure as corrupt."""
+        try:
+            if self._verify_checksum(img_id, base_file) is False:
+                self.corrupt_base_files.append(base_file)
+        except Exception:
+            LOG.exception(_LE('image %(id)s at (%(base_file)s): failed to '
+                              'verify checksum'),
+                          {'id': img_id, 'base_file': base_file})
+
     def _remove_base_file(self, base_file):
         """Remove a single base file if it is old enough.
 
@@ -462,17 +529,6 @@ class ImageCacheManager(imagecache.ImageCacheManager):
         if base_file in self.unexplained_images:
             self.unexplained_images.remove(base_file)
 
-        if (base_file and os.path.exists(base_file)
-                and os.path.isfile(base_file)):
-            # _verify_checksum returns True if the checksum is ok, and None if
-            # there is no checksum file
-            checksum_result = self._verify_checksum(img_id, base_file)
-            if checksum_result is not None:
-                image_bad = not checksum_result
-
-            # Give other threads a chance to run
-            time.sleep(0)
-
         instances = []
         if img_id in self.used_images:
             local, remote, instances = self.used_images[img_id]
@@ -498,9 +554,6 @@ class ImageCacheManager(imagecache.ImageCacheManager):
                                  'base_file': base_file,
                                  'instance_list': ' '.join(instances)})
 
-        if image_bad:
-            self.corrupt_base_files.append(base_file)
-
         if base_file:
             if not image_in_use:
                 LOG.debug('image %(id)s at (%(base_file)s): image is not in '
@@ -516,10 +569,56 @@ class ImageCacheManager(imagecache.ImageCacheManager):
                            'base_file': base_file})
                 if os.path.exists(base_file):
                     libvirt_utils.chown(base_file, os.getuid())
-                    os.utime(base_file, None)
+                    self._touch_base_file(base_file)
+
+        # NOTE: the checksum is verified after the file was touched, which
+        # carries its verified stat forward, so that in use images aren't
+        # hashed again on every pass.
+        if (base_file and os.path.exists(base_file)
+                and os.path.isfile(base_file)):
+            if self.checksum_pool is not None:
+                # NOTE: the checksum is verified by a worker, which adds
+                # the file to corrupt_base_files if it fails to verify.
+                self.checksum_pool.spawn_n(self._verify_checksum_in_pool,
+                                           img_id, base_file)
+            else:
+                # _verify_checksum returns True if the checksum is ok, and
+                # None if there is no checksum file
+                checksum_result = self._verify_checksum(img_id, base_file)
+                if checksum_result is not None:
+                    image_bad = not checksum_result
+
+            # Give other threads a chance to run
+            time.sleep(0)
+
+        if image_bad:
+            self.corrupt_base_files.append(base_file)
+
+    @staticmethod
+    def _touch_base_file(base_file):
+        """Mark a base file as recently used.
+
+        If the file is unchanged since its checksum was last verified, the
+        stat it was verified against is updated to the touched one.
+        """
+        if not CONF.libvirt.checksum_base_images:
+            os.utime(base_file, None)
+            return
+
+        file_stat = _file_stat(base_file)
+        os.utime(base_file, None)
+        if read_stored_info(base_file, field='sha1-stat') == file_stat:
+            write_stored_info(base_file, field='sha1-stat',
+                              value=_file_stat(base_file))
 
     def _age_and_verify_cached_images(self, context, all_instances, base_dir):
         LOG.debug('Verify base images')
+        # Checksums of the base images are verified by a bounded pool of
+        # workers, which is drained before the results are reported.
+        if CONF.libvirt.checksum_base_images:
+            self.checksum_pool = eventlet.GreenPool(
+                max(1, CONF.libvirt.checksum_workers))
+
         # Determine what images are on disk because they're in use
         for img in self.used_images:
             fingerprint = hashlib.sha1(img).hexdigest()
@@ -533,6 +632,10 @@ class ImageCacheManager(imagecache.ImageCacheManager):
                 if not image_small and not image_resized:
                     self.originals.append(base_file)
 
+        if self.checksum_pool is not None:
+            self.checksum_pool.waitall()
+            self.checksum_pool = None
+
         # Elements remaining in unexplained_images might be in use
         inuse_backing_images = self._list_backing_images()
         for backing_path in inuse_backing_images:
@@ -0,0 +1,196 @@
+# Copyright 2014 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Serve cached base images to other compute nodes.
+
+A compute node with image_peer_port set serves the base images in its
+image cache over HTTP and advertises them in its host stats, so that other
+compute nodes can fetch an image from it instead of from glance. Requests
+are signed with a secret shared by all compute nodes.
+"""
+
+import hashlib
+import hmac
+import httplib
+import os
+import re
+import time
+
+from oslo.config import cfg
+import six.moves.urllib.parse as urlparse
+import webob.dec
+import webob.exc
+
+from nova.i18n import _
+from nova.i18n import _LW
+from nova.openstack.common import log as logging
+from nova.openstack.common import units
+from nova import utils
+from nova import wsgi
+
+image_peer_opts = [
+    cfg.StrOpt('image_peer_listen',
+               default='0.0.0.0',
+               help='IP address on which cached base images are served to '
+                    'other compute nodes'),
+    cfg.IntOpt('image_peer_port',
+               default=0,
+               help='Port on which cached base images are served to other '
+                    'compute nodes. 0 disables serving them.'),
+    cfg.StrOpt('image_peer_secret',
+               secret=True,
+               help='Secret shared by all compute nodes, used to sign '
+                    'requests for cached base images'),
+    cfg.IntOpt('image_peer_signature_ttl',
+               default=60,
+               help='Number of seconds a signed request for a cached base '
+                    'image is valid for'),
+    cfg.IntOpt('image_peer_timeout',
+               default=60,
+               help='Timeout in seconds of the socket operations of fetching '
+                    'a cached base image from another compute node. 0 means '
+                    'no timeout.'),
+    ]
+
+CONF = cfg.CONF
+CONF.register_opts(image_peer_opts, 'libvirt')
+CONF.import_opt('image_cache_subdirectory_name', 'nova.virt.imagecache')
+CONF.import_opt('instances_path', 'nova.compute.manager')
+CONF.import_opt('my_ip', 'nova.netconf')
+
+LOG = logging.getLogger(__name__)
+
+# Base images fetched from glance are named after the sha1 of the image id
+_BASE_FILE_RE = re.compile('^[0-9a-f]{40}$')
+_PATH_RE = re.compile('^/images/([0-9a-f]{40})$')
+_READ_CHUNK_SIZE = units.Mi
+
+
+def enabled():
+    return bool(CONF.libvirt.image_peer_port and
+                CONF.libvirt.image_peer_secret)
+
+
+def get_url():
+    """Return the URL other compute nodes fetch cached images from."""
+    host = CONF.my_ip
+    if utils.is_valid_ipv6(host):
+        host = '[%s]' % host
+    return 'http://%s:%d' % (host, CONF.libvirt.image_peer_port)
+
+
+def get_stats():
+    """Return the host stats advertising the cached base images."""
+    base_dir = os.path.join(CONF.instances_path,
+                            CONF.image_cache_subdirectory_name)
+    try:
+        cached = [f for f in os.listdir(base_dir) if _BASE_FILE_RE.match(f)]
+    except OSError:
+        cached = []
+    return {'image_peer_url': get_url(),
+            'cached_images': ','.join(sorted(cached))}
+
+
+def _signature(fname, expires):
+    return hmac.new(CONF.libvirt.image_peer_secret,
+                    '%s:%d' % (fname, expires),
+                    hashlib.sha256).hexdigest()
+
+
+class ImagePeerApp(object):
+    """Serves the base images of the local image cache."""
+
+    @webob.dec.wsgify
+    def __call__(self, req):
+        match = _PATH_RE.match(req.path_info)
+        if not match or req.method != 'GET':
+            raise webob.exc.HTTPNotFound()
+        fname = match.group(1)
+
+        try:
+            expires = int(req.headers.get('X-Image-Expires', ''))
+        except ValueError:
+            raise webob.exc.HTTPForbidden()
+        signature = req.headers.get('X-Image-Signature', '')
+        if (expires < time.time() or
+                not utils.constant_time_compare(
+                    signature, _signature(fname, expires))):
+            LOG.warn(_LW('Refused unsigned request for cached image %s'),
+                     fname)
+            raise webob.exc.HTTPForbidden()
+
+        path = os.path.join(CONF.instances_path,
+                            CONF.image_cache_subdirectory_name, fname)
+        try:
+            f = open(path, 'rb')
+        except IOError:
+            raise webob.exc.HTTPNotFound()
+
+        def _file_iter():
+            try:
+                for chunk in iter(lambda: f.read(_READ_CHUNK_SIZE), ''):
+                    yield chunk
+            finally:
+                f.close()
+
+        LOG.debug('Serving cached image %(fname)s to %(peer)s',
+                  {'fname': fname, 'peer': req.remote_addr})
+        return webob.Response(app_iter=_file_iter(),
+                              content_type='application/octet-stream',
+                              content_length=os.fstat(f.fileno()).st_size)
+
+
+def get_wsgi_server():
+    return wsgi.Server('Image peer',
+                       ImagePeerApp(),
+                       host=CONF.libvirt.image_peer_listen,
+                       port=CONF.libvirt.image_peer_port)
+
+
+def fetch(url, fname, dst_path):
+    """Fetch the cached base image fname from the peer at url and return
+    the md5 hex digest of its data.
+    """
+    o = urlparse.urlparse(url)
+    conn = httplib.HTTPConnection(o.hostname, o.port,
+                                  timeout=CONF.libvirt.image_peer_timeout or
+                                  None)
+    expires = int(time.time()) + CONF.libvirt.image_peer_signature_ttl
+    headers = {'X-Image-Expires': str(expires),
+               'X-Image-Signature': _signature(fname, expires)}
+    try:
+        conn.request('GET', '/images/%s' % fname, headers=headers)
+        resp = conn.getresponse()
+        if resp.status != httplib.OK:
+            raise IOError(_('%(url)s returned status %(status)d for '
+                            '%(fname)s') %
+                          {'url': url, 'status': resp.status,
+                           'fname': fname})
+        size = int(resp.getheader('content-length'))
+        received = 0
+        md5 = hashlib.md5()
+        with open(dst_path, 'wb') as f:
+            for chunk in iter(lambda: resp.read(_READ_CHUNK_SIZE), ''):
+                f.write(chunk)
+                md5.update(chunk)
+                received += len(chunk)
+        if received != size:
+            raise IOError(_('Received %(received)d of %(size)d bytes of '
+                            '%(fname)s from %(url)s') %
+                          {'received': received, 'size': size,
+                           'fname': fname, 'url': url})
+    finally:
+        conn.close()
+    return md5.hexdigest()
@@ -259,15 +259,65 @@ def get_disk_backing_file(path, basename=True):
     return backing_file
 
 
+# (st_dev of the source, st_dev of the destination) of the file systems
+# between which reflink copies are not supported
+_reflink_unsupported = set()
+
+# Errors with which cp fails to clone files between file systems that don't
+# support it, or which a cp without the --reflink option fails with, as
+# reported by cp run in the C locale
+_REFLINK_UNSUPPORTED_ERRORS = [os.strerror(err) for err in
+                               (errno.EOPNOTSUPP, errno.EXDEV,
+                                errno.ENOTTY, errno.EINVAL)]
+_REFLINK_UNSUPPORTED_ERRORS.append('unrecognized option')
+
+
+def _clone_image(src, dest):
+    """Clone src to dest sharing its data blocks, as XFS and btrfs
+    can do, without copying any data.
+
+    Returns False if the image could not be cloned and has to be copied.
+    """
+    dest_dir = dest if os.path.isdir(dest) else os.path.dirname(dest)
+    try:
+        devs = (os.stat(src).st_dev, os.stat(dest_dir or '.').st_dev)
+    except OSError:
+        return False
+    if devs in _reflink_unsupported:
+        return False
+
+    try:
+        execute('env', 'LC_ALL=C', 'LANG=C',
+                'cp', '--reflink=always', src, dest)
+    except processutils.ProcessExecutionError as e:
+        if any(error in (e.stderr or '')
+               for error in _REFLINK_UNSUPPORTED_ERRORS):
+            LOG.info(_LI('Cannot clone %(src)s to %(dest)s, falling back to '
+                         'copying images between these file systems: '
+                         '%(error)s'),
+                     {'src': src, 'dest': dest, 'error': e.stderr})
+            _reflink_unsupported.add(devs)
+        else:
+            LOG.warn(_LW('Cloning %(src)s to %(dest)s failed, copying it '
+                         'instead: %(error)s'),
+                     {'src': src, 'dest': dest, 'error': e.stderr})
+        return False
+    return True
+
+
 def copy_image(src, dest, host=None):
     """Copy a disk image to an existing directory
 
+    Local copies are reflink clones where the file system supports it.
+
     :param src: Source image
     :param dest: Destination path
     :param host: Remote host
     """
 
     if not host:
+        if _clone_image(src, dest):
+            return
         # We shell out to cp because that will intelligently copy
         # sparse files.  I.E. holes will not be written to DEST,
         # rather recreated efficiently.  In addition, since
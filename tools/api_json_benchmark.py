@@ -0,0 +1,90 @@
+"""
+This script measures the CPU time and the body size of serializing the JSON
+body of a GET /servers/detail response, built from the server of the
+all_extensions API sample, for growing numbers of servers:
+
+    python tools/api_json_benchmark.py --servers 1 100 1000
+
+It compares jsonutils.dumps(), which the API used to serialize with, with
+JSONDictSerializer, and with JSONDictSerializer streaming the body in chunks
+as done when osapi_json_stream_threshold is set. For the streamed body the
+size of the largest chunk is shown, which is the largest string built.
+"""
+import argparse
+import copy
+import datetime
+import os
+import sys
+import time
+
+# If ../nova/__init__.py exists, add ../ to Python search path, so that
+# it will override what happens to be installed in /usr/(local/)lib/python...
+POSSIBLE_TOPDIR = os.path.normpath(os.path.join(os.path.abspath(sys.argv[0]),
+                                   os.pardir,
+                                   os.pardir))
+if os.path.exists(os.path.join(POSSIBLE_TOPDIR, 'nova', '__init__.py')):
+    sys.path.insert(0, POSSIBLE_TOPDIR)
+
+from oslo.config import cfg
+
+from nova.api.openstack import wsgi
+from nova.openstack.common import jsonutils
+
+CONF = cfg.CONF
+
+SAMPLE = os.path.join(POSSIBLE_TOPDIR, 'doc', 'api_samples',
+                      'all_extensions', 'servers-details-resp.json')
+
+
+def make_body(servers):
+    with open(SAMPLE) as f:
+        server = jsonutils.load(f)['servers'][0]
+    # NOTE: the server_usage extension adds datetimes, not strings
+    server['OS-SRV-USG:launched_at'] = datetime.datetime.utcnow()
+    body = {'servers': []}
+    for i in xrange(servers):
+        server = copy.deepcopy(server)
+        server['id'] = '%08d-0000-0000-0000-000000000000' % i
+        body['servers'].append(server)
+    return body
+
+
+def measure(serialize, repeat):
+    best = None
+    for _i in xrange(repeat):
+        start = time.clock()
+        result = serialize()
+        elapsed = time.clock() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__.strip().split('\n')[0])
+    parser.add_argument('--servers', type=int, nargs='+',
+                        default=[1, 100, 1000])
+    parser.add_argument('--repeat', type=int, default=10)
+    args = parser.parse_args()
+
+    CONF([], project='nova')
+    CONF.set_override('osapi_json_stream_threshold', 1)
+    serializer = wsgi.JSONDictSerializer()
+
+    print('%8s %-12s %10s %12s %12s' % ('servers', 'serializer', 'CPU ms',
+                                        'body bytes', 'max string'))
+    for servers in args.servers:
+        body = make_body(servers)
+        for name, serialize in (
+                ('jsonutils', lambda: [jsonutils.dumps(body)]),
+                ('serializer', lambda: [serializer.serialize(body)]),
+                ('streamed', lambda: list(
+                    serializer.serialize_chunks(body)))):
+            cpu, chunks = measure(serialize, args.repeat)
+            print('%8d %-12s %10.2f %12d %12d' % (
+                servers, name, cpu * 1000, sum(len(c) for c in chunks),
+                max(len(c) for c in chunks)))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,98 @@
+"""
+This script measures the CPU time of serializing the XML body of a
+GET /servers/detail response, built from the server of the all_extensions
+API sample, for growing numbers of servers:
+
+    python tools/api_xml_benchmark.py --servers 1 100 1000
+
+The servers template is used with the slave templates of the extensions
+adding server attributes attached, as the API does. It compares rendering
+the template element by element as the API used to, with the compiled
+template, and with serializing the same body as JSON.
+"""
+import argparse
+import os
+import sys
+
+# If ../nova/__init__.py exists, add ../ to Python search path, so that
+# it will override what happens to be installed in /usr/(local/)lib/python...
+POSSIBLE_TOPDIR = os.path.normpath(os.path.join(os.path.abspath(sys.argv[0]),
+                                   os.pardir,
+                                   os.pardir))
+if os.path.exists(os.path.join(POSSIBLE_TOPDIR, 'nova', '__init__.py')):
+    sys.path.insert(0, POSSIBLE_TOPDIR)
+
+from lxml import etree
+from oslo.config import cfg
+
+import api_json_benchmark
+
+from nova.api.openstack.compute.contrib import extended_availability_zone
+from nova.api.openstack.compute.contrib import extended_ips
+from nova.api.openstack.compute.contrib import extended_ips_mac
+from nova.api.openstack.compute.contrib import extended_server_attributes
+from nova.api.openstack.compute.contrib import extended_status
+from nova.api.openstack.compute.contrib import extended_volumes
+from nova.api.openstack.compute.contrib import security_groups
+from nova.api.openstack.compute.contrib import server_usage
+from nova.api.openstack.compute import servers
+from nova.api.openstack import wsgi
+
+CONF = cfg.CONF
+
+SLAVES = [
+    extended_availability_zone.ExtendedAZsTemplate,
+    extended_ips.ExtendedIpsServersTemplate,
+    extended_ips_mac.ExtendedIpsMacServersTemplate,
+    extended_server_attributes.ExtendedServerAttributesTemplate,
+    extended_status.ExtendedStatusesTemplate,
+    extended_volumes.ExtendedVolumesServersTemplate,
+    security_groups.SecurityGroupServersTemplate,
+    server_usage.ServerUsagesTemplate,
+]
+
+
+def make_template():
+    template = servers.ServersTemplate()
+    template.attach(*[slave() for slave in SLAVES])
+    return template
+
+
+def uncompiled(template, body):
+    elem = template._serialize(None, body, template._siblings(),
+                               template._nsmap())
+    return etree.tostring(elem, **template.serialize_options)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__.strip().split('\n')[0])
+    parser.add_argument('--servers', type=int, nargs='+',
+                        default=[1, 100, 1000])
+    parser.add_argument('--repeat', type=int, default=10)
+    args = parser.parse_args()
+
+    CONF([], project='nova')
+    template = make_template()
+    serializer = wsgi.JSONDictSerializer()
+
+    print('%8s %-12s %10s %12s' % ('servers', 'serializer', 'CPU ms',
+                                   'body bytes'))
+    for servers_count in args.servers:
+        body = api_json_benchmark.make_body(servers_count)
+        results = []
+        for name, serialize in (
+                ('uncompiled', lambda: uncompiled(template, body)),
+                ('compiled', lambda: template.serialize(body)),
+                ('json', lambda: serializer.serialize(body))):
+            cpu, result = api_json_benchmark.measure(serialize, args.repeat)
+            results.append(result)
+            print('%8d %-12s %10.2f %12d' % (servers_count, name, cpu * 1000,
+                                              len(result)))
+        if results[0] != results[1]:
+            print('compiled template output differs')
+            return 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,161 @@
+"""
+This script compares the throughput of downloading an image as a single HTTP
+stream with downloading it using parallel range requests, as done when
+[glance] download_streams is greater than 1.
+
+By default a local HTTP server serving a generated file stands in for glance:
+
+    python tools/image_download_benchmark.py --size-mb 2048 --streams 1 4 8
+
+Pass --host, --port and --path to benchmark against a real glance endpoint
+(with --token if it requires authentication) instead.
+"""
+import argparse
+import BaseHTTPServer
+import multiprocessing
+import os
+import re
+import SocketServer
+import sys
+import tempfile
+import time
+
+# If ../nova/__init__.py exists, add ../ to Python search path, so that
+# it will override what happens to be installed in /usr/(local/)lib/python...
+POSSIBLE_TOPDIR = os.path.normpath(os.path.join(os.path.abspath(sys.argv[0]),
+                                   os.pardir,
+                                   os.pardir))
+if os.path.exists(os.path.join(POSSIBLE_TOPDIR, 'nova', '__init__.py')):
+    sys.path.insert(0, POSSIBLE_TOPDIR)
+
+CHUNK_SIZE = 1024 * 1024
+
+
+class RangeRequestHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        size = os.path.getsize(self.server.image_path)
+        start, end = 0, size - 1
+        match = re.match(r'bytes=(\d+)-(\d+)', self.headers.get('Range', ''))
+        if match:
+            start, end = int(match.group(1)), int(match.group(2))
+            self.send_response(206)
+            self.send_header('Content-Range',
+                             'bytes %d-%d/%d' % (start, end, size))
+        else:
+            self.send_response(200)
+        self.send_header('Content-Length', str(end - start + 1))
+        self.end_headers()
+        with open(self.server.image_path, 'rb') as f:
+            f.seek(start)
+            remaining = end - start + 1
+            while remaining:
+                chunk = f.read(min(remaining, CHUNK_SIZE))
+                self.wfile.write(chunk)
+                remaining -= len(chunk)
+
+
+class ThreadingHTTPServer(SocketServer.ThreadingMixIn,
+                          BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+
+
+def serve(image_path, ready):
+    server = ThreadingHTTPServer(('127.0.0.1', 0), RangeRequestHandler)
+    server.image_path = image_path
+    ready.put(server.server_address[1])
+    server.serve_forever()
+
+
+def make_image(size):
+    fd, path = tempfile.mkstemp(prefix='image-download-benchmark-')
+    with os.fdopen(fd, 'wb') as f:
+        for _i in xrange(size // CHUNK_SIZE):
+            f.write(os.urandom(CHUNK_SIZE))
+    return path
+
+
+def download_single_stream(host, port, path, headers, dst_path):
+    import httplib
+
+    conn = httplib.HTTPConnection(host, port)
+    conn.request('GET', path, headers=headers)
+    resp = conn.getresponse()
+    with open(dst_path, 'wb') as f:
+        for chunk in iter(lambda: resp.read(CHUNK_SIZE), ''):
+            f.write(chunk)
+    conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__.strip().split('\n')[0])
+    parser.add_argument('--size-mb', type=int, default=1024,
+                        help='size of the generated image')
+    parser.add_argument('--streams', type=int, nargs='+', default=[2, 4, 8],
+                        help='numbers of parallel streams to compare')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--host')
+    parser.add_argument('--port', type=int, default=9292)
+    parser.add_argument('--path', help='e.g. /v1/images/<image id>')
+    parser.add_argument('--token')
+    args = parser.parse_args()
+
+    image_path = None
+    if args.host:
+        host, port, path = args.host, args.port, args.path
+        if args.token:
+            headers = {'X-Auth-Token': args.token}
+        else:
+            headers = {}
+    else:
+        # NOTE: the stand-in server runs in its own process, started before
+        # eventlet monkey patches this one.
+        image_path = make_image(args.size_mb * CHUNK_SIZE)
+        ready = multiprocessing.Queue()
+        server = multiprocessing.Process(target=serve,
+                                         args=(image_path, ready))
+        server.daemon = True
+        server.start()
+        host, port, path, headers = '127.0.0.1', ready.get(), '/image', {}
+
+    import eventlet
+    eventlet.monkey_patch(os=False)
+    from nova.image import glance
+
+    dst_fd, dst_path = tempfile.mkstemp(prefix='image-download-benchmark-')
+    os.close(dst_fd)
+    try:
+        download_single_stream(host, port, path, headers, dst_path)
+        size = os.path.getsize(dst_path)
+
+        def run(name, download):
+            best = None
+            for _i in xrange(args.repeat):
+                start = time.time()
+                download()
+                elapsed = time.time() - start
+                best = elapsed if best is None else min(best, elapsed)
+            print('%-16s %8.1f MB/s' % (name, size / float(CHUNK_SIZE) / best))
+
+        print('%d MB, best of %d runs' % (size // CHUNK_SIZE, args.repeat))
+        run('single stream',
+            lambda: download_single_stream(host, port, path, headers,
+                                           dst_path))
+        for streams in args.streams:
+            run('%d streams' % streams,
+                lambda: glance.download_ranges(host, port, False, path,
+                                               headers, dst_path, size,
+                                               streams))
+    finally:
+        os.unlink(dst_path)
+        if image_path:
+            os.unlink(image_path)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
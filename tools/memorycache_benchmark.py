@@ -0,0 +1,60 @@
+"""
+This script measures the per-operation latency of the in process cache
+used when memcached_servers is not set, as the number of entries grows. The
+oslo-incubator client, which expires entries by scanning all of them on
+every get, is shown for comparison:
+
+    python tools/memorycache_benchmark.py --entries 1000 10000 50000
+"""
+import argparse
+import os
+import sys
+import time
+
+# If ../nova/__init__.py exists, add ../ to Python search path, so that
+# it will override what happens to be installed in /usr/(local/)lib/python...
+POSSIBLE_TOPDIR = os.path.normpath(os.path.join(os.path.abspath(sys.argv[0]),
+                                   os.pardir,
+                                   os.pardir))
+if os.path.exists(os.path.join(POSSIBLE_TOPDIR, 'nova', '__init__.py')):
+    sys.path.insert(0, POSSIBLE_TOPDIR)
+
+from nova import cache_utils
+from nova.openstack.common import memorycache
+
+
+def measure(client, entries, ops):
+    for i in xrange(entries):
+        client.set('key-%d' % i, 'value', time=15)
+    start = time.time()
+    for i in xrange(ops):
+        key = 'key-%d' % (i * 7919 % entries)
+        client.get(key)
+        client.set(key, 'value', time=15)
+    return (time.time() - start) / (2 * ops) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__.strip().split('\n')[0])
+    parser.add_argument('--entries', type=int, nargs='+',
+                        default=[100, 1000, 10000, 50000],
+                        help='numbers of cached entries to compare')
+    parser.add_argument('--ops', type=int, default=2000,
+                        help='number of get and set pairs per measurement')
+    parser.add_argument('--skip-full-scan', action='store_true',
+                        help='only measure the current client')
+    args = parser.parse_args()
+
+    print('%10s %16s %16s' % ('entries', 'current us/op', 'full scan us/op'))
+    for entries in args.entries:
+        current = measure(cache_utils.Client(), entries, args.ops)
+        if args.skip_full_scan:
+            full_scan = float('nan')
+        else:
+            full_scan = measure(memorycache.Client(), entries, args.ops)
+        print('%10d %16.2f %16.2f' % (entries, current, full_scan))
+
+
+if __name__ == '__main__':
+    sys.exit(main())